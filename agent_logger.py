@@ -1,12 +1,19 @@
 import os
-from supabase import create_client
 from datetime import datetime
 import uuid
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase = None
+
+def supabase_client():
+    # Created on first log call: importing this module stays cheap and works without credentials
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
 
 def log_agent_run(agent_name, prompt_hash, status="success", error_msg=None, user_id=None):
     run_id = str(uuid.uuid4())
@@ -22,6 +29,6 @@ def log_agent_run(agent_name, prompt_hash, status="success", error_msg=None, use
         "user_id": user_id,
     }
 
-    response = supabase.table("agent_logs").insert(data).execute()
+    response = supabase_client().table("agent_logs").insert(data).execute()
     print("[agent_logger] Logged:", response)
 
@@ -4,26 +4,57 @@
 
 from __future__ import annotations
 import argparse
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
 import os
 import sys
+import threading
+import time
 import uuid
+from collections import deque
+from concurrent.futures import Future
 from pathlib import Path
-try:
-    import requests  # type: ignore
-except ModuleNotFoundError:  # pragma: no cover - lightweight stub for tests
-    class _RequestsStub:
-        get = post = patch = delete = None
-
-        def __getattr__(self, name):
-            raise ModuleNotFoundError("requests module is required for network calls")
-
-    requests = _RequestsStub()  # type: ignore
-try:  # Optional YAML parser for CLI demos
-    import yaml  # type: ignore
-except ModuleNotFoundError:  # pragma: no cover - optional dependency
-    yaml = None  # type: ignore
-from datetime import datetime, timedelta
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from runner.batch import BatchSummary, TriggerLogIndex, chunked
+from runner.breaker import CLOSED, BreakerRegistry, CircuitOpen
+from runner.coalesce import SlackCoalescer, load_coalesce_window_s
+from runner.daemon import Daemon, SpoolDir
+from runner.columnar import NUMPY_AVAILABLE, LeadBatch
+from runner.conditions import Condition, ConditionError, compile_condition
+from runner.deferral import DeferralQueue, DeferralReleaser, QuietHours, load_quiet_hours
+from runner.dlq import DeadLetterStore
+from runner.engine import AsyncFlowEngine, call, drive_sync, returning
+from runner.flows import CompiledFlow, FlowError, FlowRegistry, parse_flow_text
+from runner.idem_cache import IdempotencyIndex, current_iso_week
+from runner.ingest import BOOL_FIELDS, IngestStats, Progress, leads_from_lines, stream_leads
+from runner.latency import LatencyRecorder
+from runner.lazy import LazyModule
+from runner.outbox import Outbox, OutboxDrainer
+from runner.pool import FlowWorkerPool, parse_tenant_limits
+from runner.ratelimit import RateLimiter, load_rate_limits
+from runner.retry import RetryExhausted, RetryPolicy, load_retry_policy
+from runner.postgrest import PostgrestClient
+from runner.pushdown import filter_params, keyset_pages
+from runner.scheduler import JobStore, Scheduler
+from runner.templates import TemplateError, TemplateRegistry, template_guard
+from runner.score_cache import ScoreService, TTLCache
+from runner.write_behind import WriteBehindBuffer
+
+
+class _RequestsStub:  # pragma: no cover - lightweight stub for tests
+    get = post = patch = delete = None
+
+    def __getattr__(self, name):
+        raise ModuleNotFoundError("requests module is required for network calls")
+
+
+# Imported on the first HTTP call (or monkeypatch); --help, --flow previews and pure-spool runs never pay for it
+requests = LazyModule("requests", missing=_RequestsStub)
 
 # =========================
 # Environment configuration
@@ -38,10 +69,132 @@ DRY_RUN: bool = os.getenv("DRY_RUN", "1") == "1"
 WHATCHIMP_API_URL: str = os.getenv("WHATCHIMP_API_URL", "").rstrip("/")
 WHATCHIMP_KEY: str = os.getenv("WHATCHIMP_KEY", "")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("[WARN] SUPABASE_URL / SUPABASE_SERVICE_KEY not set. Supabase calls may fail.")
-if DRY_RUN:
-    print("[INFO] DRY_RUN=1 → no real WhatsApp sends. Safe mode.")
+# PostgREST connection pool (0 → no pooling, fresh connection per call)
+SUPABASE_POOL_SIZE: int = int(os.getenv("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_TIMEOUT_S: float = float(os.getenv("SUPABASE_TIMEOUT_S", "15"))
+
+# Env notices print on first use (first Supabase call / first dry send), not at import:
+# scripts and tests that only import helpers stay quiet
+_NOTICES: set = set()
+_NOTICES_LOCK = threading.Lock()
+
+def _notice_once(key: str, message: str) -> None:
+    with _NOTICES_LOCK:
+        if key in _NOTICES:
+            return
+        _NOTICES.add(key)
+    print(message)
+
+# Circuit breakers per endpoint ("supabase", "whatsapp", "slack"); transitions go to ops_logs
+BREAKER_WINDOW: int = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE: float = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_S: float = float(os.getenv("BREAKER_SLOW_CALL_S", "5"))
+BREAKER_SLOW_RATE: float = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_S: float = float(os.getenv("BREAKER_OPEN_S", "30"))
+
+_BREAKER_LOG: Deque[Dict[str, Any]] = deque(maxlen=200)  # ops_logs rows waiting for a closed supabase circuit
+
+def _log_breaker_transition(name: str, old: str, new: str, stats: Dict[str, Any]) -> None:
+    print(f"[BREAKER] {name}: {old} → {new} {stats}")
+    row = {
+        "brand": os.getenv("BRAND", "Voltek"),
+        "flow": "circuit_breaker",
+        "node": name,
+        "status": new,
+        "idempotency_key": f"breaker:{name}:{uuid.uuid4()}",
+        "latency_ms": 0,
+        "error_msg": f"{old} -> {new}",
+        "metadata": stats,
+    }
+    ob = _outbox()
+    if ob is not None:
+        ob.put_upsert("ops_logs", row, "idempotency_key")
+        return
+    # Written directly only while the supabase circuit is closed: an open one would reject the row
+    # and a half-open one would spend a trial call on it. Held rows go out on the next closed transition.
+    _BREAKER_LOG.append(row)
+    if BREAKERS.get("supabase").state != CLOSED:
+        return
+    rows: List[Dict[str, Any]] = []
+    while _BREAKER_LOG:
+        try:
+            rows.append(_BREAKER_LOG.popleft())
+        except IndexError:  # taken by a concurrent transition
+            break
+
+    def write() -> None:
+        try:
+            _sb_upsert_rows("ops_logs", rows, "idempotency_key")
+        except Exception as e:
+            _BREAKER_LOG.extendleft(reversed(rows))
+            print(f"[WARN] ops_logs breaker rows held for the next attempt: {e}")
+
+    if rows:
+        threading.Thread(target=write, name="breaker-ops-log", daemon=True).start()
+
+BREAKERS = BreakerRegistry(
+    on_transition=_log_breaker_transition,
+    window=BREAKER_WINDOW,
+    min_calls=BREAKER_MIN_CALLS,
+    failure_rate=BREAKER_FAILURE_RATE,
+    slow_call_s=BREAKER_SLOW_CALL_S,
+    slow_rate=BREAKER_SLOW_RATE,
+    open_s=BREAKER_OPEN_S,
+)
+
+def breaker_metrics() -> Dict[str, Dict[str, Any]]:
+    return BREAKERS.stats()
+
+# Latency histograms per (stage, flow, brand); LATENCY_FLUSH_S > 0 ships windows to ops_logs
+LATENCY_METRICS: bool = os.getenv("LATENCY_METRICS", "1") == "1"
+LATENCY_FLUSH_S: float = float(os.getenv("LATENCY_FLUSH_S", "0"))
+LATENCY = LatencyRecorder(enabled=LATENCY_METRICS)
+_LATENCY_FLUSHER: Optional[threading.Thread] = None
+_LATENCY_LOCK = threading.Lock()
+
+def _write_latency_rows(rows: List[Dict[str, Any]]) -> None:
+    ob = _outbox()
+    if ob is not None:
+        for row in rows:
+            ob.put_upsert("ops_logs", row, "idempotency_key")
+        return
+    _sb_upsert_rows("ops_logs", rows, "idempotency_key")
+
+def flush_latency() -> int:
+    """Write the current latency window to ops_logs (latency_ms = p95) and start a new one."""
+    return LATENCY.flush(_write_latency_rows, default_brand=os.getenv("BRAND", "Voltek"))
+
+def _latency_flusher() -> None:
+    global _LATENCY_FLUSHER
+    if _LATENCY_FLUSHER is not None or LATENCY_FLUSH_S <= 0 or not LATENCY.enabled:
+        return
+
+    def run() -> None:
+        while True:
+            time.sleep(LATENCY_FLUSH_S)
+            try:
+                flush_latency()
+            except Exception as e:
+                print(f"[WARN] latency flush failed: {e}")
+
+    def final() -> None:
+        try:
+            flush_latency()
+        except Exception as e:
+            print(f"[WARN] final latency flush failed: {e}")
+
+    with _LATENCY_LOCK:
+        if _LATENCY_FLUSHER is None:
+            _LATENCY_FLUSHER = threading.Thread(target=run, name="latency-flush", daemon=True)
+            _LATENCY_FLUSHER.start()
+            atexit.register(final)
+
+def latency_metrics() -> List[Dict[str, Any]]:
+    return LATENCY.snapshot()
+
+def latency_prometheus() -> str:
+    return LATENCY.prometheus()
 
 # ============
 # HTTP helpers
@@ -57,38 +210,64 @@ def _sb_headers(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
         h.update(extra)
     return h
 
-def _sb_select(path: str, params: Dict[str, Any]):
+_SB_CLIENT: Optional[PostgrestClient] = None
+
+def _sb_client() -> PostgrestClient:
+    global _SB_CLIENT
+    if _SB_CLIENT is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            _notice_once("supabase_env", "[WARN] SUPABASE_URL / SUPABASE_SERVICE_KEY not set. Supabase calls may fail.")
+        _SB_CLIENT = PostgrestClient(
+            SUPABASE_URL,
+            headers=_sb_headers(),
+            pool_size=SUPABASE_POOL_SIZE,
+            timeout=SUPABASE_TIMEOUT_S,
+            breaker=BREAKERS.get("supabase"),
+        )
+    return _SB_CLIENT
+
+def _sb_select(path: str, params: Dict[str, Any], timeout: Optional[float] = None):
     # Range header ensures PostgREST returns Content-Range for counts
-    r = requests.get(
-        f"{SUPABASE_URL}/rest/v1/{path}",
-        headers=_sb_headers() | {"Range": "0-0"},
-        params=params,
-        timeout=15,
-    )
-    r.raise_for_status()
-    return r
-
-def _sb_update(table: str, match_params: Dict[str, str], payload: Dict[str, Any]):
-    r = requests.patch(
-        f"{SUPABASE_URL}/rest/v1/{table}",
-        headers=_sb_headers({"Prefer": "return=minimal"}),
-        params=match_params,
-        json=payload,
-        timeout=15,
-    )
-    r.raise_for_status()
+    with LATENCY.measure(f"sb.select:{path}"):
+        return _sb_client().select(path, params, headers={"Range": "0-0"}, timeout=timeout)
+
+def _sb_select_rows(path: str, params: Dict[str, Any], page_size: int = 1000, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    # Row fetch paged with Range headers (PostgREST caps a single response at max-rows)
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        with LATENCY.measure(f"sb.select:{path}"):
+            r = _sb_client().select(path, params, headers={"Range": f"{start}-{start + page_size - 1}"}, timeout=timeout)
+        page = r.json() or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+def _sb_upsert_rows(table: str, rows: List[Dict[str, Any]], conflict_col: str, timeout: Optional[float] = None):
+    # A multi-row upsert needs a uniform column set. Padding with None would make merge-duplicates
+    # overwrite stored values with NULL, so rows are sent in one upsert per distinct key set instead.
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    results: List[Any] = []
+    for group in groups.values():
+        result = _sb_upsert_on_conflict(table, group, conflict_col, timeout=timeout)
+        results += result if isinstance(result, list) else [result]
+    return results
+
+def _sb_update(table: str, match_params: Dict[str, str], payload: Dict[str, Any], timeout: Optional[float] = None):
+    with LATENCY.measure(f"sb.update:{table}"):
+        _sb_client().update(table, match_params, payload, timeout=timeout)
     return True
 
-def _sb_upsert_on_conflict(table: str, payload: dict, conflict_col: str):
-    r = requests.post(
-        f"{SUPABASE_URL}/rest/v1/{table}",
-        headers=_sb_headers({"Prefer": "resolution=merge-duplicates,return=representation"}),
-        params={"on_conflict": conflict_col},
-        json=payload,
-        timeout=15,
-    )
-    r.raise_for_status()
-    return r.json()
+def _sb_upsert_on_conflict(table: str, payload: dict, conflict_col: str, timeout: Optional[float] = None):
+    with LATENCY.measure(f"sb.upsert:{table}"):
+        return _sb_client().upsert(table, payload, conflict_col, timeout=timeout).json()
+
+def _sb_rpc(fn: str, args: Dict[str, Any], timeout: Optional[float] = None):
+    with LATENCY.measure(f"sb.rpc:{fn}"):
+        return _sb_client().rpc(fn, args, timeout=timeout).json()
 
 def _count_from_content_range(resp) -> int:
     cr = resp.headers.get("Content-Range", "")
@@ -97,22 +276,61 @@ def _count_from_content_range(resp) -> int:
 # ===========
 # QA utilities
 # ===========
-def template_guard(block: Dict[str, Any]) -> bool:
-    text = block.get("body", "") or ""
-    if len(text) > 1024:
-        raise ValueError("Template body too long (>1024 chars)")
-    if block.get("header_type") == "image" and not block.get("image_url"):
-        raise ValueError("Missing image_url for image header")
-    return True
+# WhatsApp templates: validated with template_guard and compiled once, looked up per send
+WHATSAPP_TEMPLATES: str = os.getenv("WHATSAPP_TEMPLATES", "config/whatsapp_templates.yaml")
+TEMPLATE_SOURCE: str = os.getenv("TEMPLATE_SOURCE", "file")  # "supabase" → also whatsapp_templates
+_TEMPLATES: Optional[TemplateRegistry] = None
+
+def template_registry() -> TemplateRegistry:
+    global _TEMPLATES
+    if _TEMPLATES is None:
+        registry = TemplateRegistry(template_guard)
+        reports = []
+        if Path(WHATSAPP_TEMPLATES).exists():
+            reports.append(registry.load_file(WHATSAPP_TEMPLATES, replace=False))
+        if TEMPLATE_SOURCE == "supabase":
+            try:
+                rows = _sb_select_rows("whatsapp_templates", {"select": "*"})
+                reports.append(registry.load(rows, "supabase:whatsapp_templates", replace=False))
+            except Exception as e:
+                print(f"[WARN] whatsapp_templates load failed: {e}")
+        for report in reports:
+            for bad in report["invalid"]:
+                print(f"[WARN] template {bad['template']} rejected ({report['source']}): {bad['error']}")
+        _TEMPLATES = registry
+    return _TEMPLATES
+
+# Intent scoring: cached by input content hash (memory; SQLite too if GPT_SCORE_CACHE_DB is set)
+GPT_SCORER_URL: str = os.getenv("GPT_SCORER_URL", "https://mocked-url/score")  # replace when you’re ready
+GPT_SCORE_TTL_S: float = float(os.getenv("GPT_SCORE_TTL_S", "21600"))
+GPT_SCORE_CACHE_DB: str = os.getenv("GPT_SCORE_CACHE_DB", "")
+GPT_SCORE_CONCURRENCY: int = int(os.getenv("GPT_SCORE_CONCURRENCY", "8"))
+_SCORE_SERVICE: Optional[ScoreService] = None
+
+def _gpt_score_remote(lead_input: Dict[str, Any]) -> int:
+    res = requests.post(GPT_SCORER_URL, json=lead_input, timeout=15)
+    res.raise_for_status()
+    return int(res.json().get("intent_score", 0))
+
+def _score_service() -> ScoreService:
+    global _SCORE_SERVICE
+    if _SCORE_SERVICE is None:
+        cache = TTLCache(GPT_SCORE_TTL_S, path=GPT_SCORE_CACHE_DB or None)
+        _SCORE_SERVICE = ScoreService(_gpt_score_remote, cache, max_concurrency=GPT_SCORE_CONCURRENCY)
+    return _SCORE_SERVICE
 
 def gpt_qualifier_score(lead_input: Dict[str, Any]) -> int:
-    url = "https://mocked-url/score"  # replace when you’re ready
     try:
-        res = requests.post(url, json=lead_input, timeout=15)
-        res.raise_for_status()
-        return int(res.json().get("intent_score", 0))
+        return _score_service().score(lead_input)
     except Exception:
-        return 0
+        return 0  # failures are not cached; the next call retries
+
+def gpt_qualifier_scores(lead_inputs: List[Dict[str, Any]], max_concurrency: Optional[int] = None) -> List[int]:
+    """Scores many inputs: cache hits first, then the misses at most max_concurrency at a time."""
+    return _score_service().score_many(lead_inputs, max_concurrency)
+
+def gpt_score_metrics() -> Dict[str, Any]:
+    return _score_service().stats()
 
 # ======================
 # Idempotency + logging
@@ -121,7 +339,7 @@ def idem_key(lead_id: str, stage: str, flow: str, iso_week: Optional[int] = None
     iso_week = iso_week or int(datetime.now().strftime("%G%V"))
     return f"{lead_id}:{stage}:{iso_week}:{flow}"
 
-def log_trigger(
+def _trigger_row(
     lead_id: str,
     flow_name: str,
     status: str,
@@ -129,7 +347,7 @@ def log_trigger(
     reason: Optional[str] = None,
     error: Optional[str] = None,
     triggered_by: str = "runner",
-) -> None:
+) -> Dict[str, Any]:
     payload = {
         "lead_id": lead_id,
         "flow_name": flow_name,
@@ -142,81 +360,488 @@ def log_trigger(
         payload["reason"] = reason
     if error is not None:
         payload["error"] = error
+    return payload
+
+# Write-behind trigger logging (opt-in): queued/sent transitions merge per key,
+# flushed as multi-row upserts every TRIGGER_LOG_FLUSH_ROWS rows or TRIGGER_LOG_FLUSH_MS.
+TRIGGER_LOG_BUFFER: bool = os.getenv("TRIGGER_LOG_BUFFER", "0") == "1"
+TRIGGER_LOG_FLUSH_ROWS: int = int(os.getenv("TRIGGER_LOG_FLUSH_ROWS", "500"))
+TRIGGER_LOG_FLUSH_MS: int = int(os.getenv("TRIGGER_LOG_FLUSH_MS", "1000"))
+_TRIGGER_BUFFER: Optional[WriteBehindBuffer] = None
+
+def _upsert_trigger_rows(rows: List[Dict[str, Any]]) -> None:
+    _sb_upsert_rows("yaml_trigger_log", rows, "idempotency_key")
+
+def _trigger_buffer() -> Optional[WriteBehindBuffer]:
+    global _TRIGGER_BUFFER
+    if _TRIGGER_BUFFER is None and TRIGGER_LOG_BUFFER:
+        _TRIGGER_BUFFER = WriteBehindBuffer(
+            _upsert_trigger_rows,
+            max_rows=TRIGGER_LOG_FLUSH_ROWS,
+            max_delay_s=TRIGGER_LOG_FLUSH_MS / 1000.0,
+            name="yaml_trigger_log",
+        )
+    return _TRIGGER_BUFFER
+
+# Durable local outbox (opt-in): RUNNER_OUTBOX=<sqlite path>. Trigger logs and lead
+# updates land in SQLite first; a background drainer ships them with retry.
+RUNNER_OUTBOX: str = os.getenv("RUNNER_OUTBOX", "")
+OUTBOX_BATCH: int = int(os.getenv("OUTBOX_BATCH", "200"))
+OUTBOX_INTERVAL_MS: int = int(os.getenv("OUTBOX_INTERVAL_MS", "1000"))
+OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "50"))  # then parked (`python -m runner.outbox unpark`)
+_OUTBOX: Optional[Outbox] = None
+_OUTBOX_DRAINER: Optional[OutboxDrainer] = None
+
+def _outbox() -> Optional[Outbox]:
+    global _OUTBOX, _OUTBOX_DRAINER
+    if _OUTBOX is None and RUNNER_OUTBOX:
+        _OUTBOX = Outbox(RUNNER_OUTBOX)
+        _OUTBOX_DRAINER = OutboxDrainer(
+            _OUTBOX,
+            _sb_upsert_rows,
+            _sb_update,
+            batch_size=OUTBOX_BATCH,
+            interval_s=OUTBOX_INTERVAL_MS / 1000.0,
+            max_attempts=OUTBOX_MAX_ATTEMPTS,
+        ).start()
+        atexit.register(_OUTBOX_DRAINER.stop)
+    return _OUTBOX
+
+def _enqueue_trigger_rows(rows: List[Dict[str, Any]]) -> bool:
+    # True when the rows were handed to a local queue (outbox first, then write-behind buffer)
+    ob = _outbox()
+    if ob is not None:
+        for row in rows:
+            ob.put_upsert("yaml_trigger_log", row, "idempotency_key")
+        return True
+    buf = _trigger_buffer()
+    if buf is not None:
+        for row in rows:
+            buf.put(row)
+        return True
+    return False
+
+def flush_trigger_log() -> int:
+    buf = _trigger_buffer()
+    return buf.flush() if buf else 0
+
+def trigger_log_metrics() -> Dict[str, Any]:
+    buf = _trigger_buffer()
+    metrics = buf.metrics() if buf else {}
+    ob = _outbox()
+    if ob is not None:
+        metrics["outbox"] = ob.stats()
+    return metrics
+
+def log_trigger(
+    lead_id: str,
+    flow_name: str,
+    status: str,
+    idempotency_key: str,
+    reason: Optional[str] = None,
+    error: Optional[str] = None,
+    triggered_by: str = "runner",
+) -> None:
+    payload = _trigger_row(lead_id, flow_name, status, idempotency_key, reason, error, triggered_by)
+    # Indexed even if the upsert fails: the action happened, a re-send would be a duplicate
+    _idem_index().add(idempotency_key)
+    if _enqueue_trigger_rows([payload]):
+        return
     try:
         _sb_upsert_on_conflict("yaml_trigger_log", payload, "idempotency_key")
     except Exception as e:
         print(f"[WARN] log_trigger upsert failed: {e}")
 
-def should_fire(lead: Dict[str, Any], flow_name: str, guards: Dict[str, Any]) -> Tuple[bool, str, str]:
-    key = guards.get("idempotency_key") or idem_key(lead["id"], lead.get("stage", ""), flow_name)
+# Process-local idempotency index (current ISO week), warm-loaded on first use
+IDEM_LRU_SIZE: int = int(os.getenv("IDEM_LRU_SIZE", "100000"))
+IDEM_BLOOM_CAPACITY: int = int(os.getenv("IDEM_BLOOM_CAPACITY", "1000000"))
+IDEM_WARM_LOAD: bool = os.getenv("IDEM_WARM_LOAD", "1") == "1"
+_IDEM_INDEX: Optional[IdempotencyIndex] = None
 
-    try:
-        r = _sb_select("yaml_trigger_log", {"select": "id", "idempotency_key": "eq." + key})
-        if _count_from_content_range(r) > 0:
-            return (False, "idempotent_key_exists", key)
-    except Exception as e:
-        print(f"[WARN] should_fire key check failed: {e}")
+def warm_idem_index(index: IdempotencyIndex) -> int:
+    rows = _sb_select_rows(
+        "yaml_trigger_log", {"select": "idempotency_key", "idempotency_key": f"like.*:{current_iso_week()}:*"}
+    )
+    return index.warm_load(row["idempotency_key"] for row in rows if row.get("idempotency_key"))
 
-    n_days = int(guards.get("not_fired_in_days", 0) or 0)
-    if n_days > 0:
-        since = (datetime.utcnow() - timedelta(days=n_days)).isoformat()
-        try:
-            r = _sb_select(
-                "yaml_trigger_log",
-                {"select": "id", "lead_id": "eq." + lead["id"], "flow_name": "eq." + flow_name, "trigger_time": "gte." + since},
-            )
-            if _count_from_content_range(r) > 0:
-                return (False, "fired_in_window", key)
-        except Exception as e:
-            print(f"[WARN] should_fire window check failed: {e}")
+def _idem_index() -> IdempotencyIndex:
+    global _IDEM_INDEX
+    if _IDEM_INDEX is None:
+        _IDEM_INDEX = IdempotencyIndex(lru_size=IDEM_LRU_SIZE, bloom_capacity=IDEM_BLOOM_CAPACITY)
+        if IDEM_WARM_LOAD and SUPABASE_URL:
+            try:
+                warm_idem_index(_IDEM_INDEX)
+            except Exception as e:
+                print(f"[WARN] idempotency index warm-load failed: {e}")
+    return _IDEM_INDEX
 
-    max_total = int(guards.get("max_sends_total", 0) or 0)
+# Guard stats: key_exists / window_count / total_count per idempotency key.
+GuardStats = Dict[str, Any]
+GUARD_RPC: str = "trigger_guard_stats"  # migrations/007_trigger_guard_stats.sql
+GUARD_RPC_CHUNK: int = int(os.getenv("GUARD_RPC_CHUNK", "500"))
+_GUARD_RPC_AVAILABLE: bool = True
+
+def _empty_guard_stats() -> GuardStats:
+    return {"key_exists": False, "window_count": 0, "total_count": 0}
+
+def _guard_since(n_days: int) -> Optional[str]:
+    return (datetime.utcnow() - timedelta(days=n_days)).isoformat() if n_days > 0 else None
+
+def _guard_stats_legacy(lead_id: str, flow_name: str, key: str, n_days: int, max_total: int, check_key: bool = True) -> GuardStats:
+    # Pre-RPC path: up to three count queries, used when the RPC is not deployed
+    stats = _empty_guard_stats()
+    if check_key:
+        r = _sb_select("yaml_trigger_log", {"select": "id", "idempotency_key": "eq." + key})
+        stats["key_exists"] = _count_from_content_range(r) > 0
+        if stats["key_exists"]:
+            return stats
+    if n_days > 0:
+        r = _sb_select(
+            "yaml_trigger_log",
+            {"select": "id", "lead_id": "eq." + lead_id, "flow_name": "eq." + flow_name, "trigger_time": "gte." + _guard_since(n_days)},
+        )
+        stats["window_count"] = _count_from_content_range(r)
     if max_total > 0:
+        r = _sb_select("yaml_trigger_log", {"select": "id", "lead_id": "eq." + lead_id, "flow_name": "eq." + flow_name})
+        stats["total_count"] = _count_from_content_range(r)
+    return stats
+
+def guard_stats_bulk(
+    items: List[Tuple[str, str, str]],
+    not_fired_in_days: int = 0,
+    max_sends_total: int = 0,
+    check_key: bool = True,
+) -> Dict[str, GuardStats]:
+    """
+    Guard stats for many (lead_id, flow_name, idempotency_key) tuples, keyed by idempotency key.
+    One RPC round trip per GUARD_RPC_CHUNK tuples; falls back to per-key selects if the RPC is missing.
+    check_key=False (keys known absent) drops the key query from the fallback; the RPC answers
+    all three stats in the same round trip either way.
+    """
+    global _GUARD_RPC_AVAILABLE
+    since = _guard_since(not_fired_in_days)
+    out: Dict[str, GuardStats] = {}
+    items = list(items)
+    if _GUARD_RPC_AVAILABLE:
         try:
-            r = _sb_select("yaml_trigger_log", {"select": "id", "lead_id": "eq." + lead["id"], "flow_name": "eq." + flow_name})
-            if _count_from_content_range(r) >= max_total:
-                return (False, "max_total_reached", key)
+            for i in range(0, len(items), GUARD_RPC_CHUNK):
+                chunk = items[i : i + GUARD_RPC_CHUNK]
+                p_items = [{"lead_id": l, "flow_name": f, "idempotency_key": k, "since": since} for l, f, k in chunk]
+                for row in _sb_rpc(GUARD_RPC, {"p_items": p_items}) or []:
+                    out[row["idempotency_key"]] = {
+                        "key_exists": bool(row.get("key_exists")),
+                        "window_count": int(row.get("window_count") or 0),
+                        "total_count": int(row.get("total_count") or 0),
+                    }
+            return out
         except Exception as e:
-            print(f("[WARN] should_fire max_total check failed: {e}"))
+            if getattr(getattr(e, "response", None), "status_code", None) != 404:
+                raise
+            print(f"[WARN] {GUARD_RPC} RPC not deployed; falling back to per-key selects")
+            _GUARD_RPC_AVAILABLE = False
+    for lead_id, flow_name, key in items:
+        out[key] = _guard_stats_legacy(lead_id, flow_name, key, not_fired_in_days, max_sends_total, check_key)
+    return out
+
+def guard_stats(lead_id: str, flow_name: str, key: str, not_fired_in_days: int = 0, max_sends_total: int = 0, check_key: bool = True) -> GuardStats:
+    stats = guard_stats_bulk([(lead_id, flow_name, key)], not_fired_in_days, max_sends_total, check_key)
+    return stats.get(key) or _empty_guard_stats()
 
+def evaluate_guards(stats: GuardStats, guards: Dict[str, Any]) -> Tuple[bool, str]:
+    if stats.get("key_exists"):
+        return (False, "idempotent_key_exists")
+    if int(guards.get("not_fired_in_days", 0) or 0) > 0 and stats.get("window_count", 0) > 0:
+        return (False, "fired_in_window")
+    max_total = int(guards.get("max_sends_total", 0) or 0)
+    if max_total > 0 and stats.get("total_count", 0) >= max_total:
+        return (False, "max_total_reached")
     if guards.get("stop_if_true", False):
-        return (False, "stop_if", key)
+        return (False, "stop_if")
+    return (True, "ok")
+
+def _add_pending_trigger_rows(stats: GuardStats, lead_id: str, flow_name: str, n_days: int) -> None:
+    # Buffered/outboxed rows are not visible to PostgREST yet; count them locally
+    pending: List[Dict[str, Any]] = []
+    ob = _outbox()
+    if ob is not None:
+        pending += ob.pending_payloads("yaml_trigger_log", lead_id=lead_id, flow_name=flow_name)
+    buf = _trigger_buffer()
+    if buf is not None:
+        pending += buf.pending_rows()
+    since = _guard_since(n_days)
+    for row in pending:
+        if row.get("lead_id") == lead_id and row.get("flow_name") == flow_name:
+            stats["total_count"] = stats.get("total_count", 0) + 1
+            if since is not None and str(row.get("trigger_time", "")) >= since:
+                stats["window_count"] = stats.get("window_count", 0) + 1
 
-    return (True, "ok", key)
+def should_fire(lead: Dict[str, Any], flow_name: str, guards: Dict[str, Any]) -> Tuple[bool, str, str]:
+    """
+    (allowed, reason, idempotency_key). The local index answers the key guard: a confirmed key
+    skips at once, and a bloom negative with no window/total guards needs no network at all.
+    A bloom negative only covers the key, so window/total guards still cost one round trip
+    (the RPC returns all three stats together; the fallback then skips its key query).
+    """
+    key = guards.get("idempotency_key") or idem_key(lead["id"], lead.get("stage", ""), flow_name)
+    n_days = int(guards.get("not_fired_in_days", 0) or 0)
+    max_total = int(guards.get("max_sends_total", 0) or 0)
+    index = _idem_index()
+    if index.confirmed(key):
+        return (False, "idempotent_key_exists", key)
+    absent = index.definitely_absent(key)
+    if absent and n_days <= 0 and max_total <= 0:
+        stats = _empty_guard_stats()  # nothing left to ask the network
+    else:
+        try:
+            stats = guard_stats(lead["id"], flow_name, key, n_days, max_total, check_key=not absent)
+        except Exception as e:
+            print(f"[WARN] should_fire guard check failed: {e}")
+            stats = _empty_guard_stats()
+        if stats.get("key_exists"):
+            index.add(key)
+        _add_pending_trigger_rows(stats, lead["id"], flow_name, n_days)
+    allowed, reason = evaluate_guards(stats, guards)
+    return (allowed, reason, key)
 
 # ============================
 # Send/notify/schedule (safe)
 # ============================
+# Per-channel send budgets from config/notify.yaml, shared across runner processes on this host
+NOTIFY_CONFIG: str = os.getenv("NOTIFY_CONFIG", "config/notify.yaml")
+RATE_LIMIT_DB: str = os.getenv("RATE_LIMIT_DB", "var/ratelimit.sqlite3")  # ":memory:" → process-local
+RATE_LIMIT_MAX_WAIT_S: float = float(os.getenv("RATE_LIMIT_MAX_WAIT_S", "60"))
+_RATE_LIMITER: Optional[RateLimiter] = None
+
+def _rate_limiter() -> RateLimiter:
+    global _RATE_LIMITER
+    if _RATE_LIMITER is None:
+        _RATE_LIMITER = RateLimiter(RATE_LIMIT_DB, load_rate_limits(NOTIFY_CONFIG))
+    return _RATE_LIMITER
+
+# Quiet hours (notify.yaml quiet_hours, local time NOTIFY_TZ): live sends on these channels are
+# deferred to the window end and released at the channel rate by a background releaser
+NOTIFY_TZ: str = os.getenv("NOTIFY_TZ", "Asia/Kuala_Lumpur")
+QUIET_HOURS_CHANNELS = [c.strip() for c in os.getenv("QUIET_HOURS_CHANNELS", "whatsapp").split(",") if c.strip()]
+DEFERRAL_DB: str = os.getenv("DEFERRAL_DB", "var/deferred_sends.sqlite3")
+_QUIET_HOURS: Any = False  # False → not loaded yet; None → no quiet_hours configured
+_DEFERRAL_RELEASER: Optional[DeferralReleaser] = None
+_NOTIFY_LOCK = threading.Lock()
+# The flow whose exec step is running: quiet-hours deferrals are counted against it and carry
+# its trigger_log identity, so the row reads "deferred" until the releaser delivers the send
+_FLOW_SEND: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("flow_send", default=None)
+_TRIGGER_LOG_KEY = "_trigger_log"
+
+def _quiet_hours() -> Optional[QuietHours]:
+    global _QUIET_HOURS
+    if _QUIET_HOURS is False:
+        try:
+            from zoneinfo import ZoneInfo
+            tz = ZoneInfo(NOTIFY_TZ)
+        except Exception:  # no tzdata → host local time
+            tz = None
+        _QUIET_HOURS = load_quiet_hours(NOTIFY_CONFIG, tz)
+    return _QUIET_HOURS
+
+def _deferrals() -> DeferralReleaser:
+    global _DEFERRAL_RELEASER
+    with _NOTIFY_LOCK:
+        if _DEFERRAL_RELEASER is None:
+            _DEFERRAL_RELEASER = DeferralReleaser(
+                DeferralQueue(DEFERRAL_DB),
+                _release_deferred,
+                _rate_limiter(),
+                max_attempts=_retry_policy().max_attempts,
+                dead_letter_fn=_dead_letter_deferred,
+            ).start()
+            atexit.register(_DEFERRAL_RELEASER.stop)
+    return _DEFERRAL_RELEASER
+
+def _defer_if_quiet(channel: str, payload: Dict[str, Any]) -> bool:
+    quiet = _quiet_hours() if channel in QUIET_HOURS_CHANNELS else None
+    release_at = quiet.release_at(time.time()) if quiet is not None else None
+    if release_at is None:
+        return False
+    sending = _FLOW_SEND.get()
+    if sending is not None:
+        sending["deferred"] += 1
+        payload = {**payload, _TRIGGER_LOG_KEY: {k: sending[k] for k in ("lead_id", "flow_name", "idempotency_key")}}
+    row_id = _deferrals().queue.defer(channel, payload, release_at)
+    print(f"[{channel.upper()}/DEFER] quiet_hours until {datetime.fromtimestamp(release_at, timezone.utc).isoformat()} id={row_id}")
+    return True
+
+def notify_metrics() -> Dict[str, Any]:
+    metrics: Dict[str, Any] = {"rate_limits": _rate_limiter().metrics()}
+    if _DEFERRAL_RELEASER is not None:
+        metrics["deferred"] = _DEFERRAL_RELEASER.metrics()
+    if _SLACK_COALESCER:
+        metrics["slack_digest"] = _SLACK_COALESCER.metrics()
+    if _DLQ is not None:
+        metrics["dlq"] = _DLQ.depth()
+    return metrics
+
+def _post_whatsapp(payload: Dict[str, Any]) -> None:
+    url = f"{WHATCHIMP_API_URL}/send-template"
+    headers = {"Authorization": f"Bearer {WHATCHIMP_KEY}", "Content-Type": "application/json"}
+    r = requests.post(url, json=payload, headers=headers, timeout=20)
+    r.raise_for_status()
+
+def _post_slack(payload: Dict[str, Any]) -> None:
+    r = requests.post(SLACK_WEBHOOK, json=payload, timeout=10)
+    r.raise_for_status()  # a 5xx from the webhook counts against the slack breaker
+
+def _deliver(channel: str, payload: Dict[str, Any]) -> None:
+    # Deferred releases: the releaser already took the rate-limit token
+    BREAKERS.get(channel).call({"whatsapp": _post_whatsapp, "slack": _post_slack}[channel], payload)
+
+def _release_deferred(channel: str, payload: Dict[str, Any]) -> None:
+    # Releaser send: the flow's trigger_log row goes from "deferred" to "sent" once delivered
+    payload = dict(payload)
+    flow = payload.pop(_TRIGGER_LOG_KEY, None)
+    _deliver(channel, payload)
+    if flow is not None:
+        log_trigger(flow["lead_id"], flow["flow_name"], "sent", flow["idempotency_key"])
+
+def _dead_letter_deferred(channel: str, payload: Dict[str, Any], attempts: int, error: BaseException) -> None:
+    # Releaser gave up (permanent error or attempts spent): park it in the DLQ like a live send
+    payload = dict(payload)
+    flow = payload.pop(_TRIGGER_LOG_KEY, None)
+    dlq_id = _dead_letters().put(channel, payload, attempts, str(error))
+    print(f"[{channel.upper()}/DEFER] release failed {attempts}x ({error}); dead-lettered as {dlq_id}")
+    if flow is not None:
+        log_trigger(flow["lead_id"], flow["flow_name"], "error", flow["idempotency_key"], error=f"dead-lettered as {dlq_id}: {error}")
+
+def _deliver_paced(channel: str, payload: Dict[str, Any]) -> None:
+    # One token per send; an open circuit fails before waiting on the bucket
+    BREAKERS.get(channel).check()
+    _rate_limiter().acquire(channel, timeout=RATE_LIMIT_MAX_WAIT_S)
+    _deliver(channel, payload)
+
+# Retries (notify.yaml retry_policy, decorrelated jitter, Retry-After on 429) then a local DLQ
+RETRY_BASE_S: float = float(os.getenv("RETRY_BASE_S", "0.5"))
+RETRY_CAP_S: float = float(os.getenv("RETRY_CAP_S", "20"))
+NOTIFY_DLQ_DB: str = os.getenv("NOTIFY_DLQ_DB", "var/notify_dlq.sqlite3")
+_RETRY_POLICY: Optional[RetryPolicy] = None
+_DLQ: Optional[DeadLetterStore] = None
+
+class DeadLettered(RuntimeError):
+    def __init__(self, dlq_id: str, cause: BaseException) -> None:
+        super().__init__(f"dead-lettered as {dlq_id}: {cause}")
+        self.dlq_id = dlq_id
+
+def _retry_policy() -> RetryPolicy:
+    global _RETRY_POLICY
+    if _RETRY_POLICY is None:
+        _RETRY_POLICY = load_retry_policy(NOTIFY_CONFIG, RETRY_BASE_S, RETRY_CAP_S)
+    return _RETRY_POLICY
+
+def _dead_letters() -> DeadLetterStore:
+    global _DLQ
+    with _NOTIFY_LOCK:
+        if _DLQ is None:
+            _DLQ = DeadLetterStore(NOTIFY_DLQ_DB)
+    return _DLQ
+
+def _send_with_retry(channel: str, payload: Dict[str, Any]) -> None:
+    """Paced, retried send; a final failure is stored in the DLQ and raised as DeadLettered."""
+    def on_retry(attempt: int, error: BaseException, delay: float) -> None:
+        print(f"[{channel.upper()}/RETRY] attempt {attempt} failed ({error}); retrying in {delay:.1f}s")
+
+    try:
+        _retry_policy().call(lambda: _deliver_paced(channel, payload), on_retry=on_retry)
+    except CircuitOpen as e:  # endpoint down: park without spending attempts
+        raise DeadLettered(_dead_letters().put(channel, payload, 0, str(e), time.time() + e.retry_in_s), e) from e
+    except RetryExhausted as e:
+        retry_at = time.time() + (e.retry_after_s or 0.0)
+        raise DeadLettered(_dead_letters().put(channel, payload, e.attempts, str(e.last_error), retry_at), e.last_error) from e
+    except Exception as e:  # not retryable (e.g. 400): park it for a fixed-up replay
+        raise DeadLettered(_dead_letters().put(channel, payload, 1, str(e)), e) from e
+
 def send_whatsapp(to: str, template_id: str, variables: Optional[Dict[str, Any]] = None, quick_replies: Optional[list[str]] = None) -> None:
     """
     SAFE by default:
       - If DRY_RUN=1 or WhatChimp creds missing → print only.
       - When ready: set DRY_RUN=0 and provide WHATCHIMP_API_URL/WHATCHIMP_KEY.
+      - Live sends during quiet hours are deferred to the window end.
+      - Registered templates (template_registry) must get all their variables.
     """
+    template = template_registry().get(template_id)
+    if template is not None and template.missing(variables or {}):
+        raise TemplateError(f"{template_id}: missing variables {template.missing(variables or {})}")
     if DRY_RUN or not (WHATCHIMP_API_URL and WHATCHIMP_KEY):
+        if DRY_RUN:
+            _notice_once("dry_run", "[INFO] DRY_RUN=1 → no real WhatsApp sends. Safe mode.")
         print(f"[WA/DRY] to={to} template={template_id} vars={variables} qr={quick_replies}")
+        if template is not None:
+            print(f"[WA/DRY]   {template.render(variables or {})}")
         return
 
-    url = f"{WHATCHIMP_API_URL}/send-template"
-    headers = {"Authorization": f"Bearer {WHATCHIMP_KEY}", "Content-Type": "application/json"}
     payload = {"to": to, "template_id": template_id, "variables": variables or {}, "quick_replies": quick_replies or []}
-    r = requests.post(url, json=payload, headers=headers, timeout=20)
-    r.raise_for_status()
+    if _defer_if_quiet("whatsapp", payload):
+        return
+    _send_with_retry("whatsapp", payload)  # DeadLettered → flow records an error
+
+# Live Slack posts within coalesce_window_min are merged into one digest per channel
+SLACK_COALESCE: bool = os.getenv("SLACK_COALESCE", "1") == "1"
+SLACK_DIGEST_TOP_N: int = int(os.getenv("SLACK_DIGEST_TOP_N", "10"))
+_SLACK_COALESCER: Any = False  # False → not created yet; None → coalescing off
 
-def notify_slack(channel: str, text: str) -> None:
+def _slack_coalescer() -> Optional[SlackCoalescer]:
+    global _SLACK_COALESCER
+    with _NOTIFY_LOCK:
+        if _SLACK_COALESCER is False:
+            window_s = load_coalesce_window_s(NOTIFY_CONFIG) if SLACK_COALESCE else 0.0
+            _SLACK_COALESCER = SlackCoalescer(_send_slack_now, window_s, top_n=SLACK_DIGEST_TOP_N).start() if window_s > 0 else None
+            if _SLACK_COALESCER is not None:
+                atexit.register(_SLACK_COALESCER.close)  # pending digests go out on shutdown
+    return _SLACK_COALESCER
+
+def _send_slack_now(channel: str, text: str) -> None:
+    payload = {"text": f"{channel} {text}"}
+    if _defer_if_quiet("slack", payload):
+        return
+    _send_with_retry("slack", payload)
+
+def flush_slack() -> int:
+    return _SLACK_COALESCER.flush() if _SLACK_COALESCER else 0
+
+def notify_slack(channel: str, text: str, coalesce: bool = True) -> None:
+    # coalesce=False for alerts that must not wait for the digest window
     if SLACK_WEBHOOK and not DRY_RUN:
         try:
-            requests.post(SLACK_WEBHOOK, json={"text": f"{channel} {text}"}, timeout=10)
+            coalescer = _slack_coalescer() if coalesce else None
+            if coalescer is not None:
+                coalescer.add(channel, text)
+            else:
+                _send_slack_now(channel, text)
         except Exception as e:
             print(f"[WARN] Slack notify failed: {e}")
     else:
         print(f"[SLACK{'/DRY' if DRY_RUN else ''}] {channel}: {text}")
 
+# Durable follow-up scheduler; jobs fire from run_scheduler() (`agent_runner.py --run-scheduler`)
+SCHEDULER_DB: str = os.getenv("SCHEDULER_DB", "var/scheduler.sqlite3")
+SCHEDULER_POLL_S: float = float(os.getenv("SCHEDULER_POLL_S", "5"))  # picks up jobs added by other processes
+_SCHEDULER: Optional[Scheduler] = None
+
+def _scheduler() -> Scheduler:
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = Scheduler(JobStore(SCHEDULER_DB), fire_scheduled_jobs, poll_s=SCHEDULER_POLL_S)
+    return _SCHEDULER
+
+def _epoch_utc(iso: str) -> float:
+    ts = datetime.fromisoformat(iso)
+    return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp()
+
 def schedule_flow(flow_name: str, lead_id: str, run_at_iso: str, only_if: Optional[str] = None) -> None:
-    # Replace with your real scheduler when ready
-    print(f"[SCHEDULE] {flow_name} for {lead_id} at {run_at_iso} only_if={only_if}")
+    job_id = _scheduler().schedule(flow_name, lead_id, _epoch_utc(run_at_iso), only_if)
+    print(f"[SCHEDULE] {flow_name} for {lead_id} at {run_at_iso} only_if={only_if} job={job_id}")
 
 def update_lead(where_id: str, **fields) -> None:
+    ob = _outbox()
+    if ob is not None:
+        ob.put_update("lead_log", {"id": "eq." + where_id}, fields)
+        return
     try:
         _sb_update("lead_log", {"id": "eq." + where_id}, fields)
     except Exception as e:
@@ -255,25 +880,81 @@ def exec_formb_helper(lead: Dict[str, Any], idem: str) -> None:
     run_48h = (datetime.utcnow() + timedelta(hours=48)).isoformat()
     schedule_flow("docs_microcommit_day3", lead.get("id", ""), run_48h, only_if="formb_uploaded==false")
 
+def exec_survey_pending_followup(lead: Dict[str, Any], idem: str) -> None:
+    send_whatsapp(
+        to=lead.get("wa_number", ""),
+        template_id="survey_nudge_v1",
+        variables={"name": lead.get("first_name", ""), "choice_cta": "Pilih slot survey"},
+        quick_replies=["Pilih Slot", "Saya Perlukan Bantuan"],
+    )
+
+def exec_docs_microcommit(lead: Dict[str, Any], idem: str) -> None:
+    send_whatsapp(
+        to=lead.get("wa_number", ""),
+        template_id="formb_helper_v2",
+        variables={"name": lead.get("first_name", ""), "formb_link": create_secure_link(lead.get("id", ""), ttl_hours=72), "video_url": "https://cdn.voltek.my/formb-1min.mp4"},
+    )
+
 # =========================
 # Flow wrapper + guardsets
 # =========================
 ExecFn = Callable[[Dict[str, Any], str], None]
 
-def run_flow(flow_name: str, lead: Dict[str, Any], guards: Dict[str, Any], exec_fn: ExecFn) -> Tuple[str, Optional[str]]:
-    allowed, reason, idem = should_fire(lead, flow_name, guards)
+def _deferrable(exec_fn: Callable[[Dict[str, Any], str], Any], flow_name: str) -> Callable[[Dict[str, Any], str], Any]:
+    """exec_fn wrapped to return True when a send it made was parked for quiet hours (sync or async)."""
+    if asyncio.iscoroutinefunction(exec_fn):
+
+        @functools.wraps(exec_fn)
+        async def run_async(lead: Dict[str, Any], idem: str) -> bool:
+            sending = {"lead_id": lead["id"], "flow_name": flow_name, "idempotency_key": idem, "deferred": 0}
+            token = _FLOW_SEND.set(sending)
+            try:
+                await exec_fn(lead, idem)
+            finally:
+                _FLOW_SEND.reset(token)
+            return sending["deferred"] > 0
+
+        return run_async
+
+    @functools.wraps(exec_fn)
+    def run(lead: Dict[str, Any], idem: str) -> bool:
+        sending = {"lead_id": lead["id"], "flow_name": flow_name, "idempotency_key": idem, "deferred": 0}
+        token = _FLOW_SEND.set(sending)
+        try:
+            exec_fn(lead, idem)
+        finally:
+            _FLOW_SEND.reset(token)
+        return sending["deferred"] > 0
+
+    return run
+
+def _run_flow_steps(flow_name: str, lead: Dict[str, Any], guards: Dict[str, Any], exec_fn: ExecFn):
+    # Flow body as engine steps; drive_sync (run_flow) and AsyncFlowEngine (run_flow_async) run it.
+    # Each step is timed as guard / log / exec under (flow, brand); nested _sb_* calls inherit the labels.
+    _latency_flusher()
+    brand = str(lead.get("brand") or "")
+    guard = LATENCY.timed("guard", should_fire, flow_name, brand)
+    log = LATENCY.timed("log", log_trigger, flow_name, brand)
+    allowed, reason, idem = yield call(guard, lead, flow_name, guards)
     if not allowed:
-        log_trigger(lead["id"], flow_name, "skipped", idem, reason=reason)
+        # An existing key already has its row; upserting "skipped" would overwrite its status
+        if reason != "idempotent_key_exists":
+            yield call(log, lead["id"], flow_name, "skipped", idem, reason=reason)
         return "skipped", reason
-    log_trigger(lead["id"], flow_name, "queued", idem)
+    yield call(log, lead["id"], flow_name, "queued", idem)
     try:
-        exec_fn(lead, idem)
-        log_trigger(lead["id"], flow_name, "sent", idem)
-        return "sent", None
+        deferred = yield call(LATENCY.timed("exec", _deferrable(exec_fn, flow_name), flow_name, brand), lead, idem)
+        status = "deferred" if deferred else "sent"
+        yield call(log, lead["id"], flow_name, status, idem)
+        return status, None
     except Exception as e:
-        log_trigger(lead["id"], flow_name, "error", idem, error=str(e))
+        yield call(log, lead["id"], flow_name, "error", idem, error=str(e))
         return "error", str(e)
 
+def run_flow(flow_name: str, lead: Dict[str, Any], guards: Dict[str, Any], exec_fn: ExecFn) -> Tuple[str, Optional[str]]:
+    with LATENCY.measure("flow", flow_name, str(lead.get("brand") or "")):
+        return drive_sync(_run_flow_steps(flow_name, lead, guards, exec_fn))
+
 def guards_survey_pending_alert(lead: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "idempotency_key": idem_key(lead["id"], lead.get("stage", ""), "survey_pending_alert"),
@@ -291,75 +972,691 @@ def guards_formb_helper(lead: Dict[str, Any]) -> Dict[str, Any]:
 # =================
 # Example triggers
 # =================
+# Compiled conditions (callable per lead; LeadBatch vectorizes them over columns)
+WHEN_SURVEY_PENDING_ALERT = compile_condition(
+    'stage == "Deposit" and not survey_scheduled and idle_days >= 7 and not do_not_proceed and not do_not_contact'
+)
+WHEN_FORMB_HELPER = compile_condition(
+    "quote_sent and not formb_uploaded and hours_since_quote >= 24 and not do_not_proceed and not do_not_contact"
+)
+
+def when_survey_pending_alert(lead: Dict[str, Any]) -> bool:
+    return WHEN_SURVEY_PENDING_ALERT(lead)
+
+def when_formb_helper(lead: Dict[str, Any]) -> bool:
+    return WHEN_FORMB_HELPER(lead)
+
 def maybe_fire_survey_pending_alert(lead: Dict[str, Any]):
-    if (
-        lead.get("stage") == "Deposit"
-        and not lead.get("survey_scheduled", False)
-        and float(lead.get("idle_days", 0)) >= 7.0
-        and not lead.get("do_not_proceed", False)
-        and not lead.get("do_not_contact", False)
-    ):
+    if when_survey_pending_alert(lead):
         return run_flow("survey_pending_alert", lead, guards_survey_pending_alert(lead), exec_survey_pending_alert)
     return "skipped", "when_not_matched"
 
 def maybe_fire_formb_helper(lead: Dict[str, Any]):
-    quote_sent = bool(lead.get("quote_sent"))
-    hours_since_quote = float(lead.get("hours_since_quote", 0))
-    if (
-        quote_sent
-        and not lead.get("formb_uploaded", False)
-        and hours_since_quote >= 24
-        and not lead.get("do_not_proceed", False)
-        and not lead.get("do_not_contact", False)
-    ):
+    if when_formb_helper(lead):
         return run_flow("formb_helper", lead, guards_formb_helper(lead), exec_formb_helper)
     return "skipped", "when_not_matched"
 
-def _load_flow_meta(flow_path: Path) -> Dict[str, Any]:
-    try:
-        text = flow_path.read_text()
-    except FileNotFoundError:
-        raise
+# flow_name → (when, guards, exec); the batch/sweep paths iterate this table.
+# reload_config swaps in a new dict rather than editing this one, and batch paths resolve
+# their flows once (trigger_table), so a reload never changes a chunk mid-flight.
+WhenFn = Callable[[Dict[str, Any]], bool]
+GuardFn = Callable[[Dict[str, Any]], Dict[str, Any]]
+Trigger = Tuple[WhenFn, GuardFn, ExecFn]
+TRIGGERS: Dict[str, Trigger] = {
+    "survey_pending_alert": (WHEN_SURVEY_PENDING_ALERT, guards_survey_pending_alert, exec_survey_pending_alert),
+    "formb_helper": (WHEN_FORMB_HELPER, guards_formb_helper, exec_formb_helper),
+}
 
-    if yaml:
+# Python definitions, restored when a YAML flow that replaced one is removed
+BUILTIN_TRIGGERS: Dict[str, Trigger] = dict(TRIGGERS)
+
+def trigger_table(flow_names: Optional[Iterable[str]] = None) -> Dict[str, Trigger]:
+    """Snapshot of the named triggers (all by default), taken from one read of TRIGGERS."""
+    table = TRIGGERS
+    return {name: table[name] for name in (flow_names or table)}
+
+# Follow-ups fired by the scheduler (flow_name → exec); guarded like any other flow
+SCHEDULED_FLOWS: Dict[str, ExecFn] = {
+    "survey_pending_alert_followup": exec_survey_pending_followup,
+    "docs_microcommit_day2": exec_docs_microcommit,
+    "docs_microcommit_day3": exec_docs_microcommit,
+}
+
+def _load_leads(lead_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    leads: Dict[str, Dict[str, Any]] = {}
+    for ids in chunked(sorted(set(lead_ids)), PREFETCH_IN_CHUNK):
+        for row in _sb_select_rows("lead_log", {"select": "*", "id": "in.(" + ",".join(ids) + ")"}):
+            leads[str(row["id"])] = row
+    return leads
+
+def fire_scheduled_jobs(jobs: List[Dict[str, Any]]) -> Dict[int, Tuple[str, Optional[str]]]:
+    """
+    Scheduler callback: load the due leads in one pass, re-check only_if now (one compiled
+    condition per distinct expression, evaluated over its whole group), then run the flows.
+    """
+    leads = _load_leads([job["lead_id"] for job in jobs])
+    results: Dict[int, Tuple[str, Optional[str]]] = {}
+    groups: Dict[str, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+    for job in jobs:
+        lead = leads.get(str(job["lead_id"]))
+        if job["flow_name"] not in SCHEDULED_FLOWS:
+            results[job["id"]] = ("error", f"unknown flow {job['flow_name']}")
+        elif lead is None:
+            results[job["id"]] = ("skipped", "lead_missing")
+        else:
+            groups.setdefault(job["only_if"] or "", []).append((job, lead))
+
+    runnable: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    for source, group in groups.items():
         try:
-            data = yaml.safe_load(text) or {}
-            if isinstance(data, dict):
-                meta_section = data.get("meta")
-                if isinstance(meta_section, dict):
-                    return {str(key): meta_section[key] for key in meta_section}
-                # fall back to top-level hints
-                return {
-                    key: data[key]
-                    for key in ("flow_name", "description", "owner")
-                    if key in data
-                }
-        except Exception:  # pragma: no cover - best effort parser
-            pass
-
-    meta: Dict[str, Any] = {}
-    in_meta = False
-    for raw in text.splitlines():
-        stripped = raw.strip()
-        if stripped.startswith("meta:"):
-            in_meta = True
+            condition = compile_condition(source)
+        except ConditionError as e:
+            results.update({job["id"]: ("error", f"invalid only_if: {e}") for job, _ in group})
             continue
-        if in_meta:
-            if raw.startswith("  ") and ":" in raw:
-                key, value = stripped.split(":", 1)
-                meta[key.strip()] = value.strip().strip('"')
-            elif stripped and not raw.startswith("  "):
-                break
-
-    if not meta:
-        for raw in text.splitlines():
-            if ":" not in raw:
+        for (job, lead), holds in zip(group, condition.mask([lead for _, lead in group])):
+            if holds:
+                runnable.append((job, lead))
+            else:
+                results[job["id"]] = ("skipped", "only_if_false")
+
+    for job, lead in runnable:
+        guards = {"idempotency_key": f"{lead['id']}:sched:{job['id']}:{job['flow_name']}"}
+        status, reason = run_flow(job["flow_name"], lead, guards, SCHEDULED_FLOWS[job["flow_name"]])
+        results[job["id"]] = ("done" if status in ("sent", "deferred") else status, reason)
+    return results
+
+def run_scheduler(stop: Optional[threading.Event] = None) -> None:
+    scheduler = _scheduler().start()
+    if not DRY_RUN:
+        _deferrals()  # the long-lived process releases quiet-hours sends
+    print(f"[SCHEDULER] running: {scheduler.metrics()}")
+    try:
+        (stop or threading.Event()).wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+
+# ===========
+# YAML flows
+# ===========
+RUNNER_FLOWS_DIR: str = os.getenv("RUNNER_FLOWS_DIR", "config/flows")
+FLOW_RELOAD_S: float = float(os.getenv("FLOW_RELOAD_S", "2"))
+_FLOW_REGISTRY: Optional[FlowRegistry] = None
+
+def _action_whatsapp(params: Dict[str, Any], lead: Dict[str, Any], idem: str) -> None:
+    send_whatsapp(
+        to=params.get("to") or lead.get("wa_number", ""),
+        template_id=params["template_id"],
+        variables=params.get("variables"),
+        quick_replies=params.get("quick_replies"),
+    )
+
+def _action_slack(params: Dict[str, Any], lead: Dict[str, Any], idem: str) -> None:
+    notify_slack(params.get("channel", "#ops-leads"), params["text"])
+
+def _action_schedule(params: Dict[str, Any], lead: Dict[str, Any], idem: str) -> None:
+    delay = timedelta(hours=float(params.get("after_hours", 0)), days=float(params.get("after_days", 0)))
+    run_at = (datetime.utcnow() + delay).isoformat()
+    schedule_flow(params["flow"], lead.get("id", ""), run_at, only_if=params.get("only_if"))
+
+def _action_update_lead(params: Dict[str, Any], lead: Dict[str, Any], idem: str) -> None:
+    update_lead(lead.get("id", ""), **params)
+
+FLOW_ACTIONS = {
+    "whatsapp": _action_whatsapp,
+    "slack": _action_slack,
+    "schedule": _action_schedule,
+    "update_lead": _action_update_lead,
+}
+# Computed placeholders available to every flow template
+FLOW_EXTRAS = {"secure_link": lambda lead: create_secure_link(lead.get("id", ""), ttl_hours=72)}
+
+def flow_registry() -> FlowRegistry:
+    global _FLOW_REGISTRY
+    if _FLOW_REGISTRY is None:
+        _FLOW_REGISTRY = FlowRegistry(FLOW_ACTIONS, FLOW_EXTRAS, check_interval_s=FLOW_RELOAD_S)
+    return _FLOW_REGISTRY
+
+def yaml_flows(directory: Optional[str] = None) -> List[CompiledFlow]:
+    return [f for f in flow_registry().load_dir(directory or RUNNER_FLOWS_DIR) if f.executable]
+
+def yaml_trigger(flow: CompiledFlow) -> Tuple[WhenFn, GuardFn, ExecFn]:
+    def guards(lead: Dict[str, Any]) -> Dict[str, Any]:
+        return {"idempotency_key": idem_key(lead["id"], lead.get("stage", ""), flow.name), **flow.guard_config}
+    return flow.when, guards, flow.execute  # type: ignore[return-value]
+
+def register_yaml_flows(
+    directory: Optional[str] = None, override: Optional[bool] = None, table: Optional[Dict[str, Trigger]] = None
+) -> List[str]:
+    """
+    Adds executable YAML flows to TRIGGERS (or `table`) so fire_batch / fire_many / submit_lead pick
+    them up. Flows in RUNNER_FLOWS_DIR are the editable definitions and replace built-in triggers
+    of the same name; for other directories existing names win unless override=True.
+    """
+    table = TRIGGERS if table is None else table
+    if override is None:
+        override = directory is None or Path(directory).resolve() == Path(RUNNER_FLOWS_DIR).resolve()
+    added = []
+    for flow in yaml_flows(directory):
+        if flow.name in table:
+            if not override:
+                print(f"[FLOWS] {flow.path}: shadowed by the existing {flow.name} trigger, not registered")
                 continue
-            key, value = raw.split(":", 1)
-            key = key.strip()
-            if key in {"flow_name", "description"}:
-                meta[key] = value.strip().strip('"')
-    return meta
+            print(f"[FLOWS] {flow.path}: replaces the existing {flow.name} trigger")
+        table[flow.name] = yaml_trigger(flow)
+        added.append(flow.name)
+    return added
+
+def fire_yaml_flows(lead: Dict[str, Any], directory: Optional[str] = None) -> Dict[str, Tuple[str, Optional[str]]]:
+    # Only flows whose trigger matches are guarded/executed; the registry buckets by stage etc.
+    yaml_flows(directory)
+    results: Dict[str, Tuple[str, Optional[str]]] = {}
+    for flow in flow_registry().matching(lead, directory or RUNNER_FLOWS_DIR):  # not flows other dirs loaded
+        _when, guards, exec_fn = yaml_trigger(flow)
+        results[flow.name] = run_flow(flow.name, lead, guards(lead), exec_fn)
+    return results
+
+# ==================
+# Batch evaluation
+# ==================
+BATCH_CHUNK: int = int(os.getenv("BATCH_CHUNK", "1000"))
+PREFETCH_IN_CHUNK: int = int(os.getenv("PREFETCH_IN_CHUNK", "200"))  # ids per in.(...) filter (URL length)
+# Chunks at least this large evaluate compiled trigger conditions column-wise (NumPy)
+VECTOR_MIN_ROWS: int = int(os.getenv("VECTOR_MIN_ROWS", "64"))
+
+def prefetch_trigger_log(lead_ids: List[str], flow_names: List[str]) -> TriggerLogIndex:
+    index = TriggerLogIndex()
+    flows = "in.(" + ",".join(flow_names) + ")"
+    for ids in chunked(sorted(set(lead_ids)), PREFETCH_IN_CHUNK):
+        rows = _sb_select_rows(
+            "yaml_trigger_log",
+            {"select": "lead_id,flow_name,idempotency_key,trigger_time", "lead_id": "in.(" + ",".join(ids) + ")", "flow_name": flows},
+        )
+        for row in rows:
+            index.add(row)
+    return index
+
+def _merge_pending_trigger_rows(index: TriggerLogIndex, lead_ids: Iterable[str], flow_names: List[str]) -> None:
+    # Outboxed/buffered rows are not visible to the prefetch yet; the single-lead path counts them too
+    ids, flows = sorted({str(i) for i in lead_ids}), set(flow_names)
+    pending: List[Dict[str, Any]] = []
+    ob = _outbox()
+    if ob is not None:
+        for chunk in chunked(ids, PREFETCH_IN_CHUNK):  # SQLite bound-parameter limit
+            pending += ob.pending_payloads("yaml_trigger_log", lead_id=chunk, flow_name=sorted(flows))
+    buf = _trigger_buffer()
+    if buf is not None:
+        pending += buf.pending_rows()
+    wanted = set(ids)
+    for row in pending:
+        if str(row.get("lead_id")) in wanted and row.get("flow_name") in flows:
+            index.add(row)
+
+def _match_triggers(leads: Any, triggers: Dict[str, Trigger], summary: BatchSummary) -> List[Tuple[str, Dict[str, Any]]]:
+    """(flow, lead) pairs whose trigger holds, lead-major; non-matches are only counted."""
+    flow_names = list(triggers)
+    whens = [triggers[flow_name][0] for flow_name in flow_names]
+    vector = isinstance(leads, LeadBatch) or (
+        NUMPY_AVAILABLE and len(leads) >= VECTOR_MIN_ROWS and any(isinstance(w, Condition) for w in whens)
+    )
+    if not vector:
+        candidates: List[Tuple[str, Dict[str, Any]]] = []
+        for lead in leads:
+            for flow_name, when in zip(flow_names, whens):
+                if when(lead):
+                    candidates.append((flow_name, lead))
+                else:
+                    summary.record(flow_name, "skipped", "when_not_matched")
+        return candidates
+
+    batch = leads if isinstance(leads, LeadBatch) else LeadBatch.from_dicts(leads)
+    hits: List[Tuple[int, int]] = []
+    for pos, (flow_name, when) in enumerate(zip(flow_names, whens)):
+        if isinstance(when, Condition):
+            matched = batch.mask(when).nonzero()[0].tolist()
+        else:
+            matched = [i for i, lead in enumerate(batch.rows()) if when(lead)]
+        summary.record(flow_name, "skipped", "when_not_matched", n=len(batch) - len(matched))
+        hits += [(i, pos) for i in matched]
+    hits.sort()
+    matched_rows = sorted({i for i, _ in hits})
+    rows = dict(zip(matched_rows, batch.rows(matched_rows)))  # only matching rows become dicts
+    return [(flow_names[pos], rows[i]) for i, pos in hits]
+
+def _fire_chunk(
+    leads: Any,
+    triggers: Dict[str, Trigger],
+    summary: BatchSummary,
+    pool: Optional[FlowWorkerPool] = None,
+) -> None:
+    # leads: a list of dicts or a LeadBatch; triggers: a trigger_table() snapshot
+    flow_names = list(triggers)
+    candidates = _match_triggers(leads, triggers, summary)
+    if not candidates:
+        return
+
+    try:
+        with LATENCY.measure("batch.prefetch", "", ""):
+            lead_ids = [lead["id"] for _, lead in candidates]
+            index = prefetch_trigger_log(lead_ids, flow_names)
+            _merge_pending_trigger_rows(index, lead_ids, flow_names)
+    except Exception as e:
+        # Fail closed: without trigger history the idempotency guards cannot be honoured
+        print(f"[WARN] fire_batch prefetch failed: {e}")
+        for flow_name, _ in candidates:
+            summary.record(flow_name, "error", "guard_prefetch_failed")
+        return
+
+    rows: List[Dict[str, Any]] = []
+    sends: List[Tuple[int, str, Dict[str, Any], str, Any]] = []
+    for flow_name, lead in candidates:
+        _, guards_fn, exec_fn = triggers[flow_name]
+        exec_fn = LATENCY.timed("exec", _deferrable(exec_fn, flow_name), flow_name, str(lead.get("brand") or ""))
+        guards = guards_fn(lead)
+        key = guards.get("idempotency_key") or idem_key(lead["id"], lead.get("stage", ""), flow_name)
+        if _idem_index().confirmed(key):  # fired earlier in this process, maybe not flushed yet
+            summary.record(flow_name, "skipped", "idempotent_key_exists")
+            continue
+        n_days = int(guards.get("not_fired_in_days", 0) or 0)
+        since = datetime.utcnow() - timedelta(days=n_days) if n_days > 0 else None
+        allowed, reason = evaluate_guards(index.stats(lead["id"], flow_name, key, since), guards)
+        if not allowed and reason == "idempotent_key_exists":
+            summary.record(flow_name, "skipped", reason)
+            continue
+        if not allowed:
+            row = _trigger_row(lead["id"], flow_name, "skipped", key, reason=reason)
+            summary.record(flow_name, "skipped", reason)
+        else:
+            # Placeholder keeps later duplicates in this chunk guarded; replaced once the send settles
+            row = _trigger_row(lead["id"], flow_name, "queued", key)
+            job = pool.submit(lead_tenant(lead), exec_fn, lead, key) if pool is not None else None
+            sends.append((len(rows), flow_name, lead, key, job or exec_fn))
+        index.add(row)
+        _idem_index().add(key)
+        rows.append(row)
+
+    for pos, flow_name, lead, key, job in sends:
+        try:
+            deferred = job.result() if isinstance(job, Future) else job(lead, key)
+            status = "deferred" if deferred else "sent"
+            rows[pos] = _trigger_row(lead["id"], flow_name, status, key)
+            summary.record(flow_name, status, None)
+        except Exception as e:
+            rows[pos] = _trigger_row(lead["id"], flow_name, "error", key, error=str(e))
+            summary.record(flow_name, "error", type(e).__name__)
+    if not rows:
+        return
+
+    if _enqueue_trigger_rows(rows):
+        summary.log_rows += len(rows)
+        return
+    try:
+        with LATENCY.measure("batch.log", "", ""):
+            _upsert_trigger_rows(rows)
+        summary.log_rows += len(rows)
+    except Exception as e:
+        print(f"[WARN] fire_batch log upsert failed: {e}")
+        summary.log_errors += len(rows)
+
+def fire_batch(
+    leads: Any,
+    flow_names: Optional[List[str]] = None,
+    chunk_size: int = BATCH_CHUNK,
+    pool: Optional[FlowWorkerPool] = None,
+) -> Dict[str, Any]:
+    """
+    Evaluate many leads against TRIGGERS in chunks: one prefetch of yaml_trigger_log per chunk,
+    guards evaluated in memory, one multi-row upsert of the resulting trigger logs.
+    Accepts any iterable (generators stream chunk by chunk). Returns a summary dict.
+    With a pool (e.g. flow_pool()), sends run concurrently under per-tenant caps.
+    A LeadBatch (columnar) is sliced as-is; compiled triggers are evaluated as NumPy masks.
+    """
+    triggers = trigger_table(flow_names)
+    summary = BatchSummary()
+    chunks = leads.chunks(chunk_size) if isinstance(leads, LeadBatch) else chunked(leads, chunk_size)
+    for chunk in chunks:
+        summary.leads += len(chunk)
+        _fire_chunk(chunk, triggers, summary, pool)
+    return summary.as_dict()
+
+# ==================
+# asyncio runtime
+# ==================
+FLOW_MAX_IN_FLIGHT: int = int(os.getenv("FLOW_MAX_IN_FLIGHT", "32"))
+_ASYNC_ENGINE: Optional[AsyncFlowEngine] = None
+
+def _async_engine() -> AsyncFlowEngine:
+    global _ASYNC_ENGINE
+    if _ASYNC_ENGINE is None:
+        _ASYNC_ENGINE = AsyncFlowEngine(FLOW_MAX_IN_FLIGHT)
+    return _ASYNC_ENGINE
+
+async def should_fire_async(lead: Dict[str, Any], flow_name: str, guards: Dict[str, Any]) -> Tuple[bool, str, str]:
+    return await asyncio.to_thread(should_fire, lead, flow_name, guards)
+
+async def send_whatsapp_async(to: str, template_id: str, variables: Optional[Dict[str, Any]] = None, quick_replies: Optional[list[str]] = None) -> None:
+    await asyncio.to_thread(send_whatsapp, to, template_id, variables, quick_replies)
+
+async def notify_slack_async(channel: str, text: str) -> None:
+    await asyncio.to_thread(notify_slack, channel, text)
+
+async def run_flow_async(
+    flow_name: str,
+    lead: Dict[str, Any],
+    guards: Dict[str, Any],
+    exec_fn: Callable[[Dict[str, Any], str], Any],
+    engine: Optional[AsyncFlowEngine] = None,
+) -> Tuple[str, Optional[str]]:
+    """Async run_flow; exec_fn may be a plain function or a coroutine function."""
+    engine = engine or _async_engine()
+    with LATENCY.measure("flow", flow_name, str(lead.get("brand") or "")):
+        return await engine.run(lambda: _run_flow_steps(flow_name, lead, guards, exec_fn))
+
+async def maybe_fire_async(flow_name: str, lead: Dict[str, Any], engine: Optional[AsyncFlowEngine] = None):
+    when_fn, guards_fn, exec_fn = TRIGGERS[flow_name]
+    if not when_fn(lead):
+        return "skipped", "when_not_matched"
+    return await run_flow_async(flow_name, lead, guards_fn(lead), exec_fn, engine)
+
+async def fire_many_async(
+    leads: Iterable[Dict[str, Any]],
+    flow_names: Optional[List[str]] = None,
+    max_in_flight: Optional[int] = None,
+) -> List[Tuple[str, str, Tuple[str, Optional[str]]]]:
+    """
+    Evaluate leads × flows concurrently in one event loop, at most max_in_flight at a time.
+    Returns (lead_id, flow_name, (status, reason)) per evaluated pair, in input order.
+    """
+    triggers = trigger_table(flow_names)
+    engine = AsyncFlowEngine(max_in_flight) if max_in_flight else _async_engine()
+    pairs: List[Tuple[Dict[str, Any], str]] = []
+
+    def factories():
+        # Lazy: the engine pulls leads only as in-flight slots free up
+        for lead in leads:
+            for flow_name, (when_fn, guards_fn, exec_fn) in triggers.items():
+                pairs.append((lead, flow_name))
+                if when_fn(lead):
+                    yield functools.partial(_run_flow_steps, flow_name, lead, guards_fn(lead), exec_fn)
+                else:
+                    yield functools.partial(returning, ("skipped", "when_not_matched"))
+
+    try:
+        results = await engine.map(factories())
+    finally:
+        if max_in_flight:
+            engine.close()
+    return [(lead["id"], flow_name, result) for (lead, flow_name), result in zip(pairs, results)]
+
+def fire_many(leads: Iterable[Dict[str, Any]], flow_names: Optional[List[str]] = None, max_in_flight: Optional[int] = None):
+    return asyncio.run(fire_many_async(leads, flow_names, max_in_flight))
+
+# ==========================
+# Worker pool (batch/daemon)
+# ==========================
+FLOW_POOL_WORKERS: int = int(os.getenv("FLOW_POOL_WORKERS", "16"))
+TENANT_LIMITS: Dict[str, int] = parse_tenant_limits(os.getenv("TENANT_LIMITS", ""))  # e.g. "Voltek=8,Perodua=4"
+TENANT_DEFAULT_LIMIT: int = int(os.getenv("TENANT_DEFAULT_LIMIT", "0")) or FLOW_POOL_WORKERS
+_FLOW_POOL: Optional[FlowWorkerPool] = None
+
+def lead_tenant(lead: Dict[str, Any], default: Optional[str] = None) -> str:
+    return str(lead.get("tenant_id") or lead.get("brand") or default or os.getenv("BRAND", "Voltek"))
+
+def flow_pool() -> FlowWorkerPool:
+    global _FLOW_POOL
+    if _FLOW_POOL is None:
+        _FLOW_POOL = FlowWorkerPool(FLOW_POOL_WORKERS, TENANT_LIMITS, TENANT_DEFAULT_LIMIT)
+    return _FLOW_POOL
+
+def _fire_lead(lead: Dict[str, Any], flow_names: List[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+    results: Dict[str, Tuple[str, Optional[str]]] = {}
+    for flow_name in flow_names:
+        when_fn, guards_fn, exec_fn = TRIGGERS[flow_name]
+        results[flow_name] = run_flow(flow_name, lead, guards_fn(lead), exec_fn) if when_fn(lead) else ("skipped", "when_not_matched")
+    return results
+
+def submit_lead(
+    lead: Dict[str, Any],
+    flow_names: Optional[List[str]] = None,
+    tenant: Optional[str] = None,
+    pool: Optional[FlowWorkerPool] = None,
+) -> Future:
+    """Queue one lead (all TRIGGERS by default) on the shared pool under its tenant's cap."""
+    pool = pool or flow_pool()
+    return pool.submit(tenant or lead_tenant(lead), _fire_lead, lead, list(flow_names or TRIGGERS))
+
+def drain_pool(timeout: Optional[float] = None) -> Dict[str, Any]:
+    pool = flow_pool()
+    pool.drain(timeout)
+    return pool.metrics()
+
+# ==============================
+# Streaming ingestion (--leads)
+# ==============================
+LEADS_CHUNK: int = int(os.getenv("LEADS_CHUNK", "500"))
+LEADS_MAX_QUEUED: int = int(os.getenv("LEADS_MAX_QUEUED", "0")) or 2 * FLOW_POOL_WORKERS
+LEADS_PROGRESS_S: float = float(os.getenv("LEADS_PROGRESS_S", "5"))
+
+def _bounded_pool() -> FlowWorkerPool:
+    # Private pool for one streaming run: submit() blocks once LEADS_MAX_QUEUED sends are waiting
+    return FlowWorkerPool(FLOW_POOL_WORKERS, TENANT_LIMITS, TENANT_DEFAULT_LIMIT, max_queued=LEADS_MAX_QUEUED)
+
+def run_leads(
+    sources: List[str],
+    flow_names: Optional[List[str]] = None,
+    chunk_size: Optional[int] = None,
+    pool: Optional[FlowWorkerPool] = None,
+    progress_s: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Stream JSONL leads (files, .gz or "-" for stdin) through parse → normalize → trigger filter →
+    guards → execute. Each chunk goes through _fire_chunk (vector filter, one trigger-log prefetch,
+    pooled sends); the pool's max_queued blocks the reader while sends lag, so memory stays at
+    about one chunk plus the pool queue regardless of input size.
+    """
+    stats = IngestStats()
+    own_pool = pool is None
+    pool = pool or _bounded_pool()
+    try:
+        return _fire_lead_stream(stream_leads(sources, stats), stats, flow_names, chunk_size, pool, progress_s)
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+def _fire_lead_stream(
+    leads: Iterable[Dict[str, Any]],
+    stats: IngestStats,
+    flow_names: Optional[List[str]],
+    chunk_size: Optional[int],
+    pool: FlowWorkerPool,
+    progress_s: Optional[float] = None,
+) -> Dict[str, Any]:
+    triggers = trigger_table(flow_names)  # a concurrent reload_config cannot change this stream's flows
+    summary = BatchSummary()
+    progress = Progress(LEADS_PROGRESS_S if progress_s is None else progress_s)
+
+    def status() -> Dict[str, Any]:
+        counts = summary.as_dict()
+        return {**stats.as_dict(), "sent": counts["sent"], "deferred": counts["deferred"], "skipped": counts["skipped"], "error": counts["error"], "queued": pool.metrics()["queued"]}
+
+    for chunk in chunked(leads, chunk_size or LEADS_CHUNK):
+        summary.leads += len(chunk)
+        _fire_chunk(chunk, triggers, summary, pool)
+        progress.maybe(status)
+    if progress.interval_s > 0:
+        progress.emit(status())
+    result = summary.as_dict()
+    result["ingest"] = dict(stats.as_dict(), last_error=stats.last_error)
+    return result
+
+# =============================
+# Full-table sweep (lead_log)
+# =============================
+SWEEP_TABLE: str = os.getenv("SWEEP_TABLE", "lead_log")
+SWEEP_PAGE_SIZE: int = int(os.getenv("SWEEP_PAGE_SIZE", "1000"))
+SWEEP_BOOL_COLUMNS = BOOL_FIELDS  # lead_log boolean flags: bare/negated fields push down as is.true / not.is.true
+
+def sweep_filter(flow_names: List[str]) -> Dict[str, str]:
+    """PostgREST filter for rows any of the triggers could match; {} if one of them is not a Condition."""
+    whens = [TRIGGERS[name][0] for name in flow_names]
+    if not whens or not all(isinstance(w, Condition) for w in whens):
+        return {}
+    return filter_params([w.ast for w in whens], SWEEP_BOOL_COLUMNS)
+
+def _fetch_lead_page(params: Dict[str, str]) -> List[Dict[str, Any]]:
+    with LATENCY.measure(f"sb.select:{SWEEP_TABLE}"):
+        return _sb_client().select(SWEEP_TABLE, params).json() or []
+
+def sweep_leads(
+    flow_names: Optional[List[str]] = None,
+    page_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    pool: Optional[FlowWorkerPool] = None,
+    start_after: Optional[str] = None,
+    select: str = "*",
+) -> Dict[str, Any]:
+    """
+    Run TRIGGERS over the whole lead table. The triggers' conditions become a PostgREST filter
+    (only candidates cross the network), pages are keyset-paginated on id, and pages stream into
+    fire_batch as they arrive. The summary's sweep.last_id resumes an interrupted sweep.
+    """
+    flow_names = list(flow_names or TRIGGERS)
+    params = {"select": select, **sweep_filter(flow_names)}
+    stats: Dict[str, Any] = {"pages": 0, "rows": 0, "last_id": start_after}
+
+    def rows() -> Iterator[Dict[str, Any]]:
+        pages = keyset_pages(_fetch_lead_page, params, "id", page_size or SWEEP_PAGE_SIZE, start_after)
+        while True:
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            except Exception as e:
+                # Stop here; rows already yielded still finish, last_id says where to resume
+                print(f"[WARN] sweep page fetch failed after id={stats['last_id']}: {e}")
+                stats["error"] = str(e)
+                return
+            stats["pages"] += 1
+            stats["rows"] += len(page)
+            yield from page
+            stats["last_id"] = page[-1]["id"]
+
+    own_pool = pool is None
+    pool = pool or _bounded_pool()
+    try:
+        summary = fire_batch(rows(), flow_names, chunk_size or BATCH_CHUNK, pool)
+    finally:
+        if own_pool:
+            pool.shutdown()
+    summary["sweep"] = dict(stats, table=SWEEP_TABLE, filter=params.get("and") or params.get("or"))
+    return summary
+
+# ==========================
+# Resident daemon (--serve)
+# ==========================
+SERVE_SPOOL: str = os.getenv("SERVE_SPOOL", "var/spool")
+SERVE_SOCKET: str = os.getenv("SERVE_SOCKET", "")  # e.g. var/agent_runner.sock
+SERVE_POLL_S: float = float(os.getenv("SERVE_POLL_S", "1"))
+_SERVED_YAML_FLOWS: List[str] = []
+
+def reload_config(changed: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Re-read file-backed config in place: notify.yaml (rate limits, quiet hours, retry policy,
+    Slack digest window), WhatsApp templates and YAML flows. Pools, HTTP sessions, breakers and
+    caches stay warm; only what the files describe is swapped.
+    """
+    global _QUIET_HOURS, _RETRY_POLICY, _TEMPLATES, _SLACK_COALESCER, TRIGGERS
+    flow_registry().load_dir(RUNNER_FLOWS_DIR, force=True)  # a broken flow file aborts before anything is swapped
+    with _NOTIFY_LOCK:
+        if _RATE_LIMITER is not None:
+            _RATE_LIMITER.limits = load_rate_limits(NOTIFY_CONFIG)  # bucket levels persist in SQLite
+        _QUIET_HOURS = False
+        _RETRY_POLICY = None
+        window_s = load_coalesce_window_s(NOTIFY_CONFIG) if SLACK_COALESCE else 0.0
+        if _SLACK_COALESCER and window_s > 0:
+            _SLACK_COALESCER.window_s = window_s
+        elif _SLACK_COALESCER:
+            _SLACK_COALESCER.close()  # coalescing switched off: pending digests go out now
+            _SLACK_COALESCER = None
+        elif _SLACK_COALESCER is None and window_s > 0:
+            _SLACK_COALESCER = False  # recreated on next notify_slack
+    _TEMPLATES = None
+    templates = len(template_registry())
+    # Build the new table aside and swap it in with one rebinding: streams in flight keep their
+    # trigger_table() snapshot, new ones see the complete new set
+    table = {name: trigger for name, trigger in TRIGGERS.items() if name not in _SERVED_YAML_FLOWS}
+    table.update({name: BUILTIN_TRIGGERS[name] for name in _SERVED_YAML_FLOWS if name in BUILTIN_TRIGGERS})
+    served = register_yaml_flows(table=table)
+    TRIGGERS = table
+    _SERVED_YAML_FLOWS[:] = served
+    flows = sorted(table)
+    print(f"[SERVE] reloaded ({', '.join(changed) or 'startup'}): flows={flows} templates={templates}")
+    return {"flows": flows, "templates": templates}
+
+def serve(
+    spool_dir: Optional[str] = None,
+    socket_path: Optional[str] = None,
+    flow_names: Optional[List[str]] = None,
+    chunk_size: Optional[int] = None,
+    stop: Optional[threading.Event] = None,
+) -> Daemon:
+    """
+    Resident runner: JSONL files dropped into spool_dir and JSONL streamed over socket_path go
+    through the same pipeline as --leads, on one warm pool. Flow, template and notify files are
+    watched and reloaded on change (or SIGHUP) without a restart. Follow-ups scheduled by the
+    flows are dispatched in-process, so no companion --run-scheduler is needed. Returns after
+    stop is set.
+    """
+    pool = _bounded_pool()
+
+    def handle_lines(lines, source: str) -> Dict[str, Any]:
+        stats = IngestStats()
+        result = _fire_lead_stream(leads_from_lines(lines, stats), stats, flow_names, chunk_size, pool, progress_s=0)
+        print(f"[SERVE] {source}: leads={result['leads']} sent={result['sent']} deferred={result['deferred']} skipped={result['skipped']} error={result['error']}")
+        return result
+
+    # Watcher baseline first: a flow file saved during the startup load still counts as a change
+    daemon = Daemon(
+        handle_lines,
+        spool=SpoolDir(spool_dir if spool_dir is not None else SERVE_SPOOL) if (spool_dir or SERVE_SPOOL) else None,
+        socket_path=socket_path if socket_path is not None else (SERVE_SOCKET or None),
+        watch=[NOTIFY_CONFIG, WHATSAPP_TEMPLATES, RUNNER_FLOWS_DIR],
+        on_reload=reload_config,
+        poll_s=SERVE_POLL_S,
+    )
+    reload_config()
+    scheduler = _scheduler().start()
+    if not DRY_RUN:
+        _deferrals()
+    if stop is not None:
+        threading.Thread(target=lambda: (stop.wait(), daemon.stop()), name="serve-stop", daemon=True).start()
+    if threading.current_thread() is threading.main_thread():
+        import signal
+
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda *_: daemon.request_reload())
+    print(
+        f"[SERVE] spool={daemon.spool.root if daemon.spool else None} socket={daemon.socket_path}"
+        f" pool={pool.max_workers} scheduler={scheduler.metrics()['jobs']}"
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        pool.shutdown()
+        flush_trigger_log()
+    return daemon
+
+def _load_flow_meta(flow_path: Path) -> Dict[str, Any]:
+    try:
+        return flow_registry().get(flow_path).meta
+    except FlowError:
+        # Not runnable here (e.g. n8n-only actions); metadata is still readable
+        return parse_flow_text(flow_path.read_text())[0]
 
 
 def run_flow_demo(flow_path: str, brand: str, dry_run_flag: bool, tenant_id: Optional[str]) -> None:
@@ -382,7 +1679,17 @@ def run_flow_demo(flow_path: str, brand: str, dry_run_flag: bool, tenant_id: Opt
     if description:
         print(f"Description: {description}")
     print(f"Source file: {target}")
-    print("This preview reads the flow metadata only; import the YAML into n8n Flow B to execute sends.")
+    try:
+        flow = flow_registry().get(target)
+    except FlowError as e:
+        print(f"Not executable by the runner: {e}")
+        return
+    if flow.executable:
+        print(f"Trigger: {flow.when.source}")  # type: ignore[union-attr]
+        print(f"Guards: {flow.guard_config or '-'}")
+        print("Actions: " + ", ".join(kind for kind, _fn, _params in flow.steps))
+    else:
+        print("This preview reads the flow metadata only; import the YAML into n8n Flow B to execute sends.")
 
 
 def main(argv: Optional[List[str]] = None) -> int:
@@ -392,10 +1699,45 @@ def main(argv: Optional[List[str]] = None) -> int:
     parser.add_argument("--tenant-id", help="Optional tenant identifier for demo output")
     parser.add_argument("--dry-run", dest="dry_run_flag", action="store_true", help="Force dry-run mode")
     parser.add_argument("--live", dest="dry_run_flag", action="store_false", help="Override dry-run for previews")
+    parser.add_argument("--run-scheduler", action="store_true", help="Dispatch scheduled follow-ups until interrupted")
+    parser.add_argument("--leads", nargs="+", metavar="PATH", help="Stream JSONL leads from files ('-' = stdin) through TRIGGERS")
+    parser.add_argument("--serve", action="store_true", help="Stay resident: process spool/socket JSONL leads, hot-reload config")
+    parser.add_argument("--spool", default=None, help="Spool directory for --serve (default SERVE_SPOOL)")
+    parser.add_argument("--socket", default=None, help="Unix socket path for --serve (default SERVE_SOCKET); created 0600, owner-only")
+    parser.add_argument("--sweep", action="store_true", help="Run TRIGGERS over the whole lead table (filters pushed to PostgREST)")
+    parser.add_argument("--flows", help="Comma-separated trigger names for --leads / --sweep (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=LEADS_CHUNK, help="Leads per guard prefetch for --leads / --sweep")
+    parser.add_argument("--page-size", type=int, default=SWEEP_PAGE_SIZE, help="Rows per keyset page for --sweep")
+    parser.add_argument("--start-after", help="Resume --sweep after this lead id")
+    parser.add_argument("--metrics", action="store_true", help="Print per-stage latency (Prometheus text) when done")
     parser.set_defaults(dry_run_flag=DRY_RUN)
 
     args = parser.parse_args(argv)
 
+    if args.run_scheduler:
+        run_scheduler()
+        return 0
+
+    if args.serve:
+        flow_names = [f.strip() for f in args.flows.split(",") if f.strip()] if args.flows else None
+        serve(args.spool, args.socket, flow_names, args.chunk_size)
+        return 0
+
+    if args.leads or args.sweep:
+        flow_names = [f.strip() for f in args.flows.split(",") if f.strip()] if args.flows else None
+        unknown = [f for f in flow_names or [] if f not in TRIGGERS]
+        if unknown:
+            print(f"Unknown flows: {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        if args.sweep:
+            summary = sweep_leads(flow_names, args.page_size, args.chunk_size, start_after=args.start_after)
+        else:
+            summary = run_leads(args.leads, flow_names, args.chunk_size)
+        print(json.dumps(summary, indent=2, default=str))
+        if args.metrics:
+            print(latency_prometheus(), end="")
+        return 1 if summary.get("sweep", {}).get("error") else 0
+
     if args.flow:
         try:
             run_flow_demo(args.flow, args.brand, args.dry_run_flag, args.tenant_id)
@@ -424,6 +1766,8 @@ def main(argv: Optional[List[str]] = None) -> int:
     print(maybe_fire_survey_pending_alert(demo_lead))
     print(">> Fire formb_helper:")
     print(maybe_fire_formb_helper(demo_lead))
+    if args.metrics:
+        print(latency_prometheus(), end="")
     return 0
 
 
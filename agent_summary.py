@@ -1,16 +1,23 @@
 import os
 from datetime import datetime
-from supabase import create_client
 from collections import defaultdict
 
 # Load Supabase credentials
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase = None
+
+def supabase_client():
+    # Created on first query, not at import
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
 
 def get_today_summary():
     today = datetime.utcnow().date().isoformat()
-    response = supabase.table("agent_logs").select("*").gte("timestamp", today).execute()
+    response = supabase_client().table("agent_logs").select("*").gte("timestamp", today).execute()
     logs = response.data
 
     summary = defaultdict(list)
@@ -0,0 +1,40 @@
+-- Single round-trip guard evaluation for agent_runner.should_fire.
+-- Returns key_exists / window_count / total_count for many (lead, flow, key) tuples at once.
+-- Call via PostgREST: POST /rest/v1/rpc/trigger_guard_stats {"p_items": [...]}
+-- Items are read as yaml_trigger_log rows, so lead_id keeps the column's own type and the
+-- (lead_id, flow_name, trigger_time) index serves the per-item lookup.
+CREATE INDEX IF NOT EXISTS yaml_trigger_log_lead_flow_time_idx
+    ON public.yaml_trigger_log (lead_id, flow_name, trigger_time);
+
+CREATE OR REPLACE FUNCTION public.trigger_guard_stats(p_items jsonb)
+RETURNS TABLE (
+    lead_id text,
+    flow_name text,
+    idempotency_key text,
+    key_exists boolean,
+    window_count bigint,
+    total_count bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT i.lead_id::text,
+           i.flow_name::text,
+           i.idempotency_key::text,
+           EXISTS (
+               SELECT 1 FROM public.yaml_trigger_log t
+               WHERE t.idempotency_key = i.idempotency_key
+           ) AS key_exists,
+           COALESCE(stats.window_count, 0) AS window_count,
+           COALESCE(stats.total_count, 0) AS total_count
+    FROM jsonb_array_elements(p_items) AS e(item)
+    CROSS JOIN LATERAL jsonb_populate_record(NULL::public.yaml_trigger_log, e.item) AS i
+    CROSS JOIN LATERAL (SELECT (e.item ->> 'since')::timestamptz AS since) AS w
+    LEFT JOIN LATERAL (
+        SELECT count(*) FILTER (WHERE w.since IS NOT NULL AND t.trigger_time >= w.since) AS window_count,
+               count(*) AS total_count
+        FROM public.yaml_trigger_log t
+        WHERE t.lead_id = i.lead_id
+          AND t.flow_name = i.flow_name
+    ) AS stats ON TRUE;
+$$;
@@ -0,0 +1,2 @@
+# runner/__init__.py
+# Support modules for agent_runner (HTTP pooling, caches, queues, schedulers).
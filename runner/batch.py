@@ -0,0 +1,91 @@
+# runner/batch.py
+# In-memory guard evaluation + per-batch summaries for agent_runner.fire_batch.
+
+from __future__ import annotations
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # guards compare against naive UTC (datetime.utcnow), so normalise aware values
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+class TriggerLogIndex:
+    """
+    Prefetched yaml_trigger_log rows, indexed for the three should_fire guards.
+    Rows added after a decision (add()) keep later leads in the same batch consistent.
+    """
+
+    def __init__(self) -> None:
+        self.keys: Set[str] = set()
+        self.times: Dict[Tuple[str, str], List[Optional[datetime]]] = defaultdict(list)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        key = row.get("idempotency_key")
+        if key:
+            if key in self.keys:
+                return  # upsert on idempotency_key → one row per key
+            self.keys.add(key)
+        self.times[(str(row.get("lead_id")), str(row.get("flow_name")))].append(_parse_ts(row.get("trigger_time")))
+
+    def stats(self, lead_id: str, flow_name: str, key: str, since: Optional[datetime]) -> Dict[str, Any]:
+        history = self.times.get((str(lead_id), flow_name), [])
+        window = sum(1 for t in history if since is not None and t is not None and t >= since)
+        return {"key_exists": key in self.keys, "window_count": window, "total_count": len(history)}
+
+
+class BatchSummary:
+    """Counts per (flow, status, reason) plus throughput for one fire_batch call."""
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+        self.leads = 0
+        self.log_rows = 0
+        self.log_errors = 0
+        self.started = time.perf_counter()
+
+    def record(self, flow_name: str, status: str, reason: Optional[str], n: int = 1) -> None:
+        if n:
+            self.counts[(flow_name, status, reason or status)] += n
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        totals: Counter = Counter()
+        by_reason: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for (flow_name, status, reason), n in sorted(self.counts.items()):
+            totals[status] += n
+            by_reason[flow_name][f"{status}:{reason}"] = n
+        return {
+            "leads": self.leads,
+            "sent": totals["sent"],
+            "deferred": totals["deferred"],
+            "skipped": totals["skipped"],
+            "error": totals["error"],
+            "by_reason": dict(by_reason),
+            "log_rows": self.log_rows,
+            "log_errors": self.log_errors,
+            "elapsed_s": round(elapsed, 3),
+            "leads_per_min": round(self.leads / elapsed * 60, 1) if elapsed > 0 else None,
+        }
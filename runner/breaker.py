@@ -0,0 +1,179 @@
+# runner/breaker.py
+# Circuit breakers (closed → open → half-open) per endpoint: trip on failure rate or slow-call
+# rate over the last N calls, fail fast while open, probe with a few trial calls to close again.
+
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+TransitionFn = Callable[[str, str, str, Dict[str, Any]], None]  # (name, old, new, stats)
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, name: str, retry_in_s: float) -> None:
+        super().__init__(f"circuit '{name}' is open; retry in {retry_in_s:.1f}s")
+        self.name = name
+        self.retry_in_s = retry_in_s
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Endpoint health failures: 5xx/429/408 and transport errors. Other 4xx are the caller's fault."""
+    response = getattr(exc, "response", None)
+    code = getattr(response, "status_code", None)
+    if code is not None:
+        return code >= 500 or code in (408, 429)
+    return not isinstance(exc, CircuitOpen)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_s: float = 5.0,
+        slow_rate: float = 0.8,
+        open_s: float = 30.0,
+        half_open_calls: int = 2,
+        on_transition: Optional[TransitionFn] = None,
+        is_failure: Callable[[BaseException], bool] = counts_as_failure,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.half_open_calls = half_open_calls
+        self.on_transition = on_transition
+        self.is_failure = is_failure
+        self.clock = clock
+        self.state = CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._trials = 0  # half-open calls in flight or completed
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    # ---- state ----
+    def _transition(self, new: str) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        old, self.state = self.state, new
+        if new == OPEN:
+            self._opened_at = self.clock()
+            self.counts["opened"] += 1
+        if new in (OPEN, HALF_OPEN):
+            self._trials = 0
+        if new in (HALF_OPEN, CLOSED):
+            self._calls.clear()  # half-open counts only its trial calls; closed starts a fresh window
+        return (old, new, self._stats_locked())
+
+    def _notify(self, change: Optional[Tuple[str, str, Dict[str, Any]]]) -> None:
+        if change is not None and self.on_transition is not None:
+            try:
+                self.on_transition(self.name, *change)
+            except Exception as e:  # logging must never break the call path
+                print(f"[WARN] breaker {self.name} transition hook failed: {e}")
+
+    def _stats_locked(self) -> Dict[str, Any]:
+        n = len(self._calls)
+        failed = sum(1 for f, _ in self._calls if f)
+        slow = sum(1 for _, s in self._calls if s)
+        return {
+            "state": self.state,
+            "window_calls": n,
+            "failure_rate": round(failed / n, 3) if n else 0.0,
+            "slow_rate": round(slow / n, 3) if n else 0.0,
+            **self.counts,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._stats_locked()
+
+    def check(self) -> None:
+        """Cheap pre-flight (no trial slot taken): raises CircuitOpen while the open period runs."""
+        with self._lock:
+            if self.state == OPEN and self._opened_at + self.open_s > self.clock():
+                self.counts["rejected"] += 1
+                raise CircuitOpen(self.name, self._opened_at + self.open_s - self.clock())
+
+    def before_call(self) -> None:
+        """Raises CircuitOpen when the call must not go out."""
+        change = None
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_s - self.clock()
+                if remaining > 0:
+                    self.counts["rejected"] += 1
+                    raise CircuitOpen(self.name, remaining)
+                change = self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    self.counts["rejected"] += 1
+                    raise CircuitOpen(self.name, self.open_s / 10)
+                self._trials += 1
+        self._notify(change)
+
+    def after_call(self, elapsed_s: float, error: Optional[BaseException] = None) -> None:
+        failed = error is not None and self.is_failure(error)
+        slow = elapsed_s >= self.slow_call_s
+        change = None
+        with self._lock:
+            self.counts["calls"] += 1
+            self.counts["failures"] += failed
+            self.counts["slow"] += slow
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    change = self._transition(OPEN)
+                else:
+                    self._calls.append((False, False))
+                    if len(self._calls) >= self.half_open_calls:
+                        change = self._transition(CLOSED)
+            elif self.state == CLOSED:
+                self._calls.append((failed, slow))
+                n = len(self._calls)
+                if n >= self.min_calls:
+                    failed_n = sum(1 for f, _ in self._calls if f)
+                    slow_n = sum(1 for _, s in self._calls if s)
+                    if failed_n / n >= self.failure_rate or slow_n / n >= self.slow_rate:
+                        change = self._transition(OPEN)
+        self._notify(change)
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.after_call(time.perf_counter() - start, e)
+            raise
+        self.after_call(time.perf_counter() - start)
+        return result
+
+
+class BreakerRegistry:
+    """One breaker per endpoint name, created on first use with shared settings."""
+
+    def __init__(self, on_transition: Optional[TransitionFn] = None, **settings: Any) -> None:
+        self.on_transition = on_transition
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, on_transition=self.on_transition, **self.settings)
+            return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.stats() for b in breakers}
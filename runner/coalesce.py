@@ -0,0 +1,145 @@
+# runner/coalesce.py
+# Coalesces Slack notifications per channel: everything posted within `coalesce_window_min`
+# (config/notify.yaml) goes out as one digest with counts and the top-N lines.
+
+from __future__ import annotations
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from runner.notify_config import load_notify_config
+
+PostFn = Callable[[str, str], Any]  # (channel, text)
+
+
+def load_coalesce_window_s(path: str = "config/notify.yaml") -> float:
+    """coalesce_window_min in seconds (0 when the file or key is missing)."""
+    minutes = load_notify_config(path).get("coalesce_window_min")
+    return float(minutes) * 60 if minutes else 0.0
+
+
+class _Pending:
+    __slots__ = ("first_at", "total", "lines")
+
+    def __init__(self, now: float) -> None:
+        self.first_at = now
+        self.total = 0
+        self.lines: Counter = Counter()  # insertion order = first seen
+
+
+class SlackCoalescer:
+    """
+    add() buffers; a channel's digest is posted `window_s` after its first buffered
+    message (or when `max_pending` is reached). flush() posts everything now and is
+    what shutdown should call. Distinct lines beyond `max_distinct` are only counted.
+    """
+
+    def __init__(self, post_fn: PostFn, window_s: float, top_n: int = 10, max_pending: int = 5000, max_distinct: int = 1000) -> None:
+        self.post_fn = post_fn
+        self.window_s = window_s
+        self.top_n = top_n
+        self.max_pending = max_pending
+        self.max_distinct = max_distinct
+        self._pending: Dict[str, _Pending] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"added": 0, "posts": 0, "post_errors": 0}
+
+    def add(self, channel: str, text: str) -> None:
+        with self._lock:
+            pending = self._pending.get(channel)
+            if pending is None:
+                pending = self._pending[channel] = _Pending(time.monotonic())
+                self._wake.set()
+            pending.total += 1
+            if text in pending.lines or len(pending.lines) < self.max_distinct:
+                pending.lines[text] += 1
+            self.stats["added"] += 1
+            full = pending.total >= self.max_pending
+        if full:
+            self.flush(channel)
+
+    @staticmethod
+    def digest(channel: str, pending: "_Pending", top_n: int, window_s: float) -> str:
+        if pending.total == 1:
+            return next(iter(pending.lines))
+        minutes = max(1, round(window_s / 60))
+        out: List[str] = [f"🧾 {pending.total} notifications for {channel} (≤{minutes} min)"]
+        shown = 0
+        for line, count in pending.lines.most_common(top_n):
+            out.append(f"• {line}" + (f"  ×{count}" if count > 1 else ""))
+            shown += count
+        if pending.total > shown:
+            out.append(f"…and {pending.total - shown} more")
+        return "\n".join(out)
+
+    def _take(self, channel: Optional[str], due_only: bool) -> Dict[str, _Pending]:
+        now = time.monotonic()
+        with self._lock:
+            names = [channel] if channel is not None else list(self._pending)
+            taken = {}
+            for name in names:
+                pending = self._pending.get(name)
+                if pending is not None and (not due_only or now - pending.first_at >= self.window_s):
+                    taken[name] = self._pending.pop(name)
+            return taken
+
+    def _post(self, batches: Dict[str, _Pending]) -> int:
+        posts = 0
+        with self._flush_lock:
+            for name, pending in batches.items():
+                try:
+                    self.post_fn(name, self.digest(name, pending, self.top_n, self.window_s))
+                    posts += 1
+                except Exception as e:  # a digest is best effort, like a single notify
+                    self.stats["post_errors"] += 1
+                    print(f"[WARN] Slack digest for {name} failed: {e}")
+            self.stats["posts"] += posts
+        return posts
+
+    def flush(self, channel: Optional[str] = None) -> int:
+        """Posts pending digests now (one channel or all); returns the number of posts."""
+        return self._post(self._take(channel, due_only=False))
+
+    def flush_due(self) -> int:
+        return self._post(self._take(None, due_only=True))
+
+    def next_due_in(self) -> Optional[float]:
+        with self._lock:
+            if not self._pending:
+                return None
+            oldest = min(p.first_at for p in self._pending.values())
+        return max(0.0, oldest + self.window_s - time.monotonic())
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()  # before reading state, so an add() racing with us still wakes the loop
+            delay = self.next_due_in()
+            if delay is None or delay > 0:
+                self._wake.wait(delay)  # None → until the next add()
+                continue
+            self.flush_due()
+
+    def start(self) -> "SlackCoalescer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slack-coalescer", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = {name: p.total for name, p in self._pending.items()}
+        added, posts = self.stats["added"], self.stats["posts"]
+        return {**self.stats, "pending": pending, "messages_per_post": round(added / posts, 1) if posts else None}
@@ -0,0 +1,220 @@
+# runner/columnar.py
+# Column-oriented lead batches: condition ASTs compiled to NumPy masks, so a sweep evaluates
+# each trigger once per column instead of once per lead; only matching rows become dicts again.
+
+from __future__ import annotations
+import functools
+import operator
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from runner.conditions import Condition, Node, _compile, _getter, coerce
+
+from runner.lazy import LazyModule, module_available
+
+# Optional: without NumPy callers keep the per-lead closures. Imported when the first batch is built.
+np = LazyModule("numpy")
+NUMPY_AVAILABLE = module_available("numpy")
+
+Lead = Dict[str, Any]
+VectorFn = Callable[["LeadBatch"], Any]
+
+_MIRROR = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+_OPS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+class LeadBatch:
+    """
+    A fixed set of leads viewed as columns. Built from dicts (columns extracted lazily, the
+    original dicts are returned by rows()) or from columns (e.g. NumPy arrays from a nightly
+    export; dicts are built only for the rows asked for). Typed views are cached per column.
+    """
+
+    __slots__ = ("n", "_records", "_columns", "_cache")
+
+    def __init__(self, n: int, records: Optional[List[Lead]] = None, columns: Optional[Dict[str, Any]] = None) -> None:
+        if not NUMPY_AVAILABLE:
+            raise ModuleNotFoundError("numpy is required for LeadBatch")
+        self.n = n
+        self._records = records
+        self._columns: Dict[str, Any] = dict(columns or {})
+        self._cache: Dict[Tuple[str, str], Any] = {}
+
+    @classmethod
+    def from_dicts(cls, leads: Sequence[Lead]) -> "LeadBatch":
+        records = leads if isinstance(leads, list) else list(leads)
+        return cls(len(records), records=records)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]]) -> "LeadBatch":
+        sizes = {len(values) for values in columns.values()}
+        if len(sizes) > 1:
+            raise ValueError(f"columns differ in length: {sorted(sizes)}")
+        return cls(sizes.pop() if sizes else 0, columns=columns)
+
+    def __len__(self) -> int:
+        return self.n
+
+    # ---- columns ----
+    def values(self, name: str) -> Any:
+        """Raw column (array or list); missing fields read as None like lead.get()."""
+        if name in self._columns:
+            return self._columns[name]
+        key = (name, "raw")
+        if key not in self._cache:
+            if self._records is not None:
+                get = _getter(name)
+                self._cache[key] = [get(lead) for lead in self._records]
+            else:
+                self._cache[key] = [None] * self.n
+        return self._cache[key]
+
+    def _typed(self, name: str, kind: str, build: Callable[[Any], Any]) -> Any:
+        key = (name, kind)
+        if key not in self._cache:
+            self._cache[key] = build(self.values(name))
+        return self._cache[key]
+
+    def truthy(self, name: str) -> Any:
+        def build(raw: Any) -> Any:
+            if isinstance(raw, np.ndarray) and raw.dtype.kind in "biuf":
+                return raw.astype(bool)
+            if isinstance(raw, np.ndarray) and raw.dtype.kind in "US":
+                return raw != raw.dtype.type()
+            return np.fromiter((bool(v) for v in raw), bool, self.n)
+        return self._typed(name, "truthy", build)
+
+    def numeric(self, name: str) -> Any:
+        """Float view matching coerce(value, 0.0): missing → 0, non-numeric → NaN."""
+        def build(raw: Any) -> Any:
+            if isinstance(raw, np.ndarray) and raw.dtype.kind in "biuf":
+                return raw.astype(float)
+            return np.fromiter((coerce(v, 0.0) for v in raw), float, self.n)
+        return self._typed(name, "numeric", build)
+
+    def codes(self, name: str) -> Optional[Tuple[Any, Dict[Any, int]]]:
+        """Dictionary-encoded column: (int codes, value → code); None if values are unhashable."""
+        def build(raw: Any) -> Any:
+            if isinstance(raw, np.ndarray) and raw.dtype.kind in "biufUS":
+                uniques, inverse = np.unique(raw, return_inverse=True)
+                return inverse.reshape(-1), {u.item(): i for i, u in enumerate(uniques)}
+            mapping: Dict[Any, int] = {}
+            try:
+                codes = np.fromiter((mapping.setdefault(v, len(mapping)) for v in raw), np.int64, self.n)
+            except TypeError:
+                return None
+            return codes, mapping
+        return self._typed(name, "codes", build)
+
+    # ---- rows ----
+    def row(self, i: int) -> Lead:
+        if self._records is not None:
+            return self._records[i]
+        lead: Lead = {}
+        for name, column in self._columns.items():
+            value = column[i]
+            lead[name] = value.item() if hasattr(value, "item") else value
+        return lead
+
+    def rows(self, index: Optional[Sequence[int]] = None) -> List[Lead]:
+        if self._records is not None:
+            return list(self._records) if index is None else [self._records[int(i)] for i in index]
+        take = np.arange(self.n) if index is None else np.asarray(index, dtype=np.int64)
+        names = list(self._columns)
+        # One gather + tolist() per column (native Python values), then zip into dicts
+        values = [
+            column[take].tolist() if isinstance(column, np.ndarray) else [column[i] for i in take.tolist()]
+            for column in self._columns.values()
+        ]
+        return [dict(zip(names, row)) for row in zip(*values)] if names else [{} for _ in take]
+
+    def slice(self, start: int, stop: int) -> "LeadBatch":
+        stop = min(stop, self.n)
+        if self._records is not None:
+            return LeadBatch(stop - start, records=self._records[start:stop])
+        return LeadBatch(stop - start, columns={k: v[start:stop] for k, v in self._columns.items()})
+
+    def chunks(self, size: int) -> Iterator["LeadBatch"]:
+        for start in range(0, self.n, max(1, size)):
+            yield self.slice(start, start + size)
+
+    # ---- predicates ----
+    def mask(self, condition: Condition) -> Any:
+        return compile_vector(condition.ast)(self)
+
+    def select(self, condition: Condition) -> List[Lead]:
+        return self.rows(np.flatnonzero(self.mask(condition)))
+
+
+# ===========
+# Compiling
+# ===========
+@functools.lru_cache(maxsize=1024)
+def compile_vector(node: Node) -> VectorFn:
+    """Condition AST → fn(batch) → bool array; same semantics as runner.conditions._compile."""
+    kind = node[0]
+    if kind == "lit":
+        value = bool(node[1])
+        return lambda batch: np.full(batch.n, value)
+    if kind == "field":
+        name = node[1]
+        return lambda batch: batch.truthy(name)
+    if kind == "not":
+        inner = compile_vector(node[1])
+        return lambda batch: ~inner(batch)
+    if kind in ("and", "or"):
+        a, b = compile_vector(node[1]), compile_vector(node[2])
+        if kind == "and":
+            return lambda batch: a(batch) & b(batch)
+        return lambda batch: a(batch) | b(batch)
+    if kind == "in" and node[1][0] == "field":
+        return _vector_in(node[1][1], node[2], node[3], _rowwise(node))
+    if kind == "cmp":
+        op, left, right = node[1], node[2], node[3]
+        if left[0] == "lit" and right[0] == "field":
+            op, left, right = _MIRROR[op], right, left
+        if left[0] == "field" and right[0] == "lit":
+            vector = _vector_cmp(left[1], op, right[1], _rowwise(node))
+            if vector is not None:
+                return vector
+    return _rowwise(node)
+
+
+def _rowwise(node: Node) -> VectorFn:
+    # Field-vs-field comparisons, ordering on strings, etc.: evaluate the scalar closure per row
+    scalar = _compile(node)
+    return lambda batch: np.fromiter((bool(scalar(lead)) for lead in batch.rows()), bool, batch.n)
+
+
+def _vector_in(name: str, values: Tuple[Any, ...], negate: bool, fallback: VectorFn) -> VectorFn:
+    def run(batch: LeadBatch) -> Any:
+        encoded = batch.codes(name)
+        if encoded is None:
+            return fallback(batch)
+        codes, mapping = encoded
+        hit = np.isin(codes, [mapping[v] for v in values if v in mapping])
+        return ~hit if negate else hit
+    return run
+
+
+def _vector_cmp(name: str, op: str, lit: Any, fallback: VectorFn) -> Optional[VectorFn]:
+    fn = _OPS[op]
+    if isinstance(lit, bool):
+        return lambda batch: fn(batch.truthy(name), lit)
+    if isinstance(lit, float):
+        def numeric(batch: LeadBatch) -> Any:
+            with np.errstate(invalid="ignore"):
+                return fn(batch.numeric(name), lit)
+        return numeric
+    if op in ("==", "!="):
+        def equality(batch: LeadBatch) -> Any:
+            raw = batch.values(name)
+            if isinstance(raw, np.ndarray) and raw.dtype.kind in "US" and isinstance(lit, str):
+                return fn(raw, lit)
+            encoded = batch.codes(name)
+            if encoded is None:
+                return fallback(batch)
+            codes, mapping = encoded
+            hit = codes == mapping.get(lit, -1)
+            return hit if op == "==" else ~hit
+        return equality
+    return None
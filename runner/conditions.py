@@ -0,0 +1,302 @@
+# runner/conditions.py
+# Small condition language for only_if / trigger predicates, compiled to closures (no eval).
+#
+#   survey_scheduled == false and idle_days >= 7
+#   stage in ("Deposit", "Quote") && !do_not_contact
+#
+# Grammar (lowest → highest precedence):
+#   expr   := or
+#   or     := and (("or" | "||") and)*
+#   and    := not (("and" | "&&") not)*
+#   not    := ("not" | "!") not | cmp
+#   cmp    := atom (("==" | "!=" | "<" | "<=" | ">" | ">=") atom | ["not"] "in" list)?
+#   atom   := field | literal | "(" expr ")"
+
+from __future__ import annotations
+import functools
+import operator
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from runner.lead import SLOTTED
+from runner.lead import Lead as LeadRecord
+
+Lead = Dict[str, Any]
+Node = Tuple[Any, ...]  # ("or"|"and", a, b) | ("not", a) | ("cmp", op, a, b) | ("in", a, values, negate) | ("field", name) | ("lit", value)
+
+
+class ConditionError(ValueError):
+    pass
+
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<num>-?\d+(?:\.\d+)?)|(?P<str>'[^']*'|\"[^\"]*\")|(?P<op>==|!=|<=|>=|&&|\|\||[<>!(),\[\]])|(?P<name>[A-Za-z_][\w.]*))"
+)
+_LITERALS = {"true": True, "false": False, "null": None, "none": None}
+_CMP = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+def _tokenize(src: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    src = src.rstrip()
+    while pos < len(src):
+        m = _TOKEN.match(src, pos)
+        if not m or m.end() == pos:
+            raise ConditionError(f"Unexpected input at {pos}: {src[pos:pos + 10]!r}")
+        pos = m.end()
+        if m.group("num") is not None:
+            tokens.append(("lit", float(m.group("num"))))
+        elif m.group("str") is not None:
+            tokens.append(("lit", m.group("str")[1:-1]))
+        elif m.group("op") is not None:
+            tokens.append(("op", m.group("op")))
+        else:
+            word = m.group("name")
+            lowered = word.lower()
+            if lowered in _LITERALS:
+                tokens.append(("lit", _LITERALS[lowered]))
+            elif lowered in ("and", "or", "not", "in"):
+                tokens.append(("op", {"and": "&&", "or": "||", "not": "!", "in": "in"}[lowered]))
+            else:
+                tokens.append(("field", word))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, src: str) -> None:
+        self.src = src
+        self.tokens = _tokenize(src)
+        self.pos = 0
+
+    def peek(self, value: Any = None) -> bool:
+        if self.pos >= len(self.tokens):
+            return False
+        kind, tok = self.tokens[self.pos]
+        return kind == "op" and tok == value
+
+    def take(self) -> Tuple[str, Any]:
+        if self.pos >= len(self.tokens):
+            raise ConditionError(f"Unexpected end of condition: {self.src!r}")
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def expect(self, value: str) -> None:
+        kind, tok = self.take()
+        if kind != "op" or tok != value:
+            raise ConditionError(f"Expected {value!r} in {self.src!r}, got {tok!r}")
+
+    def parse(self) -> Node:
+        node = self.or_()
+        if self.pos != len(self.tokens):
+            raise ConditionError(f"Trailing input in condition: {self.src!r}")
+        return node
+
+    def or_(self) -> Node:
+        node = self.and_()
+        while self.peek("||"):
+            self.pos += 1
+            node = ("or", node, self.and_())
+        return node
+
+    def and_(self) -> Node:
+        node = self.not_()
+        while self.peek("&&"):
+            self.pos += 1
+            node = ("and", node, self.not_())
+        return node
+
+    def not_(self) -> Node:
+        if self.peek("!"):
+            self.pos += 1
+            return ("not", self.not_())
+        return self.cmp()
+
+    def cmp(self) -> Node:
+        left = self.atom()
+        if self.pos < len(self.tokens):
+            kind, tok = self.tokens[self.pos]
+            if kind == "op" and tok in _CMP:
+                self.pos += 1
+                return ("cmp", tok, left, self.atom())
+            negate = self.peek("!") and self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1] == ("op", "in")
+            if negate or self.peek("in"):
+                self.pos += 2 if negate else 1
+                return ("in", left, self.list_(), negate)
+        return left
+
+    def list_(self) -> Tuple[Any, ...]:
+        kind, opener = self.take()
+        closer = {"(": ")", "[": "]"}.get(opener) if kind == "op" else None
+        if closer is None:
+            raise ConditionError(f"Expected a list after 'in' in {self.src!r}")
+        values: List[Any] = []
+        while not self.peek(closer):
+            kind, tok = self.take()
+            if kind != "lit":
+                raise ConditionError(f"Only literals are allowed in lists: {self.src!r}")
+            values.append(tok)
+            if not self.peek(closer):
+                self.expect(",")
+        self.pos += 1
+        return tuple(values)
+
+    def atom(self) -> Node:
+        kind, tok = self.take()
+        if kind == "op" and tok == "(":
+            node = self.or_()
+            self.expect(")")
+            return node
+        if kind in ("field", "lit"):
+            return (kind, tok)
+        raise ConditionError(f"Unexpected {tok!r} in {self.src!r}")
+
+
+def parse_condition(src: str) -> Node:
+    return _Parser(src).parse()
+
+
+# ===========
+# Coercion
+# ===========
+def coerce(value: Any, like: Any) -> Any:
+    """Lead values compared against a literal take the literal's type (missing bool → False, number → 0)."""
+    if isinstance(like, bool):
+        return bool(value)
+    if isinstance(like, float):
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return float("nan")
+    return value
+
+
+def _getter(name: str) -> Callable[[Lead], Any]:
+    if "." not in name:
+        return lambda lead: lead.get(name)
+    parts = name.split(".")
+
+    def get(lead: Lead) -> Any:
+        value: Any = lead
+        for part in parts:
+            value = value.get(part) if isinstance(value, (dict, LeadRecord)) else getattr(value, part, None)
+        return value
+
+    return get
+
+
+def _slot_getter(name: str) -> Callable[[Any], Any]:
+    # LeadRecord slots: builtin getattr beats a Python-level .get() call
+    if name in SLOTTED:
+        return lambda lead: getattr(lead, name, None)
+    return _getter(name)
+
+
+def fields(node: Node) -> List[str]:
+    """Lead fields referenced by a condition, in first-use order."""
+    kind = node[0]
+    if kind == "field":
+        return [node[1]]
+    if kind == "lit":
+        return []
+    children = {"not": node[1:2], "and": node[1:3], "or": node[1:3], "cmp": node[2:4], "in": node[1:2]}[kind]
+    names: List[str] = []
+    for child in children:
+        names += [f for f in fields(child) if f not in names]
+    return names
+
+
+def _compile(node: Node, getter: Callable[[str], Callable[[Any], Any]] = _getter) -> Callable[[Lead], Any]:
+    kind = node[0]
+    if kind == "lit":
+        value = node[1]
+        return lambda lead: value
+    if kind == "field":
+        return getter(node[1])
+    if kind == "not":
+        inner = _compile(node[1], getter)
+        return lambda lead: not inner(lead)
+    if kind == "and":
+        a, b = _compile(node[1], getter), _compile(node[2], getter)
+        return lambda lead: bool(a(lead)) and bool(b(lead))
+    if kind == "or":
+        a, b = _compile(node[1], getter), _compile(node[2], getter)
+        return lambda lead: bool(a(lead)) or bool(b(lead))
+    if kind == "in":
+        get, values, negate = _compile(node[1], getter), frozenset(node[2]), node[3]
+        return lambda lead: (get(lead) in values) != negate
+    if kind == "cmp":
+        op, left, right = _CMP[node[1]], node[2], node[3]
+        if right[0] == "lit" and left[0] != "lit":
+            get, lit = _compile(left, getter), right[1]
+            if lit is None:
+                return lambda lead: op(get(lead), None)
+            return lambda lead: _safe(op, coerce(get(lead), lit), lit)
+        if left[0] == "lit" and right[0] != "lit":
+            get, lit = _compile(right, getter), left[1]
+            return lambda lead: _safe(op, lit, coerce(get(lead), lit))
+        a, b = _compile(left, getter), _compile(right, getter)
+        return lambda lead: _safe(op, a(lead), b(lead))
+    raise ConditionError(f"Unknown node {kind!r}")
+
+
+def _safe(op: Callable[[Any, Any], bool], a: Any, b: Any) -> bool:
+    try:
+        return bool(op(a, b))
+    except TypeError:  # e.g. None < 3
+        return False
+
+
+class Condition:
+    """
+    A parsed, compiled condition. Call it on one lead (dict or runner.lead.Lead), or
+    filter()/mask() a batch. Lead records get their own closure reading slots directly.
+    """
+
+    __slots__ = ("source", "ast", "fields", "_fn", "_slot_fn")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.ast = parse_condition(source) if source.strip() else ("lit", True)
+        self.fields = fields(self.ast)
+        self._fn = _compile(self.ast)
+        self._slot_fn: Optional[Callable[[Any], Any]] = None
+
+    def _for(self, lead: Any) -> Callable[[Any], Any]:
+        if type(lead) is not LeadRecord:
+            return self._fn
+        if self._slot_fn is None:
+            self._slot_fn = _compile(self.ast, _slot_getter)
+        return self._slot_fn
+
+    def __call__(self, lead: Lead) -> bool:
+        return bool(self._for(lead)(lead))
+
+    def mask(self, leads: Sequence[Lead]) -> List[bool]:
+        if not leads:
+            return []
+        kind = type(leads[0])
+        if all(type(lead) is kind for lead in leads):
+            fn = self._for(leads[0])
+            return [bool(fn(lead)) for lead in leads]
+        return [self(lead) for lead in leads]
+
+    def filter(self, leads: Iterable[Lead]) -> List[Lead]:
+        leads = leads if isinstance(leads, list) else list(leads)
+        if not leads:
+            return []
+        kind = type(leads[0])
+        if all(type(lead) is kind for lead in leads):
+            fn = self._for(leads[0])
+            return [lead for lead in leads if fn(lead)]
+        return [lead for lead in leads if self(lead)]
+
+    def __repr__(self) -> str:
+        return f"Condition({self.source!r})"
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_condition(source: str) -> Condition:
+    """Parse once per distinct source string; later calls reuse the compiled closure."""
+    return Condition(source or "")
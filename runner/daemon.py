@@ -0,0 +1,245 @@
+# runner/daemon.py
+# Building blocks for the resident agent_runner (serve mode): a spool directory of JSONL work,
+# a Unix-socket intake, and an mtime watcher that triggers hot reloads of flows and config.
+
+from __future__ import annotations
+import json
+import os
+import socketserver
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Summary = Dict[str, Any]
+LinesFn = Callable[[Iterable[Tuple[str, int, str]], str], Summary]  # (source, lineno, line) stream, source → summary
+
+_WATCH_SUFFIXES = (".yaml", ".yml", ".json", ".jsonl")
+
+
+class FileWatcher:
+    """
+    Polls mtimes of files and of the config files inside watched directories.
+    changed() returns paths added, modified or removed since the previous call.
+    """
+
+    def __init__(self, paths: Sequence[str]) -> None:
+        self.paths = [Path(p) for p in paths if p]
+        self._seen = self._scan()
+
+    def _scan(self) -> Dict[str, int]:
+        seen: Dict[str, int] = {}
+        for path in self.paths:
+            try:
+                if path.is_dir():
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.is_file() and entry.name.endswith(_WATCH_SUFFIXES):
+                                seen[entry.path] = entry.stat().st_mtime_ns
+                elif path.exists():
+                    seen[str(path)] = path.stat().st_mtime_ns
+            except OSError:
+                continue  # mid-rename; picked up on the next poll
+        return seen
+
+    def changed(self) -> List[str]:
+        current = self._scan()
+        paths = {p for p in current.keys() | self._seen.keys() if current.get(p) != self._seen.get(p)}
+        self._seen = current
+        return sorted(paths)
+
+
+class SpoolDir:
+    """
+    Work queue on disk: producers drop *.jsonl into `root` (write elsewhere, then rename in).
+    claim() moves the oldest file to processing/; finish() files it under done/ or failed/
+    next to a .result.json. Files left in processing/ by a crash are re-queued by recover();
+    replays are safe because trigger guards are idempotent.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        self.processing = self.root / "processing"
+        self.done = self.root / "done"
+        self.failed = self.root / "failed"
+        for path in (self.root, self.processing, self.done, self.failed):
+            path.mkdir(parents=True, exist_ok=True)
+
+    def recover(self) -> int:
+        moved = 0
+        for path in self.processing.glob("*.jsonl"):
+            os.replace(path, self.root / path.name)
+            moved += 1
+        return moved
+
+    def pending(self) -> List[Path]:
+        files = [p for p in self.root.glob("*.jsonl") if p.is_file()]
+        return sorted(files, key=lambda p: (p.stat().st_mtime_ns, p.name))
+
+    def claim(self) -> Optional[Path]:
+        for path in self.pending():
+            target = self.processing / path.name
+            try:
+                os.replace(path, target)  # atomic: one daemon wins
+            except FileNotFoundError:
+                continue
+            return target
+        return None
+
+    def finish(self, path: Path, result: Summary, ok: bool) -> Path:
+        dest_dir = self.done if ok else self.failed
+        (dest_dir / (path.stem + ".result.json")).write_text(json.dumps(result, indent=2, default=str))
+        dest = dest_dir / path.name
+        os.replace(path, dest)
+        return dest
+
+    def depth(self) -> int:
+        return len(self.pending())
+
+
+def file_lines(path: Path) -> Iterator[Tuple[str, int, str]]:
+    with open(path, "r", encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            if line.strip():
+                yield str(path), lineno, line
+
+
+class _LeadHandler(socketserver.StreamRequestHandler):
+    # Client writes JSONL and shuts down its write side; one JSON summary line comes back
+    def handle(self) -> None:
+        server: "LeadSocketServer" = self.server  # type: ignore[assignment]
+        source = f"socket:{id(self.request):x}"
+
+        def lines() -> Iterator[Tuple[str, int, str]]:
+            for lineno, raw in enumerate(self.rfile, 1):
+                line = raw.decode("utf-8", errors="replace")
+                if line.strip():
+                    yield source, lineno, line
+
+        try:
+            result = server.handle_lines(lines(), source)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write((json.dumps(result, default=str) + "\n").encode())
+
+
+class LeadSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Leads pushed here are sent live, so the socket is owner-only (0600, set before listen()):
+    only the runner's own user (or root) can connect. A stale socket from a previous run is
+    replaced; any other file at the path is left alone and binding fails.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, handle_lines: LinesFn) -> None:
+        try:
+            if stat.S_ISSOCK(os.lstat(path).st_mode):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.handle_lines = handle_lines
+        super().__init__(path, _LeadHandler, bind_and_activate=False)
+        try:
+            self.server_bind()
+            os.chmod(path, 0o600)
+            self.server_activate()
+        except BaseException:
+            self.server_close()
+            raise
+
+
+class Daemon:
+    """
+    Main loop of serve mode. Each tick: reload if watched files changed, then drain the spool
+    one file at a time. The socket server (optional) runs on its own threads and shares the
+    same handler, so both intakes hit the same warm pools and caches.
+    """
+
+    def __init__(
+        self,
+        handle_lines: LinesFn,
+        spool: Optional[SpoolDir] = None,
+        socket_path: Optional[str] = None,
+        watch: Sequence[str] = (),
+        on_reload: Optional[Callable[[List[str]], Any]] = None,
+        poll_s: float = 1.0,
+    ) -> None:
+        self.handle_lines = handle_lines
+        self.spool = spool
+        self.socket_path = socket_path
+        self.watcher = FileWatcher(watch) if watch else None
+        self.on_reload = on_reload
+        self.poll_s = poll_s
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+        self._server: Optional[LeadSocketServer] = None
+        self._server_thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"files": 0, "failed_files": 0, "reloads": 0, "started": time.time()}
+
+    def request_reload(self) -> None:
+        # e.g. from a SIGHUP handler; applied on the next tick
+        self._reload.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check_reload(self) -> List[str]:
+        changed = self.watcher.changed() if self.watcher else []
+        if self._reload.is_set():
+            self._reload.clear()
+            changed = changed or ["<signal>"]
+        if changed and self.on_reload is not None:
+            try:
+                self.on_reload(changed)
+                self.stats["reloads"] += 1
+            except Exception as e:  # keep serving with the previous config
+                print(f"[SERVE] reload failed, keeping previous config: {e}")
+        return changed
+
+    def process_one(self) -> Optional[Summary]:
+        if self.spool is None:
+            return None
+        path = self.spool.claim()
+        if path is None:
+            return None
+        try:
+            result, ok = self.handle_lines(file_lines(path), str(path)), True
+        except Exception as e:
+            result, ok = {"error": f"{type(e).__name__}: {e}"}, False
+        self.spool.finish(path, result, ok)
+        self.stats["files" if ok else "failed_files"] += 1
+        return result
+
+    def tick(self) -> int:
+        self.check_reload()
+        processed = 0
+        while not self._stop.is_set() and self.process_one() is not None:
+            processed += 1
+            self.check_reload()
+        return processed
+
+    def start_socket(self) -> None:
+        if self.socket_path and self._server is None:
+            self._server = LeadSocketServer(self.socket_path, self.handle_lines)
+            self._server_thread = threading.Thread(target=self._server.serve_forever, name="serve-socket", daemon=True)
+            self._server_thread.start()
+
+    def run(self) -> None:
+        if self.spool is not None:
+            recovered = self.spool.recover()
+            if recovered:
+                print(f"[SERVE] re-queued {recovered} file(s) left in processing/")
+        self.start_socket()
+        try:
+            while not self._stop.is_set():
+                if not self.tick():
+                    self._stop.wait(self.poll_s)
+        finally:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+                if self.socket_path and os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
@@ -0,0 +1,247 @@
+# runner/deferral.py
+# Quiet hours (config/notify.yaml `quiet_hours`): sends that fall inside the window are parked
+# in a SQLite queue bucketed by window end, then released at the channel's rate limit.
+
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, tzinfo
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from runner.breaker import CircuitOpen
+from runner.notify_config import notify_section
+from runner.ratelimit import RateLimiter
+from runner.retry import is_retryable, retry_after_s
+
+Payload = Dict[str, Any]
+SendFn = Callable[[str, Payload], Any]  # (channel, payload)
+DeadLetterFn = Callable[[str, Payload, int, BaseException], Any]  # (channel, payload, attempts, error)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deferred_sends (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    release_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS deferred_release_idx ON deferred_sends (release_at, id);
+"""
+
+
+def _minutes(hhmm: str) -> int:
+    hours, _, minutes = str(hhmm).partition(":")
+    return int(hours) * 60 + int(minutes or 0)
+
+
+class QuietHours:
+    """Daily local window [start, end); overnight windows (22:00 → 07:00) wrap midnight."""
+
+    def __init__(self, start_local: str, end_local: str, tz: Optional[tzinfo] = None) -> None:
+        self.start = _minutes(start_local)
+        self.end = _minutes(end_local)
+        self.tz = tz
+
+    def _local(self, now: float) -> datetime:
+        return datetime.fromtimestamp(now, self.tz) if self.tz else datetime.fromtimestamp(now)
+
+    def contains(self, now: float) -> bool:
+        local = self._local(now)
+        minute = local.hour * 60 + local.minute
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+    def release_at(self, now: float) -> Optional[float]:
+        """Epoch of the current window's end, or None outside quiet hours."""
+        if not self.contains(now):
+            return None
+        local = self._local(now)
+        end = local.replace(hour=self.end // 60, minute=self.end % 60, second=0, microsecond=0)
+        if end <= local:
+            end += timedelta(days=1)
+        return end.timestamp()
+
+
+def load_quiet_hours(path: str = "config/notify.yaml", tz: Optional[tzinfo] = None) -> Optional[QuietHours]:
+    section = notify_section(path, "quiet_hours")
+    if not section.get("start_local") or not section.get("end_local"):
+        return None
+    return QuietHours(section["start_local"], section["end_local"], tz)
+
+
+class DeferralQueue:
+    """Parked sends, ordered by release time (one bucket per window end), shared across processes."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def defer(self, channel: str, payload: Payload, release_at: float) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO deferred_sends (channel, release_at, payload, enqueued_at) VALUES (?, ?, ?, ?)",
+                (channel, release_at, json.dumps(payload, default=str), time.time()),
+            )
+            return int(cur.lastrowid)
+
+    def due(self, channel: str, limit: int, now: Optional[float] = None) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM deferred_sends WHERE channel = ? AND release_at <= ? ORDER BY release_at, id LIMIT ?",
+                (channel, time.time() if now is None else now, limit),
+            ).fetchall()
+
+    def channels(self, now: Optional[float] = None) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT channel FROM deferred_sends WHERE release_at <= ?", (time.time() if now is None else now,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def remove(self, row_id: int) -> bool:
+        # Row-level delete: with several releasers only the one that deletes the row sends it
+        with self._lock:
+            return self._conn.execute("DELETE FROM deferred_sends WHERE id = ?", (row_id,)).rowcount == 1
+
+    def restore(self, row: sqlite3.Row, error: str, retry_at: float, spent: bool = True) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO deferred_sends (id, channel, release_at, payload, enqueued_at, attempts, last_error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row["id"], row["channel"], retry_at, row["payload"], row["enqueued_at"], row["attempts"] + int(spent), error[:500]),
+            )
+
+    def depth(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT channel, COUNT(*) AS n, MIN(enqueued_at) AS oldest, MIN(release_at) AS next_release "
+                "FROM deferred_sends GROUP BY channel"
+            ).fetchall()
+        now = time.time()
+        return {
+            r["channel"]: {"depth": r["n"], "oldest_age_s": round(now - r["oldest"], 1), "next_release_in_s": round(max(0.0, r["next_release"] - now), 1)}
+            for r in rows
+        }
+
+
+class DeferralReleaser:
+    """
+    Releases due rows without bursting: each send first takes a token from the channel's
+    bucket (try_acquire), so at window end the queue drains at the configured per-minute
+    rate alongside live traffic. Failed sends go back with a growing delay (or the server's
+    Retry-After); with a dead_letter_fn, a permanent error (e.g. 400) or the max_attempts-th
+    failure hands the row to it instead. An open circuit requeues without spending an attempt.
+    """
+
+    def __init__(
+        self,
+        queue: DeferralQueue,
+        send_fn: SendFn,
+        limiter: Optional[RateLimiter] = None,
+        interval_s: float = 1.0,
+        retry_s: float = 60.0,
+        max_attempts: int = 5,
+        dead_letter_fn: Optional[DeadLetterFn] = None,
+    ) -> None:
+        self.queue = queue
+        self.send_fn = send_fn
+        self.limiter = limiter
+        self.interval_s = interval_s
+        self.retry_s = retry_s
+        self.max_attempts = max(1, int(max_attempts))
+        self.dead_letter_fn = dead_letter_fn
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _observe(self, channel: str, key: str, latency_s: Optional[float] = None, deferred_s: float = 0.0) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(channel, {"released": 0, "failed": 0, "dead_lettered": 0, "latency_sum_s": 0.0, "latency_max_s": 0.0, "deferred_sum_s": 0.0})
+            stats[key] += 1
+            if latency_s is not None:
+                stats["latency_sum_s"] += latency_s
+                stats["latency_max_s"] = max(stats["latency_max_s"], latency_s)
+                stats["deferred_sum_s"] += deferred_s
+
+    def release_once(self, now: Optional[float] = None, limit: int = 100) -> Dict[str, int]:
+        result = {"released": 0, "failed": 0, "dead_lettered": 0, "paced": 0}
+        for channel in self.queue.channels(now):
+            for row in self.queue.due(channel, limit, now):
+                if self.limiter is not None and not self.limiter.try_acquire(channel):
+                    result["paced"] += 1
+                    break  # bucket empty: the rest waits for the next tick
+                if not self.queue.remove(row["id"]):
+                    continue  # another process took it
+                sent_at = time.time()
+                payload = json.loads(row["payload"])
+                try:
+                    self.send_fn(channel, payload)
+                except CircuitOpen as e:  # endpoint down: wait it out without spending an attempt
+                    self.queue.restore(row, str(e), sent_at + e.retry_in_s, spent=False)
+                    self._observe(channel, "failed")
+                    result["failed"] += 1
+                    continue
+                except Exception as e:
+                    attempts = row["attempts"] + 1
+                    if self.dead_letter_fn is not None and (attempts >= self.max_attempts or not is_retryable(e)):
+                        self.dead_letter_fn(channel, payload, attempts, e)
+                        self._observe(channel, "dead_lettered")
+                        result["dead_lettered"] += 1
+                        continue
+                    hinted = retry_after_s(e)
+                    self.queue.restore(row, str(e), sent_at + (hinted if hinted is not None else self.retry_s * attempts))
+                    self._observe(channel, "failed")
+                    result["failed"] += 1
+                    continue
+                # Latency: how long after its window ended the send actually went out
+                self._observe(channel, "released", max(0.0, sent_at - row["release_at"]), sent_at - row["enqueued_at"])
+                result["released"] += 1
+        return result
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.release_once()
+            except Exception as e:  # keep the releaser alive
+                print(f"[WARN] deferral release failed: {e}")
+
+    def start(self) -> "DeferralReleaser":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="deferral-releaser", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 5)
+            self._thread = None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = {channel: dict(values) for channel, values in self._stats.items()}
+        out: Dict[str, Any] = {"queue": self.queue.depth(), "released": {}}
+        for channel, values in stats.items():
+            n = values["released"] or 1
+            out["released"][channel] = {
+                "released": int(values["released"]),
+                "failed": int(values["failed"]),
+                "dead_lettered": int(values["dead_lettered"]),
+                "latency_avg_s": round(values["latency_sum_s"] / n, 3),
+                "latency_max_s": round(values["latency_max_s"], 3),
+                "deferred_avg_s": round(values["deferred_sum_s"] / n, 1),
+            }
+        return out
@@ -0,0 +1,203 @@
+# runner/dlq.py
+# Local dead-letter store for sends that exhausted their retries. Entries use the
+# proof/notify_dlq_snapshot.json shape and can be replayed in bulk.
+
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from runner.retry import iso_utc
+
+Payload = Dict[str, Any]
+SendFn = Callable[[str, Payload], Any]  # (channel, payload)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notify_dlq (
+    dlq_id TEXT PRIMARY KEY,
+    event_id TEXT,
+    channel TEXT NOT NULL,
+    retry_count INTEGER NOT NULL,
+    last_error TEXT,
+    next_attempt_at REAL NOT NULL,
+    payload_checksum TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (channel, payload_checksum)
+);
+CREATE INDEX IF NOT EXISTS notify_dlq_due_idx ON notify_dlq (next_attempt_at);
+"""
+
+# The same payload dead-lettered again keeps one entry and accumulates retries
+_PUT = """
+INSERT INTO notify_dlq (dlq_id, event_id, channel, retry_count, last_error, next_attempt_at, payload_checksum, payload, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (channel, payload_checksum) DO UPDATE SET
+    retry_count = notify_dlq.retry_count + excluded.retry_count,
+    last_error = excluded.last_error,
+    next_attempt_at = excluded.next_attempt_at
+"""
+
+
+def payload_checksum(payload: Payload) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DeadLetterStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def put(
+        self,
+        channel: str,
+        payload: Payload,
+        retry_count: int,
+        last_error: str,
+        next_attempt_at: Optional[float] = None,
+        event_id: Optional[str] = None,
+    ) -> str:
+        checksum = payload_checksum(payload)
+        dlq_id = f"dlq-{event_id}" if event_id else f"dlq-{channel}-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._conn.execute(
+                _PUT,
+                (dlq_id, event_id, channel, retry_count, last_error[:1000], next_attempt_at or time.time(), checksum,
+                 json.dumps(payload, default=str), time.time()),
+            )
+            row = self._conn.execute(
+                "SELECT dlq_id FROM notify_dlq WHERE channel = ? AND payload_checksum = ?", (channel, checksum)
+            ).fetchone()
+        return row["dlq_id"]
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = {
+            "dlq_id": row["dlq_id"],
+            "event_id": row["event_id"],
+            "channel": row["channel"],
+            "retry_count": row["retry_count"],
+            "last_error": row["last_error"],
+            "next_attempt_at": iso_utc(row["next_attempt_at"]),
+            "payload_checksum": row["payload_checksum"],
+        }
+        if entry["event_id"] is None:
+            del entry["event_id"]
+        return entry
+
+    def entries(self, channel: Optional[str] = None, limit: Optional[int] = None, due_only: bool = False) -> List[Dict[str, Any]]:
+        return [self._entry(r) for r in self._rows(channel, limit, due_only)]
+
+    def _rows(self, channel: Optional[str], limit: Optional[int], due_only: bool) -> List[sqlite3.Row]:
+        sql, args = "SELECT * FROM notify_dlq WHERE 1=1", []  # type: ignore[var-annotated]
+        if channel:
+            sql += " AND channel = ?"
+            args.append(channel)
+        if due_only:
+            sql += " AND next_attempt_at <= ?"
+            args.append(time.time())
+        sql += " ORDER BY next_attempt_at, created_at LIMIT ?"
+        args.append(-1 if limit is None else limit)
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Same document shape as proof/notify_dlq_snapshot.json."""
+        entries = self.entries()
+        body = json.dumps(entries, sort_keys=True, separators=(",", ":"))
+        return {
+            "phase": "runtime",
+            "generated_at": iso_utc(time.time()),
+            "sha256": hashlib.sha256(body.encode("utf-8")).hexdigest(),
+            "entries": entries,
+        }
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT channel, COUNT(*) FROM notify_dlq GROUP BY channel").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def replay(self, send_fn: SendFn, channel: Optional[str] = None, limit: Optional[int] = None, force: bool = False, retry_s: float = 300.0) -> Dict[str, Any]:
+        """
+        Re-sends entries (due ones unless force). Successes are deleted; failures stay with
+        retry_count + 1 and next_attempt_at pushed out. Reports in the dlq_replay_proof.json terms.
+        """
+        rows = self._rows(channel, limit, due_only=not force)
+        ok, failed, times_ms = 0, 0, []
+        for row in rows:
+            started = time.perf_counter()
+            try:
+                send_fn(row["channel"], json.loads(row["payload"]))
+            except Exception as e:
+                failed += 1
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE notify_dlq SET retry_count = retry_count + 1, last_error = ?, next_attempt_at = ? WHERE dlq_id = ?",
+                        (str(e)[:1000], time.time() + retry_s * (row["retry_count"] + 1), row["dlq_id"]),
+                    )
+                continue
+            finally:
+                times_ms.append((time.perf_counter() - started) * 1000)
+            ok += 1
+            with self._lock:
+                self._conn.execute("DELETE FROM notify_dlq WHERE dlq_id = ?", (row["dlq_id"],))
+        times_ms.sort()
+        return {
+            "dlq_replayed": ok,
+            "dlq_failed": failed,
+            "replay_success_rate": round(ok / len(rows), 3) if rows else None,
+            "replay_batch_max": len(rows),
+            "replay_time_ms_p95": round(times_ms[int(0.95 * (len(times_ms) - 1))], 1) if times_ms else None,
+            "remaining": sum(self.depth().values()),
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and replay the notify dead-letter store")
+    parser.add_argument("--db", default=os.getenv("NOTIFY_DLQ_DB", "var/notify_dlq.sqlite3"))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    show = sub.add_parser("list", help="Show dead-lettered sends")
+    show.add_argument("--channel")
+    show.add_argument("--limit", type=int, default=50)
+    snap = sub.add_parser("snapshot", help="Write a notify_dlq_snapshot.json-style document")
+    snap.add_argument("--out", type=Path, help="Output file (default: stdout)")
+    replay = sub.add_parser("replay", help="Re-send entries through agent_runner")
+    replay.add_argument("--channel")
+    replay.add_argument("--limit", type=int)
+    replay.add_argument("--force", action="store_true", help="Ignore next_attempt_at")
+    args = parser.parse_args(argv)
+
+    store = DeadLetterStore(args.db)
+    if args.cmd == "list":
+        for entry in store.entries(args.channel, args.limit):
+            print(json.dumps(entry))
+    elif args.cmd == "snapshot":
+        doc = json.dumps(store.snapshot(), indent=2)
+        if args.out:
+            args.out.write_text(doc)
+        else:
+            print(doc)
+    else:
+        import agent_runner
+
+        print(json.dumps(store.replay(agent_runner._deliver_paced, args.channel, args.limit, force=args.force), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
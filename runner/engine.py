@@ -0,0 +1,116 @@
+# runner/engine.py
+# Step engine shared by the sync and asyncio flow runtimes.
+#
+# A flow is written once as a generator that yields blocking calls (call(fn, ...)) and
+# receives their results. drive_sync() runs it inline; AsyncFlowEngine runs many of them
+# concurrently in one event loop, pushing blocking calls to a bounded thread pool.
+
+from __future__ import annotations
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
+
+Step = Tuple[Callable[..., Any], tuple, Dict[str, Any]]
+Steps = Generator[Step, Any, Any]
+
+
+def call(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Step:
+    return (fn, args, kwargs)
+
+
+def returning(value: Any) -> Steps:
+    # A flow that finishes without any steps
+    return value
+    yield  # pragma: no cover - makes this a generator
+
+
+def drive_sync(gen: Steps) -> Any:
+    send: Any = None
+    exc: Optional[BaseException] = None
+    while True:
+        try:
+            fn, args, kwargs = gen.throw(exc) if exc is not None else gen.send(send)
+        except StopIteration as stop:
+            return stop.value
+        if asyncio.iscoroutinefunction(fn):
+            raise TypeError(f"{fn.__name__} is async; run this flow through AsyncFlowEngine")
+        try:
+            send, exc = fn(*args, **kwargs), None
+        except Exception as e:
+            send, exc = None, e
+
+
+class AsyncFlowEngine:
+    """
+    Runs step generators concurrently with at most `max_in_flight` flows active.
+    Coroutine functions are awaited directly; blocking calls go to a dedicated pool
+    sized to the in-flight cap, so the cap is also the network concurrency. One engine may
+    serve several event loops in turn (each asyncio.run gets its own semaphore).
+    """
+
+    def __init__(self, max_in_flight: int = 32) -> None:
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="flow")
+        self._sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def _call(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if asyncio.iscoroutinefunction(fn):
+            return await fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def drive(self, gen: Steps) -> Any:
+        send: Any = None
+        exc: Optional[BaseException] = None
+        while True:
+            try:
+                fn, args, kwargs = gen.throw(exc) if exc is not None else gen.send(send)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                send, exc = await self._call(fn, args, kwargs), None
+            except Exception as e:
+                send, exc = None, e
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Semaphores bind to the loop they first block on; keep one per running loop
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            sem = self._sems[loop] = asyncio.Semaphore(self.max_in_flight)
+        return sem
+
+    async def run(self, gen_factory: Callable[[], Steps]) -> Any:
+        async with self._semaphore():
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                return await self.drive(gen_factory())
+            finally:
+                self.in_flight -= 1
+
+    async def map(self, factories: Iterable[Callable[[], Steps]]) -> List[Any]:
+        # Bounded creation: at most 2x the cap of pending tasks exist at once
+        results: Dict[int, Any] = {}
+        pending: set = set()
+        for i, factory in enumerate(factories):
+            task = asyncio.ensure_future(self.run(factory))
+            task.index = i  # type: ignore[attr-defined]
+            pending.add(task)
+            if len(pending) >= self.max_in_flight * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    results[t.index] = t.result()  # type: ignore[attr-defined]
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            for t in done:
+                results[t.index] = t.result()  # type: ignore[attr-defined]
+        return [results[i] for i in range(len(results))]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
@@ -0,0 +1,273 @@
+# runner/flows.py
+# Executable YAML flows: trigger condition + guards + actions, compiled once into a registry
+# keyed by (path, mtime) so evaluating many flows per lead never re-reads or re-parses files.
+
+from __future__ import annotations
+import json
+import os
+import string
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from runner.conditions import Condition, ConditionError, compile_condition
+from runner.lazy import LazyModule
+
+# Optional YAML parser, imported on first parse; JSON flow files work without it
+yaml = LazyModule("yaml")
+
+Lead = Dict[str, Any]
+# Action executor: (rendered params, lead, idempotency key) → None
+ActionFn = Callable[[Dict[str, Any], Lead, str], None]
+# Computed placeholders, e.g. {"secure_link": lambda lead: ...}
+Extras = Dict[str, Callable[[Lead], Any]]
+
+
+class FlowError(ValueError):
+    pass
+
+
+# ===========
+# Templating
+# ===========
+def compile_template(text: str) -> Callable[[Lead, Extras], str]:
+    """`"Hi {first_name}, RM{estimated_bill|-}"` → render(lead, extras); `{field|default}` sets a fallback."""
+    parts: List[Tuple[str, Optional[str], str]] = []
+    for literal, field, _spec, _conv in string.Formatter().parse(text):
+        name, default = None, ""
+        if field is not None:
+            name, _, default = field.partition("|")
+        parts.append((literal, name, default))
+    if len(parts) == 1 and parts[0][1] is None:
+        return lambda lead, extras: text
+
+    def render(lead: Lead, extras: Extras) -> str:
+        out: List[str] = []
+        for literal, name, default in parts:
+            out.append(literal)
+            if name is None:
+                continue
+            value = extras[name](lead) if name in extras else lead.get(name)
+            out.append(default if value is None or value == "" else str(value))
+        return "".join(out)
+
+    return render
+
+
+def compile_params(value: Any) -> Callable[[Lead, Extras], Any]:
+    if isinstance(value, str):
+        return compile_template(value)
+    if isinstance(value, dict):
+        compiled = {k: compile_params(v) for k, v in value.items()}
+        return lambda lead, extras: {k: fn(lead, extras) for k, fn in compiled.items()}
+    if isinstance(value, list):
+        items = [compile_params(v) for v in value]
+        return lambda lead, extras: [fn(lead, extras) for fn in items]
+    return lambda lead, extras: value
+
+
+# =========
+# Loading
+# =========
+def _fallback_meta(text: str) -> Dict[str, Any]:
+    # Line-based `meta:` reader for environments without PyYAML
+    meta: Dict[str, Any] = {}
+    in_meta = False
+    for raw in text.splitlines():
+        stripped = raw.strip()
+        if stripped.startswith("meta:"):
+            in_meta = True
+            continue
+        if in_meta:
+            if raw.startswith("  ") and ":" in raw:
+                key, value = stripped.split(":", 1)
+                meta[key.strip()] = value.strip().strip('"')
+            elif stripped and not raw.startswith("  "):
+                break
+    if not meta:
+        for raw in text.splitlines():
+            if ":" not in raw:
+                continue
+            key, value = raw.split(":", 1)
+            key = key.strip()
+            if key in {"flow_name", "description"}:
+                meta[key] = value.strip().strip('"')
+    return meta
+
+
+def parse_flow_text(text: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Returns (meta, document); document is None when no structured parser could read the file."""
+    data: Any = None
+    if yaml.available:
+        try:
+            data = yaml.safe_load(text)
+        except Exception:  # pragma: no cover - best effort parser
+            data = None
+    if data is None:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return _fallback_meta(text), None
+    if not isinstance(data, dict):
+        return {}, None
+    meta_section = data.get("meta")
+    if isinstance(meta_section, dict):
+        meta = {str(key): meta_section[key] for key in meta_section}
+    else:
+        # fall back to top-level hints
+        meta = {key: data[key] for key in ("flow_name", "description", "owner") if key in data}
+    return meta, data
+
+
+class CompiledFlow:
+    """
+    One flow file, compiled. `executable` flows have a trigger and actions; meta-only
+    files (e.g. n8n previews) still load so their metadata can be shown.
+    """
+
+    def __init__(self, path: Path, mtime_ns: int, meta: Dict[str, Any], doc: Optional[Dict[str, Any]], actions: Dict[str, ActionFn], extras: Extras) -> None:
+        self.path = path
+        self.key = str(path)  # resolved path once registered
+        self.mtime_ns = mtime_ns
+        self.meta = meta
+        self.name = str(meta.get("flow_name") or path.stem)
+        self.extras = extras
+        doc = doc or {}
+        trigger = doc.get("trigger") or {}
+        when = trigger.get("when") if isinstance(trigger, dict) else trigger
+        if isinstance(when, list):
+            when = " and ".join(f"({w})" for w in when)
+        try:
+            self.when: Optional[Condition] = compile_condition(str(when)) if when else None
+        except ConditionError as e:
+            raise FlowError(f"{path}: invalid trigger.when: {e}") from e
+        self.guard_config: Dict[str, Any] = dict(doc.get("guards") or {})
+        self.steps: List[Tuple[str, ActionFn, Callable[[Lead, Extras], Any]]] = []
+        for i, action in enumerate(doc.get("actions") or []):
+            if not isinstance(action, dict) or len(action) != 1:
+                raise FlowError(f"{path}: action #{i + 1} must be a single-key mapping")
+            kind, params = next(iter(action.items()))
+            if kind not in actions:
+                raise FlowError(f"{path}: unknown action {kind!r} (known: {', '.join(sorted(actions))})")
+            self.steps.append((kind, actions[kind], compile_params(params or {})))
+        self.executable = self.when is not None and bool(self.steps)
+        self.index_key = _index_key(self.when.ast) if self.when is not None else None
+
+    def matches(self, lead: Lead) -> bool:
+        return self.when is not None and self.when(lead)
+
+    def execute(self, lead: Lead, idem: str) -> None:
+        for _kind, fn, params in self.steps:
+            fn(params(lead, self.extras), lead, idem)
+
+    def __repr__(self) -> str:
+        return f"CompiledFlow({self.name!r}, steps={len(self.steps)})"
+
+
+def _index_key(ast: Any) -> Optional[Tuple[str, Any]]:
+    # First top-level `field == "literal"` conjunct → used to bucket flows by that field's value
+    if ast[0] == "and":
+        return _index_key(ast[1]) or _index_key(ast[2])
+    if ast[0] == "cmp" and ast[1] == "==" and ast[2][0] == "field" and ast[3][0] == "lit" and isinstance(ast[3][1], str):
+        return (ast[2][1], ast[3][1])
+    return None
+
+
+class FlowRegistry:
+    """
+    Compiled flows keyed by path; a file is re-parsed only when its mtime changes.
+    Directory scans are throttled to once per `check_interval_s`, so per-lead
+    evaluation touches only in-memory state.
+    """
+
+    def __init__(self, actions: Dict[str, ActionFn], extras: Optional[Extras] = None, check_interval_s: float = 2.0) -> None:
+        self.actions = actions
+        self.extras = extras or {}
+        self.check_interval_s = check_interval_s
+        self._flows: Dict[str, CompiledFlow] = {}
+        self._dirs: Dict[str, Tuple[float, List[CompiledFlow]]] = {}
+        self._lock = threading.Lock()
+        self._by_value: Dict[str, Dict[Any, List[CompiledFlow]]] = {}
+        self._unindexed: List[CompiledFlow] = []
+        self.loads = 0
+
+    def get(self, path: Any) -> CompiledFlow:
+        target = Path(path)
+        mtime_ns = target.stat().st_mtime_ns  # FileNotFoundError propagates to callers
+        key = str(target.resolve())
+        with self._lock:
+            cached = self._flows.get(key)
+            if cached is not None and cached.mtime_ns == mtime_ns:
+                return cached
+        meta, doc = parse_flow_text(target.read_text())
+        flow = CompiledFlow(target, mtime_ns, meta, doc, self.actions, self.extras)
+        flow.key = key
+        with self._lock:
+            self._flows[key] = flow
+            self.loads += 1
+            self._reindex()
+        return flow
+
+    def load_dir(self, directory: Any, force: bool = False) -> List[CompiledFlow]:
+        root = Path(directory)
+        key = str(root.resolve())
+        now = time.monotonic()
+        with self._lock:  # the worker pool and serve threads load concurrently
+            cached = self._dirs.get(key)
+        if not force and cached is not None and now - cached[0] < self.check_interval_s:
+            return cached[1]
+        seen = set()
+        if root.is_dir():
+            for entry in sorted(os.scandir(root), key=lambda e: e.name):
+                if entry.is_file() and entry.name.endswith((".yaml", ".yml", ".json")):
+                    seen.add(str(Path(entry.path).resolve()))
+                    self.get(entry.path)
+        with self._lock:
+            for path in [p for p in self._flows if p.startswith(key + os.sep) and p not in seen]:
+                del self._flows[path]  # file removed
+            self._reindex()
+        flows = self.flows(root)
+        with self._lock:
+            self._dirs[key] = (now, flows)
+        return flows
+
+    def flows(self, directory: Any = None) -> List[CompiledFlow]:
+        with self._lock:
+            flows = list(self._flows.values())
+        if directory is not None:
+            prefix = str(Path(directory).resolve()) + os.sep
+            flows = [f for f in flows if f.key.startswith(prefix)]
+        return flows
+
+    def _reindex(self) -> None:
+        by_value: Dict[str, Dict[Any, List[CompiledFlow]]] = {}
+        unindexed: List[CompiledFlow] = []
+        for flow in self._flows.values():
+            if not flow.executable:
+                continue
+            if flow.index_key is None:
+                unindexed.append(flow)
+            else:
+                field, value = flow.index_key
+                by_value.setdefault(field, {}).setdefault(value, []).append(flow)
+        self._by_value, self._unindexed = by_value, unindexed
+
+    def candidates(self, lead: Lead, directory: Any = None) -> List[CompiledFlow]:
+        """Flows whose indexed equality could hold for `lead` (all of them under `directory`, if given)."""
+        out = list(self._unindexed)
+        for field, buckets in self._by_value.items():
+            try:
+                out += buckets.get(lead.get(field), ())
+            except TypeError:  # list/dict value: cannot equal an indexed scalar
+                continue
+        if directory is not None:
+            prefix = str(Path(directory).resolve()) + os.sep
+            out = [f for f in out if f.key.startswith(prefix)]
+        return out
+
+    def matching(self, lead: Lead, directory: Any = None) -> List[CompiledFlow]:
+        return [flow for flow in self.candidates(lead, directory) if flow.when(lead)]  # type: ignore[misc]
+
+    def __iter__(self) -> Iterator[CompiledFlow]:
+        return iter(self.flows())
@@ -0,0 +1,124 @@
+# runner/idem_cache.py
+# Process-local idempotency index: bloom filter (fast negatives) + bounded LRU (confirmed keys).
+
+from __future__ import annotations
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Optional
+
+
+def current_iso_week(now: Optional[datetime] = None) -> int:
+    # Same partition as agent_runner.idem_key
+    return int((now or datetime.now()).strftime("%G%V"))
+
+
+def key_week(key: str) -> Optional[int]:
+    # idem_key layout: "{lead_id}:{stage}:{iso_week}:{flow}"
+    parts = key.rsplit(":", 2)
+    if len(parts) == 3 and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001) -> None:
+        capacity = max(1, int(capacity))
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class IdempotencyIndex:
+    """
+    Keys of the current ISO week only; the index resets itself when the week rolls over.
+
+    - confirmed(key): key was written (or warm-loaded) → definitely exists, skip the network.
+    - definitely_absent(key): index is warm and the bloom filter says no → the key check can be skipped.
+    Anything else is "maybe" and must be answered by yaml_trigger_log.
+    """
+
+    def __init__(self, lru_size: int = 100_000, bloom_capacity: int = 1_000_000, error_rate: float = 0.001) -> None:
+        self.lru_size = lru_size
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self._reset(current_iso_week())
+
+    def _reset(self, week: int) -> None:
+        self.week = week
+        self.warm = False
+        self.bloom = BloomFilter(self.bloom_capacity, self.error_rate)
+        self.lru: "OrderedDict[str, None]" = OrderedDict()
+
+    def _roll(self) -> None:
+        week = current_iso_week()
+        if week != self.week:
+            self._reset(week)
+
+    def _tracked(self, key: str) -> bool:
+        return key_week(key) == self.week
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self._roll()
+            if not self._tracked(key):
+                return
+            self.bloom.add(key)
+            self.lru[key] = None
+            self.lru.move_to_end(key)
+            if len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+
+    def warm_load(self, keys: Iterable[str]) -> int:
+        n = 0
+        for key in keys:
+            self.add(key)
+            n += 1
+        with self._lock:
+            self.warm = True
+        return n
+
+    def confirmed(self, key: str) -> bool:
+        with self._lock:
+            self._roll()
+            if key in self.lru:
+                self.lru.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def definitely_absent(self, key: str) -> bool:
+        with self._lock:
+            self._roll()
+            return self.warm and self._tracked(key) and key not in self.bloom
+
+    def stats(self) -> dict:
+        return {
+            "week": self.week,
+            "warm": self.warm,
+            "bloom_keys": self.bloom.count,
+            "lru_keys": len(self.lru),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
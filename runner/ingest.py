@@ -0,0 +1,172 @@
+# runner/ingest.py
+# Streaming lead ingestion: JSONL files / stdin → parse → normalize, one generator stage each.
+# Nothing is materialised beyond the consumer's chunk, so multi-GB exports stream in constant memory.
+
+from __future__ import annotations
+import gzip
+import json
+import sys
+import time
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Sequence, TextIO, Tuple
+
+Lead = Dict[str, Any]
+
+BOOL_FIELDS = ("survey_scheduled", "do_not_proceed", "do_not_contact", "quote_sent", "formb_uploaded")
+NUM_FIELDS = ("idle_days", "hours_since_quote")
+_TRUE = {"1", "true", "t", "yes", "y"}
+_FALSE = {"0", "false", "f", "no", "n", "", "null", "none"}
+
+
+class IngestStats:
+    """Counters shared by the stages; progress() renders them with throughput."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.lines = 0
+        self.bytes = 0
+        self.leads = 0
+        self.bad = 0
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "lines": self.lines,
+            "leads": self.leads,
+            "bad": self.bad,
+            "mb": round(self.bytes / 1e6, 2),
+            "elapsed_s": round(elapsed, 3),
+            "leads_per_s": round(self.leads / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def _open(source: str) -> IO[str]:
+    if source == "-":
+        return sys.stdin
+    if source.endswith(".gz"):
+        return gzip.open(source, "rt", encoding="utf-8")
+    return open(source, "r", encoding="utf-8")
+
+
+def read_lines(sources: Sequence[str], stats: IngestStats) -> Iterator[Tuple[str, int, str]]:
+    """(source, line number, line) for every non-blank line; "-" reads stdin."""
+    for source in sources:
+        fh: TextIO = _open(source)  # type: ignore[assignment]
+        try:
+            for lineno, line in enumerate(fh, 1):
+                stats.lines += 1
+                stats.bytes += len(line)
+                if line.strip():
+                    yield source, lineno, line
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+
+
+def parse_leads(lines: Iterable[Tuple[str, int, str]], stats: IngestStats) -> Iterator[Lead]:
+    """JSON objects per line; {"lead": {...}} envelopes are unwrapped. Bad lines are counted, not fatal."""
+    for source, lineno, line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            stats.bad += 1
+            stats.last_error = f"{source}:{lineno}: {e}"
+            continue
+        if isinstance(record, dict) and isinstance(record.get("lead"), dict):
+            record = record["lead"]
+        if not isinstance(record, dict):
+            stats.bad += 1
+            stats.last_error = f"{source}:{lineno}: expected an object"
+            continue
+        yield record
+
+
+def _to_bool(value: Any) -> Any:
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE:
+            return True
+        if lowered in _FALSE:
+            return False
+    return value
+
+
+def _to_num(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return float(value) if value.strip() else None
+        except ValueError:
+            return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def normalize_lead(
+    lead: Lead, bool_fields: Sequence[str] = BOOL_FIELDS, num_fields: Sequence[str] = NUM_FIELDS
+) -> Optional[Lead]:
+    """
+    CSV/export-style values into the shapes triggers compare against ("false" → False,
+    "8" → 8.0, " Deposit " → "Deposit"). Leads without an id cannot be guarded → None.
+    """
+    lead_id = lead.get("id") or lead.get("lead_id")
+    if lead_id in (None, ""):
+        return None
+    out = dict(lead)
+    out["id"] = str(lead_id)
+    for name in bool_fields:
+        if name in out:
+            out[name] = _to_bool(out[name])
+    for name in num_fields:
+        if name in out:
+            out[name] = _to_num(out[name])
+    for name in ("stage", "brand", "tenant_id"):
+        if isinstance(out.get(name), str):
+            out[name] = out[name].strip()
+    return out
+
+
+def normalize_leads(leads: Iterable[Lead], stats: IngestStats) -> Iterator[Lead]:
+    for lead in leads:
+        normalized = normalize_lead(lead)
+        if normalized is None:
+            stats.bad += 1
+            stats.last_error = "lead without id"
+            continue
+        stats.leads += 1
+        yield normalized
+
+
+def leads_from_lines(lines: Iterable[Tuple[str, int, str]], stats: IngestStats) -> Iterator[Lead]:
+    """parse → normalize over an existing (source, lineno, line) stream (spool files, sockets)."""
+    def counted() -> Iterator[Tuple[str, int, str]]:
+        for item in lines:
+            stats.lines += 1
+            stats.bytes += len(item[2])
+            yield item
+
+    return normalize_leads(parse_leads(counted(), stats), stats)
+
+
+def stream_leads(sources: Sequence[str], stats: Optional[IngestStats] = None) -> Iterator[Lead]:
+    """read → parse → normalize, lazily."""
+    stats = stats if stats is not None else IngestStats()
+    return normalize_leads(parse_leads(read_lines(sources, stats), stats), stats)
+
+
+class Progress:
+    """Prints one status line to `out` at most every interval_s (0 → only on demand)."""
+
+    def __init__(self, interval_s: float = 5.0, out: Optional[TextIO] = None) -> None:
+        self.interval_s = interval_s
+        self.out = out if out is not None else sys.stderr
+        self._last = time.perf_counter()
+
+    def maybe(self, render: Any) -> None:
+        now = time.perf_counter()
+        if self.interval_s > 0 and now - self._last >= self.interval_s:
+            self._last = now
+            self.emit(render())
+
+    def emit(self, fields: Dict[str, Any]) -> None:
+        print("[LEADS] " + " ".join(f"{k}={v}" for k, v in fields.items()), file=self.out, flush=True)
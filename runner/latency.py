@@ -0,0 +1,235 @@
+# runner/latency.py
+# Low-overhead latency histograms per (stage, flow, brand): HDR-style log-linear buckets,
+# Prometheus text export and ops_logs rows (latency_ms) for p50/p95/p99 in production.
+
+from __future__ import annotations
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+Labels = Tuple[str, str, str]  # (stage, flow, brand)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Flow/brand of the flow step running on this thread (or task); _sb_* timings inherit it
+_CONTEXT: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar("latency_context", default=("", ""))
+
+
+class Histogram:
+    """
+    Microsecond histogram with 2**sub_bits linear sub-buckets per power of two (HdrHistogram
+    layout): values below 2**sub_bits are exact, larger ones keep ~1/2**(sub_bits-1) relative
+    precision. Buckets are a sparse dict, so memory follows the spread of observed values.
+    """
+
+    __slots__ = ("sub_bits", "counts", "count", "total_us", "min_us", "max_us")
+
+    def __init__(self, sub_bits: int = 7) -> None:
+        self.sub_bits = sub_bits
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    def _index(self, us: int) -> int:
+        shift = us.bit_length() - self.sub_bits
+        if shift <= 0:
+            return us
+        half = 1 << (self.sub_bits - 1)
+        return (1 << self.sub_bits) + (shift - 1) * half + ((us >> shift) - half)
+
+    def _value(self, index: int) -> int:
+        # Midpoint of the bucket's value range
+        size = 1 << self.sub_bits
+        if index < size:
+            return index
+        half = size >> 1
+        shift = (index - size) // half + 1
+        low = (half + (index - size) % half) << shift
+        return low + ((1 << shift) >> 1)
+
+    def record_us(self, us: int) -> None:
+        us = max(0, int(round(us)))
+        i = self._index(us)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        if self.count == 0 or us < self.min_us:
+            self.min_us = us
+        if us > self.max_us:
+            self.max_us = us
+        self.count += 1
+        self.total_us += us
+
+    def percentile_us(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(max(self._value(i), self.min_us), self.max_us)
+        return self.max_us
+
+    def merge(self, other: "Histogram") -> None:
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+        if other.count:
+            self.min_us = other.min_us if not self.count else min(self.min_us, other.min_us)
+            self.max_us = max(self.max_us, other.max_us)
+        self.count += other.count
+        self.total_us += other.total_us
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count, "mean_ms": round(self.total_us / self.count / 1000, 3) if self.count else 0.0}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}_ms"] = round(self.percentile_us(q) / 1000, 3)
+        out["max_ms"] = round(self.max_us / 1000, 3)
+        return out
+
+
+class LatencyRecorder:
+    """
+    Histograms keyed by (stage, flow, brand). record() is a dict lookup plus a bucket increment
+    under one lock; flush()/reset() swap the whole map so readers never block writers for long.
+    """
+
+    def __init__(self, enabled: bool = True, sub_bits: int = 7, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.enabled = enabled
+        self.sub_bits = sub_bits
+        self.clock = clock
+        self._hists: Dict[Labels, Histogram] = {}
+        self._lock = threading.Lock()
+        self.since = time.time()
+
+    def record(self, stage: str, seconds: float, flow: Optional[str] = None, brand: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        if flow is None or brand is None:
+            ctx_flow, ctx_brand = _CONTEXT.get()
+            flow = ctx_flow if flow is None else flow
+            brand = ctx_brand if brand is None else brand
+        key = (stage, flow or "", brand or "")
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram(self.sub_bits)
+            hist.record_us(seconds * 1_000_000)
+
+    @contextlib.contextmanager
+    def measure(self, stage: str, flow: Optional[str] = None, brand: Optional[str] = None) -> Iterator[None]:
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(stage, self.clock() - start, flow, brand)
+
+    def timed(self, stage: str, fn: Callable[..., Any], flow: str = "", brand: str = "") -> Callable[..., Any]:
+        """fn wrapped to record `stage` and to expose flow/brand to nested timings (sync or async)."""
+        if not self.enabled:
+            return fn
+        clock = self.clock
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def run_async(*args: Any, **kwargs: Any) -> Any:
+                token = _CONTEXT.set((flow, brand))
+                start = clock()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.record(stage, clock() - start, flow, brand)
+                    _CONTEXT.reset(token)
+
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            token = _CONTEXT.set((flow, brand))
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, clock() - start, flow, brand)
+                _CONTEXT.reset(token)
+
+        return run
+
+    def histograms(self) -> Dict[Labels, Histogram]:
+        # Copies: readers sort bucket keys while writers keep recording
+        copies: Dict[Labels, Histogram] = {}
+        with self._lock:
+            for key, hist in self._hists.items():
+                copies[key] = Histogram(self.sub_bits)
+                copies[key].merge(hist)
+        return copies
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        rows = []
+        for (stage, flow, brand), hist in sorted(self.histograms().items()):
+            rows.append({"stage": stage, "flow": flow, "brand": brand, **hist.summary()})
+        return rows
+
+    def reset(self) -> Dict[Labels, Histogram]:
+        with self._lock:
+            hists, self._hists = self._hists, {}
+            self.since = time.time()
+        return hists
+
+    def prometheus(self, name: str = "agent_runner_stage_latency_seconds") -> str:
+        """Prometheus text exposition: one summary per (stage, flow, brand)."""
+        lines = [f"# HELP {name} agent_runner latency per stage, flow and brand", f"# TYPE {name} summary"]
+        for (stage, flow, brand), hist in sorted(self.histograms().items()):
+            labels = f'stage="{_escape(stage)}",flow="{_escape(flow)}",brand="{_escape(brand)}"'
+            for q in QUANTILES:
+                lines.append(f'{name}{{{labels},quantile="{q}"}} {hist.percentile_us(q) / 1e6:.6f}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.total_us / 1e6:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def ops_log_rows(self, hists: Optional[Dict[Labels, Histogram]] = None, default_brand: str = "") -> List[Dict[str, Any]]:
+        """One ops_logs row per (stage, flow, brand): latency_ms carries p95, metadata the full summary."""
+        hists = self.histograms() if hists is None else hists
+        window = f"{int(self.since)}-{int(time.time())}"
+        rows = []
+        for (stage, flow, brand), hist in sorted(hists.items()):
+            if not hist.count:
+                continue
+            summary = hist.summary()
+            rows.append(
+                {
+                    "brand": brand or default_brand,
+                    "flow": flow or "agent_runner",
+                    "node": stage,
+                    "status": "latency",
+                    "idempotency_key": f"latency:{stage}:{flow}:{brand}:{window}:{uuid.uuid4().hex[:8]}",
+                    "latency_ms": int(round(summary["p95_ms"])),
+                    "metadata": summary,
+                }
+            )
+        return rows
+
+    def flush(self, write_fn: Callable[[List[Dict[str, Any]]], Any], default_brand: str = "") -> int:
+        """Hand the current window to write_fn as ops_logs rows and start a new window."""
+        since = self.since
+        hists = self.reset()
+        rows = self.ops_log_rows(hists, default_brand)
+        if rows:
+            try:
+                write_fn(rows)
+            except Exception:
+                # Put the window back so the next flush retries it
+                with self._lock:
+                    for key, hist in hists.items():
+                        self._hists.setdefault(key, Histogram(self.sub_bits)).merge(hist)
+                    self.since = since
+                raise
+        return len(rows)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
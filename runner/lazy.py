@@ -0,0 +1,73 @@
+# runner/lazy.py
+# Deferred imports for heavy or optional dependencies (requests, yaml, numpy). Cron entry points
+# start hundreds of times a day; a module is only imported when an attribute is first touched.
+
+from __future__ import annotations
+import importlib
+import importlib.util
+import threading
+from types import ModuleType
+from typing import Any, Callable, Optional
+
+
+def module_available(name: str) -> bool:
+    """True if `name` can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """
+    Module proxy: attribute reads and writes go to the real module, imported on first access.
+    `missing` builds a stand-in when the import fails (otherwise ModuleNotFoundError propagates).
+    Writes are forwarded too, so monkeypatch.setattr(agent_runner.requests, "post", fake) keeps
+    working as it did with an eager import.
+    """
+
+    __slots__ = ("_name", "_missing", "_module", "_lock")
+
+    def __init__(self, name: str, missing: Optional[Callable[[], Any]] = None) -> None:
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_missing", missing)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def available(self) -> bool:
+        if self._module is not None:
+            return isinstance(self._module, ModuleType)
+        return module_available(self._name)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> Any:
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    try:
+                        module = importlib.import_module(self._name)
+                    except ModuleNotFoundError:
+                        if self._missing is None:
+                            raise
+                        module = self._missing()
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self.load(), attr, value)
+
+    def __delattr__(self, attr: str) -> None:
+        delattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
@@ -0,0 +1,122 @@
+# runner/lead.py
+# Compact lead record: the lead_log fields triggers and executors read live in __slots__,
+# anything else in a small `extra` dict. Reads like the dict shape (lead["id"], lead.get(...)),
+# so flow functions take either; to_dict()/from_dict() round-trip exactly.
+
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+FIELDS: Tuple[str, ...] = (
+    "id",
+    "brand",
+    "tenant_id",
+    "stage",
+    "name",
+    "first_name",
+    "wa_number",
+    "survey_scheduled",
+    "idle_days",
+    "do_not_proceed",
+    "do_not_contact",
+    "quote_sent",
+    "hours_since_quote",
+    "formb_uploaded",
+)
+SLOTTED = frozenset(FIELDS)
+
+
+class Lead:
+    """
+    A lead with fixed slots instead of a per-instance hash table: ~2x less memory than the dict
+    (605 → 293 bytes per lead in scripts/bench_lead_records.py).
+    Unset slots behave like absent keys: lead.get("x", d) → d, "x" in lead → False.
+    Mutable like a dict, so update paths can keep writing lead[field] = value.
+    """
+
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, **fields: Any) -> None:
+        extra: Optional[Dict[str, Any]] = None
+        for key, value in fields.items():
+            if key in SLOTTED:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Lead":
+        return data if isinstance(data, Lead) else cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    # ---- mapping protocol (the subset agent_runner uses) ----
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in SLOTTED:
+            return getattr(self, key, default)
+        extra = self.extra
+        return extra.get(key, default) if extra else default
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            if key in SLOTTED:
+                return getattr(self, key)
+            if self.extra:
+                return self.extra[key]
+        except AttributeError:
+            pass
+        except KeyError:
+            pass
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in SLOTTED:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        if key in SLOTTED:
+            return hasattr(self, key)  # type: ignore[arg-type]
+        return bool(self.extra) and key in self.extra  # type: ignore[operator]
+
+    def keys(self) -> List[str]:
+        names = [name for name in FIELDS if hasattr(self, name)]
+        return names + list(self.extra) if self.extra else names
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for name in FIELDS:
+            try:
+                yield name, getattr(self, name)
+            except AttributeError:
+                continue
+        if self.extra:
+            yield from self.extra.items()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Lead):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]  # mutable, like dict
+
+    def __repr__(self) -> str:
+        return f"Lead({self.to_dict()!r})"
+
+
+def as_dict(lead: Any) -> Dict[str, Any]:
+    """The plain-dict shape of a Lead or a dict (e.g. before json.dumps)."""
+    return lead.to_dict() if isinstance(lead, Lead) else lead
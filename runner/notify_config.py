@@ -0,0 +1,68 @@
+# runner/notify_config.py
+# config/notify.yaml, read once per loader call: PyYAML when installed, otherwise a line reader
+# that understands the file's own shape (top-level scalars and one level of nested mappings).
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from runner.lazy import LazyModule
+
+# Optional YAML parser, imported on first parse
+yaml = LazyModule("yaml")
+
+
+def _scalar(raw: str) -> Any:
+    value = raw.strip()
+    if value and value[0] in "'\"":
+        end = value.find(value[0], 1)
+        return value[1:end] if end > 0 else value[1:]
+    value = value.split("#")[0].strip()
+    if not value:
+        return None
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+
+def parse_notify_config(text: str) -> Dict[str, Any]:
+    """notify.yaml text → dict, without PyYAML. Nested blocks deeper than one level are not supported."""
+    config: Dict[str, Any] = {}
+    section: Optional[Dict[str, Any]] = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#") or ":" not in stripped:
+            continue
+        key, _, value = stripped.partition(":")
+        key = key.strip().strip("\"'")
+        if not line[:1].isspace():
+            if _scalar(value) is None:
+                section = config[key] = {}
+            else:
+                section = None
+                config[key] = _scalar(value)
+        elif section is not None:
+            section[key] = _scalar(value)
+    return config
+
+
+def load_notify_config(path: str = "config/notify.yaml") -> Dict[str, Any]:
+    """The whole file as a dict; {} when it does not exist."""
+    try:
+        text = Path(path).read_text()
+    except FileNotFoundError:
+        return {}
+    if yaml.available:
+        return yaml.safe_load(text) or {}
+    return parse_notify_config(text)
+
+
+def notify_section(path: str, name: str) -> Dict[str, Any]:
+    """One mapping block (rate_limits, quiet_hours, retry_policy…); {} when missing or not a mapping."""
+    section = load_notify_config(path).get(name)
+    return section if isinstance(section, dict) else {}
@@ -0,0 +1,332 @@
+# runner/outbox.py
+# Durable local outbox (SQLite, WAL) + background drainer for Supabase writes.
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from runner.retry import is_retryable, status_code
+
+Row = Dict[str, Any]
+UpsertFn = Callable[[str, List[Row], str], Any]  # (table, rows, conflict_col)
+UpdateFn = Callable[[str, Dict[str, str], Row], Any]  # (table, match_params, payload)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    op TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    conflict_col TEXT,
+    match_params TEXT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    parked INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (target, op, dedupe_key)
+);
+CREATE INDEX IF NOT EXISTS outbox_due_idx ON outbox (next_attempt_at, id);
+-- Guards look up pending trigger-log rows per lead (pending_payloads); without this each lookup
+-- scans the whole outbox, which is largest exactly when Supabase is down
+CREATE INDEX IF NOT EXISTS outbox_lead_idx ON outbox (target, json_extract(payload, '$.lead_id'));
+"""
+
+# Re-enqueueing the same key merges payloads (later fields win) and resets the retry clock
+_PUT = """
+INSERT INTO outbox (target, op, dedupe_key, conflict_col, match_params, payload, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (target, op, dedupe_key) DO UPDATE SET
+    payload = json_patch(outbox.payload, excluded.payload),
+    attempts = 0,
+    next_attempt_at = 0,
+    last_error = NULL,
+    parked = 0
+"""
+
+
+class Outbox:
+    """
+    Local write-ahead store for rows bound for PostgREST.
+
+    - put_upsert(): keyed by the conflict column value (e.g. yaml_trigger_log.idempotency_key).
+    - put_update(): keyed by the match params (e.g. lead_log id=eq.X); fields merge per row.
+    Replays are safe: upserts resolve on the conflict column and PATCHes are idempotent.
+    Rows the server rejects for good (or that run out of attempts) are parked: kept, not retried,
+    until unpark() or a newer put for the same key.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "parked" not in columns:  # outbox files created before parking existed
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN parked INTEGER NOT NULL DEFAULT 0")
+
+    def put_upsert(self, table: str, row: Row, conflict_col: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                _PUT, (table, "upsert", str(row[conflict_col]), conflict_col, None, json.dumps(row, default=str), time.time())
+            )
+
+    def put_update(self, table: str, match_params: Dict[str, str], payload: Row) -> None:
+        match = json.dumps(match_params, sort_keys=True)
+        with self._lock:
+            self._conn.execute(_PUT, (table, "update", match, None, match, json.dumps(payload, default=str), time.time()))
+
+    def due(self, limit: int = 200, now: Optional[float] = None) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM outbox WHERE next_attempt_at <= ? AND NOT parked ORDER BY id LIMIT ?", (now or time.time(), limit)
+            ).fetchall()
+
+    def ack(self, rows: List[sqlite3.Row]) -> None:
+        # Payload must still match: a row merged again mid-drain stays queued with its newer state
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM outbox WHERE id = ? AND payload = ?", [(r["id"], r["payload"]) for r in rows]
+            )
+
+    def reset_backoff(self) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE NOT parked")
+
+    def fail(
+        self,
+        ids: List[int],
+        error: str,
+        backoff_s: Callable[[int], float],
+        max_attempts: Optional[int] = None,
+        permanent: bool = False,
+    ) -> int:
+        """Backs the rows off, or parks them (permanent error / max_attempts reached). Returns the number parked."""
+        now = time.time()
+        parked = 0
+        with self._lock:
+            for i in ids:
+                row = self._conn.execute("SELECT attempts FROM outbox WHERE id = ?", (i,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row["attempts"] + 1
+                park = permanent or (max_attempts is not None and attempts >= max_attempts)
+                self._conn.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, parked = ? WHERE id = ?",
+                    (attempts, now + backoff_s(attempts), error[:500], int(park), i),
+                )
+                parked += park
+        return parked
+
+    def unpark(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE outbox SET parked = 0, attempts = 0, next_attempt_at = 0 WHERE parked"
+            ).rowcount
+
+    def pending_payloads(self, target: str, **equals: Any) -> List[Row]:
+        # Payload columns equal to a value, or IN a list/tuple/set of values. Parked rows count:
+        # their writes never landed, but the actions they record did
+        sql, args = self._pending_query(target, equals)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(r["payload"]) for r in rows]
+
+    @staticmethod
+    def _pending_query(target: str, equals: Dict[str, Any]) -> tuple:
+        clauses: List[str] = []
+        args: List[Any] = [target]
+        for col, value in equals.items():
+            if isinstance(value, (list, tuple, set, frozenset)):
+                values = list(value)
+                clauses.append(f"json_extract(payload, '$.{col}') IN ({','.join('?' * len(values)) or 'NULL'})")
+                args += values
+            else:
+                clauses.append(f"json_extract(payload, '$.{col}') = ?")
+                args.append(value)
+        return "SELECT payload FROM outbox WHERE target = ?" + "".join(f" AND {c}" for c in clauses), args
+
+    def list(self, limit: int = 20) -> List[Row]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM outbox ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def stats(self) -> Row:
+        with self._lock:
+            totals = self._conn.execute(
+                "SELECT COUNT(*) AS depth, MIN(created_at) AS oldest, MAX(attempts) AS max_attempts,"
+                " SUM(attempts > 0 AND NOT parked) AS retrying, SUM(parked) AS parked FROM outbox"
+            ).fetchone()
+            by_target = self._conn.execute("SELECT target, op, COUNT(*) AS n FROM outbox GROUP BY target, op").fetchall()
+        return {
+            "depth": totals["depth"],
+            "retrying": totals["retrying"] or 0,
+            "parked": totals["parked"] or 0,
+            "max_attempts": totals["max_attempts"] or 0,
+            "oldest_age_s": round(time.time() - totals["oldest"], 1) if totals["oldest"] else 0.0,
+            "by_target": {f"{r['target']}:{r['op']}": r["n"] for r in by_target},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def exponential_backoff(attempts: int, base_s: float = 2.0, cap_s: float = 300.0) -> float:
+    return min(cap_s, base_s * (2 ** (attempts - 1)))
+
+
+def rejected(exc: BaseException) -> bool:
+    """A 4xx the server will keep giving (bad column, constraint violation): retrying cannot help."""
+    code = status_code(exc)
+    return code is not None and 400 <= code < 500 and not is_retryable(exc)
+
+
+class OutboxDrainer:
+    """
+    Ships due outbox rows in batches: one multi-row upsert per (table, conflict_col), PATCH per update.
+    A rejected batch is bisected so one bad row cannot hold back the rest; the bad row is parked.
+    Transient failures (5xx, timeouts, open circuit) back the whole batch off, parking after max_attempts.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        upsert_fn: UpsertFn,
+        update_fn: UpdateFn,
+        batch_size: int = 200,
+        interval_s: float = 1.0,
+        backoff_s: Callable[[int], float] = exponential_backoff,
+        max_attempts: int = 50,
+    ) -> None:
+        self.outbox = outbox
+        self.upsert_fn = upsert_fn
+        self.update_fn = update_fn
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.backoff_s = backoff_s
+        self.max_attempts = max(1, int(max_attempts))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._drain_lock = threading.Lock()
+
+    def _fail(self, rows: List[sqlite3.Row], error: BaseException, result: Dict[str, int]) -> None:
+        parked = self.outbox.fail([r["id"] for r in rows], str(error), self.backoff_s, self.max_attempts, rejected(error))
+        if parked:
+            print(f"[WARN] outbox parked {parked} {rows[0]['target']} row(s): {error}")
+        result["parked"] += parked
+        result["failed"] += len(rows) - parked
+
+    def _upsert(self, table: str, conflict_col: str, group: List[sqlite3.Row], result: Dict[str, int]) -> None:
+        try:
+            self.upsert_fn(table, [json.loads(r["payload"]) for r in group], conflict_col)
+        except Exception as e:
+            if len(group) == 1 or not rejected(e):
+                self._fail(group, e, result)
+                return
+            mid = len(group) // 2
+            self._upsert(table, conflict_col, group[:mid], result)
+            self._upsert(table, conflict_col, group[mid:], result)
+            return
+        self.outbox.ack(group)
+        result["sent"] += len(group)
+
+    def drain_once(self) -> Dict[str, int]:
+        result = {"sent": 0, "failed": 0, "parked": 0}
+        with self._drain_lock:
+            rows = self.outbox.due(self.batch_size)
+            upserts: Dict[tuple, List[sqlite3.Row]] = {}
+            for row in rows:
+                if row["op"] == "upsert":
+                    upserts.setdefault((row["target"], row["conflict_col"]), []).append(row)
+                    continue
+                try:
+                    self.update_fn(row["target"], json.loads(row["match_params"]), json.loads(row["payload"]))
+                    self.outbox.ack([row])
+                    result["sent"] += 1
+                except Exception as e:
+                    self._fail([row], e, result)
+            for (table, conflict_col), group in upserts.items():
+                self._upsert(table, conflict_col, group, result)
+        return result
+
+    def drain_all(self) -> Dict[str, int]:
+        # Until nothing is due (rows in backoff stay for the background loop)
+        total = {"sent": 0, "failed": 0, "parked": 0}
+        while True:
+            result = self.drain_once()
+            for key in total:
+                total[key] += result[key]
+            if result["sent"] == 0 or result["failed"]:
+                return total
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.drain_all()
+            except Exception as e:  # keep the drainer alive
+                print(f"[WARN] outbox drain failed: {e}")
+
+    def start(self) -> "OutboxDrainer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-drainer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, final_drain: bool = True) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 5)
+            self._thread = None
+        if final_drain:
+            try:
+                self.drain_all()
+            except Exception as e:
+                print(f"[WARN] outbox final drain failed: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and drain the agent_runner outbox")
+    parser.add_argument("--db", default=os.getenv("RUNNER_OUTBOX", "var/outbox.sqlite3"))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="Backlog depth, retries and age")
+    show = sub.add_parser("list", help="Show the oldest queued rows")
+    show.add_argument("--limit", type=int, default=20)
+    drain = sub.add_parser("drain", help="Ship due rows to Supabase now")
+    drain.add_argument("--batch-size", type=int, default=200)
+    drain.add_argument("--force", action="store_true", help="Ignore retry backoff")
+    sub.add_parser("unpark", help="Queue parked rows again (e.g. after fixing the schema)")
+    args = parser.parse_args(argv)
+
+    outbox = Outbox(args.db)
+    if args.cmd == "stats":
+        print(json.dumps(outbox.stats(), indent=2))
+    elif args.cmd == "list":
+        for row in outbox.list(args.limit):
+            print(json.dumps(row, default=str))
+    elif args.cmd == "unpark":
+        print(json.dumps({"unparked": outbox.unpark()}))
+    else:
+        import agent_runner
+
+        if args.force:
+            outbox.reset_backoff()
+        drainer = OutboxDrainer(outbox, agent_runner._sb_upsert_rows, agent_runner._sb_update, batch_size=args.batch_size)
+        print(json.dumps(drainer.drain_all() | {"remaining": outbox.stats()["depth"]}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+# runner/pool.py
+# Bounded worker pool with per-tenant concurrency caps and fair (round-robin) dispatch.
+
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+Job = Tuple[Future, Callable[..., Any], tuple, Dict[str, Any]]
+
+
+def parse_tenant_limits(spec: str) -> Dict[str, int]:
+    # "Voltek=8,Perodua=4" → {"Voltek": 8, "Perodua": 4}
+    limits: Dict[str, int] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        if value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class _TenantState:
+    __slots__ = ("queue", "in_flight", "dispatched", "done", "errors", "max_queue_depth", "wait_s")
+
+    def __init__(self) -> None:
+        self.queue: Deque[Tuple[float, Job]] = deque()
+        self.in_flight = 0
+        self.dispatched = 0
+        self.done = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.wait_s = 0.0
+
+
+class FlowWorkerPool:
+    """
+    submit(tenant, fn, ...) → Future. At most `max_workers` jobs run at once overall and at most
+    the tenant's limit per tenant; queued work is dispatched round-robin across tenants so one
+    large tenant cannot starve the others. `max_queued` > 0 makes submit() block (backpressure)
+    while that many jobs are waiting.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 16,
+        tenant_limits: Optional[Dict[str, int]] = None,
+        default_tenant_limit: Optional[int] = None,
+        max_queued: int = 0,
+    ) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.tenant_limits = dict(tenant_limits or {})
+        self.default_tenant_limit = default_tenant_limit or self.max_workers
+        self.max_queued = max(0, int(max_queued))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="flow-worker")
+        self._tenants: "OrderedDict[str, _TenantState]" = OrderedDict()
+        self._in_flight = 0
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _limit(self, tenant: str) -> int:
+        return min(self.tenant_limits.get(tenant, self.default_tenant_limit), self.max_workers)
+
+    def submit(self, tenant: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("pool is shut down")
+            while self.max_queued and self._queued >= self.max_queued:
+                self._cond.wait()
+            state = self._tenants.setdefault(tenant, _TenantState())
+            state.queue.append((time.monotonic(), (future, fn, args, kwargs)))
+            state.max_queue_depth = max(state.max_queue_depth, len(state.queue))
+            self._queued += 1
+            self._pump()
+        return future
+
+    def _pump(self) -> None:
+        # Caller holds self._cond. Rotate tenants so each dispatch starts after the last one served.
+        progressed = True
+        while progressed and self._in_flight < self.max_workers:
+            progressed = False
+            for tenant in list(self._tenants):
+                state = self._tenants[tenant]
+                if not state.queue or state.in_flight >= self._limit(tenant):
+                    continue
+                enqueued_at, job = state.queue.popleft()
+                state.wait_s += time.monotonic() - enqueued_at
+                state.in_flight += 1
+                state.dispatched += 1
+                self._in_flight += 1
+                self._queued -= 1
+                self._tenants.move_to_end(tenant)
+                self._executor.submit(self._run, tenant, job)
+                progressed = True
+                break
+        self._cond.notify_all()
+
+    def _run(self, tenant: str, job: Job) -> None:
+        future, fn, args, kwargs = job
+        failed = False
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                failed = True
+                future.set_exception(e)
+        with self._cond:
+            state = self._tenants[tenant]
+            state.in_flight -= 1
+            state.done += 1
+            state.errors += int(failed)
+            self._in_flight -= 1
+            self._pump()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "tenants": {
+                    tenant: {
+                        "in_flight": s.in_flight,
+                        "queued": len(s.queue),
+                        "max_queue_depth": s.max_queue_depth,
+                        "done": s.done,
+                        "errors": s.errors,
+                        "limit": self._limit(tenant),
+                        "avg_queue_wait_ms": round(s.wait_s / s.dispatched * 1000, 3) if s.dispatched else 0.0,
+                    }
+                    for tenant, s in self._tenants.items()
+                },
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if wait:
+            self.drain()
+        with self._cond:
+            self._closed = True
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,116 @@
+# runner/postgrest.py
+# Pooled, keep-alive PostgREST client shared by agent_runner's _sb_* helpers.
+
+from __future__ import annotations
+import threading
+from typing import Any, Dict, Optional
+
+from runner.breaker import CircuitBreaker
+from runner.lazy import LazyModule
+
+requests = LazyModule("requests")  # imported with the first session; missing → network calls fail loudly at use
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT_S = 15.0
+
+
+class PostgrestClient:
+    """
+    Thin wrapper over a requests.Session mounted with a sized connection pool.
+
+    - One session per client → TCP/TLS connections are reused (HTTP keep-alive).
+    - pool_size=0 disables pooling: every call opens a fresh connection (legacy behaviour).
+    - Every call accepts an optional per-call timeout; default is `timeout`.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Dict[str, str]] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT_S,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.pool_size = max(0, int(pool_size))
+        self.timeout = float(timeout)
+        self.breaker = breaker  # open circuit → CircuitOpen instead of waiting out the timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    # ---------
+    # plumbing
+    # ---------
+    def _get_session(self):
+        if not requests.available:
+            raise ModuleNotFoundError("requests module is required for network calls")
+        if self.pool_size == 0:
+            return None
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update(self.headers)
+                    session.headers["Connection"] = "keep-alive"
+                    self._session = session
+        return self._session
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ):
+        if self.breaker is not None:
+            return self.breaker.call(self._request, method, path, params, json, headers, timeout)
+        return self._request(method, path, params, json, headers, timeout)
+
+    def _request(self, method, path, params, json, headers, timeout):
+        session = self._get_session()
+        url = f"{self.base_url}/rest/v1/{path.lstrip('/')}"
+        timeout = self.timeout if timeout is None else timeout
+        if session is None:
+            r = requests.request(
+                method, url, params=params, json=json, headers=self.headers | (headers or {}), timeout=timeout
+            )
+        else:
+            r = session.request(method, url, params=params, json=json, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        return r
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    # ---------
+    # verbs
+    # ---------
+    def select(self, path: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        return self.request("GET", path, params=params, headers=headers, timeout=timeout)
+
+    def update(self, table: str, match_params: Dict[str, str], payload: Dict[str, Any], timeout: Optional[float] = None):
+        return self.request(
+            "PATCH", table, params=match_params, json=payload, headers={"Prefer": "return=minimal"}, timeout=timeout
+        )
+
+    def upsert(self, table: str, payload: Any, conflict_col: str, timeout: Optional[float] = None):
+        return self.request(
+            "POST",
+            table,
+            params={"on_conflict": conflict_col},
+            json=payload,
+            headers={"Prefer": "resolution=merge-duplicates,return=representation"},
+            timeout=timeout,
+        )
+
+    def rpc(self, fn: str, args: Dict[str, Any], timeout: Optional[float] = None):
+        return self.request("POST", f"rpc/{fn}", json=args, timeout=timeout)
@@ -0,0 +1,164 @@
+# runner/pushdown.py
+# Condition AST (runner.conditions) → PostgREST logic-tree filters, plus keyset-paginated reads.
+#
+#   stage == "Deposit" && survey_scheduled == false && idle_days >= 7
+#     → and=(stage.eq.Deposit,survey_scheduled.not.is.true,idle_days.gte.7)
+#
+# Pushed-down filters are always a superset of the condition: anything that cannot be expressed
+# (an or with an unrestricted side, field-vs-field, dotted paths, truthiness of non-boolean
+# columns) is dropped and left to the
+# in-memory evaluation that runs on every fetched row anyway. Null handling follows the runtime's
+# coercion: a missing bool compares as false and a missing number as 0, so `survey_scheduled ==
+# false` must also match NULL rows.
+
+from __future__ import annotations
+import math
+import re
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Sequence
+
+from runner.conditions import _CMP, Node, coerce
+
+Row = Dict[str, Any]
+FetchFn = Callable[[Dict[str, str]], List[Row]]  # PostgREST params → rows
+
+_OPS = {"==": "eq", "!=": "neq", "<": "lt", "<=": "lte", ">": "gt", ">=": "gte"}
+_MIRROR = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+_PLAIN = re.compile(r"^[\w\-@+/ ]*$")
+_COLUMN = re.compile(r"^[A-Za-z_]\w*$")
+
+
+def quote(value: Any) -> str:
+    """A literal as PostgREST filter text; reserved characters force double quotes."""
+    if isinstance(value, float) and value.is_integer():
+        text = str(int(value))
+    else:
+        text = str(value)
+    if _PLAIN.match(text) and text.strip() == text and text.lower() not in ("null", "true", "false"):
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _null_matches(op: str, lit: Any) -> bool:
+    # What the compiled condition returns for a lead without the field
+    if lit is None:
+        return _CMP[op](None, None)
+    value = coerce(None, lit)
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    try:
+        return bool(_CMP[op](value, lit))
+    except TypeError:
+        return False
+
+
+def _with_null(column: str, term: str, include_null: bool) -> str:
+    return f"or({term},{column}.is.null)" if include_null else term
+
+
+def _cmp_term(op: str, column: str, lit: Any) -> Optional[str]:
+    if lit is None:
+        if op == "==":
+            return f"{column}.is.null"
+        if op == "!=":
+            return f"{column}.not.is.null"
+        return None
+    if isinstance(lit, bool):
+        # Missing bools coerce to False, so "false" means "not true" (NULL included)
+        if op == "==":
+            return f"{column}.is.true" if lit else f"{column}.not.is.true"
+        if op == "!=":
+            return f"{column}.not.is.true" if lit else f"{column}.is.true"
+        return None
+    if isinstance(lit, (int, float)) and math.isnan(float(lit)):
+        return None
+    return _with_null(column, f"{column}.{_OPS[op]}.{quote(lit)}", _null_matches(op, lit))
+
+
+def _in_term(column: str, values: Sequence[Any], negate: bool) -> Optional[str]:
+    if any(isinstance(v, bool) or v is None for v in values):
+        return None  # in() compares raw values; bool/null coercion has no PostgREST equivalent
+    listed = "(" + ",".join(quote(v) for v in values) + ")"
+    if negate:
+        return f"or({column}.not.in.{listed},{column}.is.null)"
+    return f"{column}.in.{listed}"
+
+
+def terms(node: Node, bool_columns: Collection[str] = ()) -> List[str]:
+    """
+    Conjunctive PostgREST terms implied by the condition (empty → no restriction). Bare and
+    negated fields (`quote_sent`, `not do_not_contact`) are only pushed for known boolean
+    columns: truthiness of other types has no safe SQL equivalent.
+    """
+    kind = node[0]
+    if kind == "and":
+        return terms(node[1], bool_columns) + terms(node[2], bool_columns)
+    if kind == "or":
+        left, right = terms(node[1], bool_columns), terms(node[2], bool_columns)
+        if not left or not right:
+            return []  # one side is unrestricted, so the disjunction is too
+        return [f"or({_join('and', left)},{_join('and', right)})"]
+    if kind == "cmp":
+        op, left, right = node[1], node[2], node[3]
+        if right[0] == "field" and left[0] == "lit":
+            op, left, right = _MIRROR[op], right, left
+        if left[0] == "field" and right[0] == "lit" and _COLUMN.match(left[1]):
+            term = _cmp_term(op, left[1], right[1])
+            return [term] if term else []
+        return []
+    if kind == "in":
+        field, values, negate = node[1], node[2], node[3]
+        if field[0] == "field" and _COLUMN.match(field[1]) and values:
+            term = _in_term(field[1], values, negate)
+            return [term] if term else []
+        return []
+    if kind == "field" and node[1] in bool_columns:
+        return [f"{node[1]}.is.true"]
+    if kind == "not" and node[1][0] == "field" and node[1][1] in bool_columns:
+        return [f"{node[1][1]}.not.is.true"]  # NULL counts as false at runtime
+    return []
+
+
+def _join(op: str, parts: List[str]) -> str:
+    return parts[0] if len(parts) == 1 else f"{op}({','.join(parts)})"
+
+
+def filter_params(conditions: Sequence[Node], bool_columns: Collection[str] = ()) -> Dict[str, str]:
+    """
+    PostgREST params selecting rows that may match ANY of the conditions (one per trigger).
+    {} when some condition cannot be narrowed at all.
+    """
+    branches: List[List[str]] = []
+    for ast in conditions:
+        parts = terms(ast, bool_columns)
+        if not parts:
+            return {}
+        branches.append(parts)
+    if not branches:
+        return {}
+    if len(branches) == 1:
+        return {"and": "(" + ",".join(branches[0]) + ")"}
+    return {"or": "(" + ",".join(_join("and", parts) for parts in branches) + ")"}
+
+
+def keyset_pages(
+    fetch: FetchFn,
+    params: Dict[str, str],
+    key: str = "id",
+    page_size: int = 1000,
+    start_after: Optional[Any] = None,
+) -> Iterator[List[Row]]:
+    """
+    Pages ordered by `key` using `key=gt.<last>` instead of offsets: each request is an index
+    range scan, so page N costs the same as page 1 and concurrent inserts cannot shift pages.
+    """
+    last = start_after
+    while True:
+        page_params = dict(params, order=f"{key}.asc", limit=str(page_size))
+        if last is not None:
+            page_params[key] = f"gt.{quote(last)}"
+        page = fetch(page_params)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1][key]
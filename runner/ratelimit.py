@@ -0,0 +1,150 @@
+# runner/ratelimit.py
+# Token buckets shared by every runner process on a host (SQLite, WAL), driven by
+# config/notify.yaml `rate_limits` (e.g. whatsapp_per_min: 20).
+
+from __future__ import annotations
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from runner.notify_config import notify_section
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+Limit = Tuple[float, float]  # (tokens per second, bucket capacity)
+
+
+class RateLimited(RuntimeError):
+    """A blocking acquire gave up after its timeout."""
+
+    def __init__(self, name: str, wait_s: float) -> None:
+        super().__init__(f"rate limit '{name}': next token in {wait_s:.2f}s")
+        self.name = name
+        self.wait_s = wait_s
+
+
+def load_rate_limits(path: str = "config/notify.yaml") -> Dict[str, Limit]:
+    """
+    `<channel>_per_min: N` → {channel: (N/60 per second, burst)}. Burst defaults to ten
+    seconds of quota (min 1) so a cold bucket cannot dump a full minute at once;
+    `<channel>_burst: M` overrides it.
+    """
+    section = notify_section(path, "rate_limits")
+    limits: Dict[str, Limit] = {}
+    for key, value in section.items():
+        if key.endswith("_per_min"):
+            channel = key[: -len("_per_min")]
+            per_min = float(value)
+            burst = float(section.get(f"{channel}_burst") or max(1.0, math.ceil(per_min / 6)))
+            limits[channel] = (per_min / 60.0, burst)
+    return limits
+
+
+class RateLimiter:
+    """
+    Token buckets persisted in SQLite so several processes draw from the same budget.
+    Each acquire is one BEGIN IMMEDIATE transaction: refill by elapsed time, then take.
+    Unknown bucket names are unlimited.
+    """
+
+    def __init__(self, path: str, limits: Dict[str, Limit]) -> None:
+        self.path = path
+        self.limits = dict(limits)
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _take(self, name: str, n: float, now: float) -> float:
+        """Takes n tokens if available (→ 0.0); otherwise leaves the bucket and returns seconds to wait."""
+        rate, burst = self.limits[name]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (name,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0.0 if tokens >= n else (n - tokens) / rate
+                if wait == 0.0:
+                    tokens -= n
+                self._conn.execute(
+                    "INSERT INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    (name, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _record(self, name: str, key: str, value: float = 1.0) -> None:
+        with self._lock:
+            self._record_locked(name, key, value)
+
+    def _record_locked(self, name: str, key: str, value: float) -> None:
+        stats = self._metrics.setdefault(name, {"acquired": 0, "throttled": 0, "rejected": 0, "wait_s": 0.0, "max_wait_s": 0.0})
+        if key == "wait_s":
+            stats["wait_s"] += value
+            stats["max_wait_s"] = max(stats["max_wait_s"], value)
+        else:
+            stats[key] += value
+
+    def try_acquire(self, name: str, n: float = 1.0) -> bool:
+        """Non-blocking: True if the tokens were taken."""
+        if name not in self.limits:
+            return True
+        if self._take(name, n, time.time()) == 0.0:
+            self._record(name, "acquired")
+            return True
+        self._record(name, "rejected")
+        return False
+
+    def acquire(self, name: str, n: float = 1.0, timeout: Optional[float] = None) -> float:
+        """Blocks until the tokens are taken; returns seconds waited. Raises RateLimited past `timeout`."""
+        if name not in self.limits:
+            return 0.0
+        start = time.monotonic()
+        throttled = False
+        while True:
+            wait = self._take(name, n, time.time())
+            waited = time.monotonic() - start if throttled else 0.0
+            if wait == 0.0:
+                self._record(name, "acquired")
+                if throttled:
+                    self._record(name, "throttled")
+                    self._record(name, "wait_s", waited)
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                self._record(name, "rejected")
+                raise RateLimited(name, wait)
+            # Another process may take the refilled token first; loop and re-check
+            throttled = True
+            time.sleep(wait)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-bucket counters for this process (the buckets themselves are shared)."""
+        out = {}
+        for name, (rate, burst) in self.limits.items():
+            stats = dict(self._metrics.get(name, {"acquired": 0, "throttled": 0, "rejected": 0, "wait_s": 0.0, "max_wait_s": 0.0}))
+            stats.update(per_min=round(rate * 60, 3), burst=burst)
+            stats["wait_s"] = round(stats["wait_s"], 3)
+            stats["max_wait_s"] = round(stats["max_wait_s"], 3)
+            out[name] = stats
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
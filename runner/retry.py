@@ -0,0 +1,115 @@
+# runner/retry.py
+# Retries for outbound sends: decorrelated-jitter backoff, Retry-After on 429/503, and a
+# policy read from config/notify.yaml `retry_policy`.
+
+from __future__ import annotations
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+from runner.notify_config import notify_section
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryExhausted(RuntimeError):
+    """All attempts failed (or the server asked us to wait longer than the policy allows)."""
+
+    def __init__(self, attempts: int, last_error: BaseException, retry_after_s: Optional[float] = None) -> None:
+        super().__init__(f"gave up after {attempts} attempt(s): {last_error}")
+        self.attempts = attempts
+        self.last_error = last_error
+        self.retry_after_s = retry_after_s
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after_s(exc: BaseException, now: Optional[float] = None) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) from an HTTPError's response."""
+    response = getattr(exc, "response", None)
+    value = (getattr(response, "headers", None) or {}).get("Retry-After")
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # Connection errors / timeouts (requests' exceptions are OSError subclasses)
+    return isinstance(exc, (OSError, TimeoutError))
+
+
+class RetryPolicy:
+    """
+    max_attempts total tries. Waits use decorrelated jitter, sleep = min(cap, U(base, 3 * prev)),
+    unless the response carries Retry-After; a Retry-After beyond `cap_s` ends retrying
+    at once (RetryExhausted.retry_after_s says when to come back).
+    """
+
+    def __init__(self, max_attempts: int = 3, base_s: float = 0.5, cap_s: float = 20.0, jitter: bool = True, rng: Optional[random.Random] = None) -> None:
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_s = base_s
+        self.cap_s = cap_s
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    def next_delay(self, prev_s: float) -> float:
+        if not self.jitter:
+            return min(self.cap_s, self.base_s)
+        return min(self.cap_s, self.rng.uniform(self.base_s, max(self.base_s, prev_s * 3)))
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        retryable: Callable[[BaseException], bool] = is_retryable,
+        sleep: Callable[[float], None] = time.sleep,
+        on_retry: Optional[Callable[[int, BaseException, float], None]] = None,
+    ) -> Any:
+        delay = self.base_s
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                hinted = retry_after_s(e)
+                if hinted is not None and hinted > self.cap_s:
+                    raise RetryExhausted(attempt, e, hinted) from e
+                if attempt == self.max_attempts:
+                    raise RetryExhausted(attempt, e, hinted) from e
+                delay = hinted if hinted is not None else self.next_delay(delay)
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                sleep(delay)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+
+def load_retry_policy(path: str = "config/notify.yaml", base_s: float = 0.5, cap_s: float = 20.0) -> RetryPolicy:
+    """retry_policy.max_attempts / backoff_strategy (exponential → decorrelated jitter, else fixed)."""
+    section = notify_section(path, "retry_policy")
+    return RetryPolicy(
+        max_attempts=int(section.get("max_attempts") or 3),
+        base_s=base_s,
+        cap_s=cap_s,
+        jitter=section.get("backoff_strategy", "exponential") == "exponential",
+    )
+
+
+def iso_utc(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
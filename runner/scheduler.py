@@ -0,0 +1,213 @@
+# runner/scheduler.py
+# Durable delayed-job store (SQLite) + heap dispatcher for schedule_flow follow-ups.
+
+from __future__ import annotations
+import heapq
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Job = Dict[str, Any]
+# fire_fn(jobs) → {job_id: (status, error)}; status in done|skipped|error
+FireFn = Callable[[List[Job]], Dict[int, Tuple[str, Optional[str]]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flow_name TEXT NOT NULL,
+    lead_id TEXT NOT NULL,
+    run_at REAL NOT NULL,
+    only_if TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    UNIQUE (flow_name, lead_id, run_at)
+);
+CREATE INDEX IF NOT EXISTS scheduled_jobs_due_idx ON scheduled_jobs (status, run_at);
+"""
+
+
+class JobStore:
+    """SQLite (WAL) job table; every read the dispatcher makes is an index range scan on (status, run_at)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, flow_name: str, lead_id: str, run_at: float, only_if: Optional[str] = None) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO scheduled_jobs (flow_name, lead_id, run_at, only_if, created_at) VALUES (?, ?, ?, ?, ?)",
+                (flow_name, lead_id, run_at, only_if, time.time()),
+            )
+            if cur.rowcount:
+                return int(cur.lastrowid)
+            row = self._conn.execute(
+                "SELECT id FROM scheduled_jobs WHERE flow_name = ? AND lead_id = ? AND run_at = ?", (flow_name, lead_id, run_at)
+            ).fetchone()
+            return int(row["id"])
+
+    def upcoming(self, limit: int) -> List[Tuple[float, int]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_at, id FROM scheduled_jobs WHERE status = 'pending' ORDER BY run_at LIMIT ?", (limit,)
+            ).fetchall()
+        return [(r["run_at"], r["id"]) for r in rows]
+
+    def claim(self, ids: List[int]) -> List[Job]:
+        # pending → running; a job claimed by another process is simply not returned
+        claimed: List[Job] = []
+        now = time.time()
+        with self._lock:
+            for job_id in ids:
+                cur = self._conn.execute(
+                    "UPDATE scheduled_jobs SET status = 'running', attempts = attempts + 1, claimed_at = ?"
+                    " WHERE id = ? AND status = 'pending'",
+                    (now, job_id),
+                )
+                if cur.rowcount:
+                    row = self._conn.execute("SELECT * FROM scheduled_jobs WHERE id = ?", (job_id,)).fetchone()
+                    claimed.append(dict(row))
+        return claimed
+
+    def finish(self, results: Dict[int, Tuple[str, Optional[str]]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE scheduled_jobs SET status = ?, last_error = ? WHERE id = ?",
+                [(status, error, job_id) for job_id, (status, error) in results.items()],
+            )
+
+    def recover(self, stale_s: float = 600.0) -> int:
+        # Jobs left 'running' by a crashed dispatcher go back to pending
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE scheduled_jobs SET status = 'pending' WHERE status = 'running' AND claimed_at < ?",
+                (time.time() - stale_s,),
+            )
+            return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM scheduled_jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class Scheduler:
+    """
+    Min-heap of the earliest `window` pending jobs; the dispatcher thread sleeps until heap[0]
+    is due (or an earlier job is scheduled) and never scans the table. When the heap runs dry
+    it is refilled from the (status, run_at) index. Other processes (cron runs, --leads, --serve)
+    add jobs to the same store, so the dispatcher wakes at least every `poll_s` and re-reads
+    the window from the index.
+    """
+
+    def __init__(
+        self, store: JobStore, fire_fn: FireFn, window: int = 10_000, batch: int = 500, poll_s: float = 5.0
+    ) -> None:
+        self.store = store
+        self.fire_fn = fire_fn
+        self.window = window
+        self.batch = batch
+        self.poll_s = poll_s
+        self._heap: List[Tuple[float, int]] = []
+        self._complete = False  # heap holds every pending job
+        self._horizon = 0.0  # latest run_at covered by the cached window
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.fired = 0
+
+    def _refill(self) -> None:
+        upcoming = self.store.upcoming(self.window)
+        self._heap = upcoming  # already sorted → valid heap
+        self._complete = len(upcoming) < self.window
+        self._horizon = upcoming[-1][0] if upcoming else 0.0
+
+    def schedule(self, flow_name: str, lead_id: str, run_at: float, only_if: Optional[str] = None) -> int:
+        job_id = self.store.add(flow_name, lead_id, run_at, only_if)
+        with self._cond:
+            # Outside the cached window the job is picked up by a later refill
+            if self._complete or run_at <= self._horizon:
+                heapq.heappush(self._heap, (run_at, job_id))
+            if self._heap and self._heap[0][1] == job_id:
+                self._cond.notify_all()
+        return job_id
+
+    def next_due(self) -> Optional[float]:
+        with self._cond:
+            if not self._heap and not self._complete:
+                self._refill()
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        fired = 0
+        while True:
+            with self._cond:
+                if not self._heap and not self._complete:
+                    self._refill()
+                ids: List[int] = []
+                while self._heap and self._heap[0][0] <= now and len(ids) < self.batch:
+                    ids.append(heapq.heappop(self._heap)[1])
+            if not ids:
+                return fired
+            jobs = self.store.claim(ids)
+            if not jobs:
+                continue
+            try:
+                results = self.fire_fn(jobs)
+            except Exception as e:
+                results = {job["id"]: ("error", str(e)) for job in jobs}
+            self.store.finish({job["id"]: results.get(job["id"], ("done", None)) for job in jobs})
+            fired += len(jobs)
+            self.fired += len(jobs)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            due = self.next_due()
+            with self._cond:
+                timeout = self.poll_s if due is None else min(self.poll_s, max(0.0, due - time.time()))
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stop.is_set():
+                    break
+                self._refill()  # pick up jobs inserted by other processes sharing the store
+            self.run_pending()
+
+    def start(self) -> "Scheduler":
+        self.store.recover()
+        with self._cond:
+            self._refill()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            heap_size, next_at = len(self._heap), (self._heap[0][0] if self._heap else None)
+        return {"heap": heap_size, "next_run_at": next_at, "fired": self.fired, "jobs": self.store.counts()}
+
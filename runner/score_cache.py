@@ -0,0 +1,174 @@
+# runner/score_cache.py
+# Content-hash TTL cache (memory LRU + optional SQLite tier) and a concurrency-capped batch
+# front for lead scoring calls such as agent_runner.gpt_qualifier_score.
+
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+
+def content_key(value: Any) -> str:
+    """sha256 of canonical JSON: equal inputs hash equally regardless of key order."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Memory LRU with per-entry expiry; with `path`, a SQLite tier survives restarts and is shared by processes."""
+
+    def __init__(self, ttl_s: float, max_entries: int = 50_000, path: Optional[str] = None) -> None:
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            if path != ":memory:":
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS score_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.counts["memory_hits"] += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._memory[key]
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value, expires_at FROM score_cache WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._put_memory(key, value, row[1])
+                    self.counts["disk_hits"] += 1
+                    return True, value
+            self.counts["misses"] += 1
+            return False, None
+
+    def _put_memory(self, key: str, value: Any, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counts["evictions"] += 1
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO score_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, json.dumps(value), expires_at)
+                )
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            stale = [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in stale:
+                del self._memory[key]
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM score_cache WHERE expires_at <= ?", (now,))
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+
+class ScoreService:
+    """
+    score(): cached, single-flight (concurrent misses on one input share one call).
+    score_many(): dedupes inputs by content hash and scores the misses on a pool
+    capped at `max_concurrency`. Failures are not cached and surface as `default`.
+    """
+
+    def __init__(self, score_fn: Callable[[Dict[str, Any]], Any], cache: TTLCache, max_concurrency: int = 8, default: Any = 0) -> None:
+        self.score_fn = score_fn
+        self.cache = cache
+        self.max_concurrency = max(1, max_concurrency)
+        self.default = default
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._latencies_ms: Deque[float] = deque(maxlen=2048)
+        self.errors = 0
+
+    def _compute(self, key: str, lead_input: Dict[str, Any]) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            started = time.perf_counter()
+            value = self.score_fn(lead_input)
+            with self._lock:
+                self._latencies_ms.append((time.perf_counter() - started) * 1000)
+            self.cache.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def score(self, lead_input: Dict[str, Any]) -> Any:
+        """Raises the scorer's exception on a miss that fails (callers pick the fallback)."""
+        key = content_key(lead_input)
+        hit, value = self.cache.get(key)
+        return value if hit else self._compute(key, lead_input)
+
+    def score_many(self, lead_inputs: Sequence[Dict[str, Any]], max_concurrency: Optional[int] = None) -> List[Any]:
+        keys = [content_key(item) for item in lead_inputs]
+        results: Dict[str, Any] = {}
+        misses: Dict[str, Dict[str, Any]] = {}
+        for key, item in zip(keys, lead_inputs):
+            if key in results or key in misses:
+                continue
+            hit, value = self.cache.get(key)
+            if hit:
+                results[key] = value
+            else:
+                misses[key] = item
+        if misses:
+            workers = min(max_concurrency or self.max_concurrency, len(misses))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score") as pool:
+                futures = {key: pool.submit(self._compute, key, item) for key, item in misses.items()}
+                for key, future in futures.items():
+                    try:
+                        results[key] = future.result()
+                    except Exception:
+                        results[key] = self.default
+        return [results[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._latencies_ms)
+            errors = self.errors
+        counts = dict(self.cache.counts)
+        lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+        pct = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 1) if samples else None  # noqa: E731
+        return {
+            **counts,
+            "hit_rate": round((lookups - counts["misses"]) / lookups, 3) if lookups else None,
+            "errors": errors,
+            "cached": len(self.cache),
+            "latency_ms": {"n": len(samples), "p50": pct(0.5), "p95": pct(0.95), "max": samples[-1] if samples else None},
+        }
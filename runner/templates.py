@@ -0,0 +1,189 @@
+# runner/templates.py
+# WhatsApp template registry: templates are validated once at load (template_guard rules)
+# and compiled into substitution plans; sends do a dict lookup and a join.
+
+from __future__ import annotations
+import argparse
+import json
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from runner.lazy import LazyModule
+
+# Optional YAML parser, imported on first parse; JSON / JSONL template files work without it
+yaml = LazyModule("yaml")
+
+Block = Dict[str, Any]
+_PLACEHOLDER = re.compile(r"\{\{\s*([\w.]+)\s*\}\}")
+MAX_BODY_CHARS = 1024
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def template_guard(block: Block) -> bool:
+    text = block.get("body", "") or ""
+    if len(text) > MAX_BODY_CHARS:
+        raise ValueError("Template body too long (>1024 chars)")
+    if block.get("header_type") == "image" and not block.get("image_url"):
+        raise ValueError("Missing image_url for image header")
+    return True
+
+
+class Template:
+    """A validated template with its body split into (literal, variable) steps."""
+
+    __slots__ = ("name", "brand", "locale", "category", "header_type", "image_url", "body", "variables", "_plan", "_tail", "row")
+
+    def __init__(self, block: Block, validate: Callable[[Block], Any] = template_guard) -> None:
+        name = block.get("template_name") or block.get("name") or block.get("id")
+        if not name:
+            raise TemplateError("template has no name")
+        body = block.get("body") if block.get("body") is not None else block.get("body_template", "")
+        normalized = dict(block, body=body or "")
+        validate(normalized)  # raises ValueError with the guard's message
+        self.name = str(name)
+        self.brand = block.get("brand")
+        self.locale = block.get("locale") or block.get("language")
+        self.category = block.get("category")
+        self.header_type = block.get("header_type")
+        self.image_url = block.get("image_url")
+        self.body = normalized["body"]
+        self.row = block
+        plan: List[Tuple[str, str]] = []
+        pos = 0
+        for match in _PLACEHOLDER.finditer(self.body):
+            plan.append((self.body[pos:match.start()], match.group(1)))
+            pos = match.end()
+        self._plan = tuple(plan)
+        self._tail = self.body[pos:]
+        names = list(dict.fromkeys(var for _, var in plan))
+        declared = block.get("variables")
+        if isinstance(declared, list) and set(map(str, declared)) != set(names):
+            raise TemplateError(f"declared variables {sorted(map(str, declared))} != placeholders {sorted(names)}")
+        self.variables = tuple(names)
+
+    def missing(self, variables: Dict[str, Any]) -> List[str]:
+        return [name for name in self.variables if variables.get(name) is None]
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        try:
+            return "".join([literal + str(variables[var]) for literal, var in self._plan]) + self._tail
+        except KeyError as e:
+            raise TemplateError(f"{self.name}: missing variable {e.args[0]}") from None
+
+    def params(self, variables: Dict[str, Any]) -> List[str]:
+        """Positional parameter values in placeholder order (WhatsApp {{1}}, {{2}} style sends)."""
+        return [str(variables[var]) for var in self.variables]
+
+    def __repr__(self) -> str:
+        return f"Template({self.name!r}, vars={list(self.variables)})"
+
+
+def read_blocks(path: Path) -> List[Block]:
+    """Template rows from .json ([...] or {"templates": [...]}), .jsonl or .yaml files."""
+    text = path.read_text()
+    if path.suffix == ".jsonl":
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if path.suffix in (".yaml", ".yml"):
+        if not yaml.available:
+            raise TemplateError(f"{path}: PyYAML is required for YAML template files")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("templates") or data.get("whatsapp_templates") or []
+    return list(data or [])
+
+
+class TemplateRegistry:
+    """
+    Templates by name and by (brand, locale, name). load() validates every row and keeps the
+    valid ones; invalid rows are reported, never half-loaded. Reloads swap the maps atomically.
+    """
+
+    def __init__(self, validate: Callable[[Block], Any] = template_guard) -> None:
+        self.validate = validate
+        self._by_name: Dict[str, Template] = {}
+        self._by_scope: Dict[Tuple[Any, Any, str], Template] = {}
+        self._lock = threading.Lock()
+        self.sources: List[str] = []
+
+    def compile(self, rows: Iterable[Block]) -> Tuple[List[Template], List[Dict[str, Any]]]:
+        compiled: List[Template] = []
+        invalid: List[Dict[str, Any]] = []
+        for i, row in enumerate(rows):
+            try:
+                compiled.append(Template(row, self.validate))
+            except (ValueError, TypeError) as e:
+                invalid.append({"row": i, "template": row.get("template_name") or row.get("name") or row.get("id"), "error": str(e)})
+        return compiled, invalid
+
+    def load(self, rows: Iterable[Block], source: str = "rows", replace: bool = True) -> Dict[str, Any]:
+        compiled, invalid = self.compile(rows)
+        by_name = {} if replace else dict(self._by_name)
+        by_scope = {} if replace else dict(self._by_scope)
+        for tpl in compiled:
+            by_name.setdefault(tpl.name, tpl)  # first row wins for brand-less lookups
+            by_scope[(tpl.brand, tpl.locale, tpl.name)] = tpl
+        with self._lock:
+            self._by_name, self._by_scope = by_name, by_scope
+            self.sources = [source] if replace else self.sources + [source]
+        return {"source": source, "loaded": len(compiled), "invalid": invalid}
+
+    def load_file(self, path: Any, replace: bool = True) -> Dict[str, Any]:
+        return self.load(read_blocks(Path(path)), str(path), replace)
+
+    def get(self, name: str, brand: Optional[str] = None, locale: Optional[str] = None) -> Optional[Template]:
+        if brand is not None or locale is not None:
+            tpl = self._by_scope.get((brand, locale, name))
+            if tpl is not None:
+                return tpl
+        return self._by_name.get(name)
+
+    def render(self, name: str, variables: Dict[str, Any], brand: Optional[str] = None, locale: Optional[str] = None) -> str:
+        tpl = self.get(name, brand, locale)
+        if tpl is None:
+            raise TemplateError(f"unknown template {name!r}")
+        return tpl.render(variables)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def __len__(self) -> int:
+        return len(self._by_scope)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Validate WhatsApp templates against template_guard rules")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    check = sub.add_parser("validate", help="Compile every template and report the invalid ones")
+    check.add_argument("files", nargs="*", type=Path, help=".json / .jsonl / .yaml template files")
+    check.add_argument("--supabase", action="store_true", help="Also validate the whatsapp_templates table")
+    check.add_argument("--json", action="store_true", help="Machine-readable report")
+    args = parser.parse_args(argv)
+
+    registry = TemplateRegistry()
+    reports = [registry.load(read_blocks(path), str(path), replace=False) for path in args.files]
+    if args.supabase:
+        import agent_runner
+
+        reports.append(registry.load(agent_runner._sb_select_rows("whatsapp_templates", {"select": "*"}), "supabase:whatsapp_templates", replace=False))
+
+    invalid = sum(len(r["invalid"]) for r in reports)
+    if args.json:
+        print(json.dumps({"reports": reports, "templates": len(registry), "invalid": invalid}, indent=2, default=str))
+    else:
+        for report in reports:
+            print(f"{report['source']}: {report['loaded']} ok, {len(report['invalid'])} invalid")
+            for bad in report["invalid"]:
+                print(f"  ✗ row {bad['row']} {bad['template']}: {bad['error']}")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# runner/write_behind.py
+# Write-behind buffer: merges rows per key and flushes multi-row batches on size/time thresholds.
+
+from __future__ import annotations
+import atexit
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+Row = Dict[str, Any]
+FlushFn = Callable[[List[Row]], None]
+
+
+class WriteBehindBuffer:
+    """
+    put() is O(1) and never blocks on the network. Rows sharing `key_col` are merged
+    (later fields win), so queued → sent transitions collapse into a single row.
+
+    A daemon thread flushes when `max_rows` are pending or `max_delay_s` has passed since
+    the oldest pending row. close() (also registered with atexit) flushes whatever is left.
+    Failed flushes are re-queued underneath any newer state for the same key.
+    """
+
+    def __init__(
+        self,
+        flush_fn: FlushFn,
+        key_col: str = "idempotency_key",
+        max_rows: int = 500,
+        max_delay_s: float = 1.0,
+        name: str = "write_behind",
+    ) -> None:
+        self.flush_fn = flush_fn
+        self.key_col = key_col
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay_s = float(max_delay_s)
+        self.name = name
+        self._pending: Dict[str, Row] = {}
+        self._in_flight: Dict[str, Row] = {}
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._metrics: Dict[str, Any] = {
+            "rows_in": 0,
+            "rows_merged": 0,
+            "rows_flushed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        atexit.register(self.close)
+
+    # ---------
+    # producer
+    # ---------
+    def put(self, row: Row) -> None:
+        key = str(row[self.key_col])
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} buffer is closed")
+            existing = self._pending.get(key)
+            if existing is None:
+                self._pending[key] = dict(row)
+            else:
+                existing.update(row)
+                self._metrics["rows_merged"] += 1
+            self._metrics["rows_in"] += 1
+            self._metrics["max_depth"] = max(self._metrics["max_depth"], len(self._pending))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.max_rows
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def pending_rows(self) -> List[Row]:
+        # Rows not yet visible in the backing table (pending or mid-flush)
+        with self._lock:
+            return [dict(r) for r in list(self._in_flight.values()) + list(self._pending.values())]
+
+    # ---------
+    # flushing
+    # ---------
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending, self._oldest = self._pending, {}, None
+                self._in_flight = batch
+            rows = list(batch.values())
+            started = time.perf_counter()
+            try:
+                self.flush_fn(rows)
+            except Exception as e:
+                print(f"[WARN] {self.name} flush of {len(rows)} rows failed: {e}")
+                with self._lock:
+                    self._metrics["flush_errors"] += 1
+                    for key, row in batch.items():
+                        newer = self._pending.get(key)
+                        self._pending[key] = row | newer if newer else row
+                    self._oldest = self._oldest or time.monotonic()
+                    self._in_flight = {}
+                return 0
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            with self._lock:
+                self._in_flight = {}
+                self._metrics["flushes"] += 1
+                self._metrics["rows_flushed"] += len(rows)
+                self._metrics["last_flush_ms"] = round(elapsed_ms, 3)
+                self._metrics["total_flush_ms"] += elapsed_ms
+            return len(rows)
+
+    def _due(self) -> bool:
+        with self._lock:
+            if not self._pending:
+                return False
+            return len(self._pending) >= self.max_rows or time.monotonic() - (self._oldest or 0) >= self.max_delay_s
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.max_delay_s)
+            self._wake.clear()
+            if self._due():
+                self.flush()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None and not self._closed:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+                    self._thread.start()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay_s + 5)
+        self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            m = dict(self._metrics)
+            m["depth"] = len(self._pending)
+        m["avg_flush_ms"] = round(m.pop("total_flush_ms") / m["flushes"], 3) if m["flushes"] else 0.0
+        m["http_calls_saved"] = m["rows_in"] - m["flushes"]
+        return m
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Benchmark trigger predicate evaluation: per-lead closures vs columnar NumPy masks."""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np  # noqa: E402
+
+from runner.columnar import LeadBatch  # noqa: E402
+from runner.conditions import compile_condition  # noqa: E402
+
+SURVEY = compile_condition(
+  'stage == "Deposit" and not survey_scheduled and idle_days >= 7 and not do_not_proceed and not do_not_contact'
+)
+FORMB = compile_condition("quote_sent and not formb_uploaded and hours_since_quote >= 24 and not do_not_proceed and not do_not_contact")
+STAGES = np.array(["New", "Qualified", "Quote", "Deposit", "Survey", "Install", "Done"])
+
+
+def columns(n: int, seed: int = 7) -> dict:
+  rng = np.random.default_rng(seed)
+  return {
+    "id": np.char.add("L", np.arange(n).astype(str)),
+    "stage": STAGES[rng.integers(0, len(STAGES), n)],
+    "survey_scheduled": rng.random(n) < 0.3,
+    "idle_days": rng.integers(0, 30, n).astype(float),
+    "quote_sent": rng.random(n) < 0.5,
+    "formb_uploaded": rng.random(n) < 0.4,
+    "hours_since_quote": rng.integers(0, 96, n).astype(float),
+    "do_not_proceed": rng.random(n) < 0.02,
+    "do_not_contact": rng.random(n) < 0.02,
+  }
+
+
+def timed(fn):
+  start = time.perf_counter()
+  out = fn()
+  return out, round(time.perf_counter() - start, 3)
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--leads", type=int, default=1_000_000)
+  args = parser.parse_args(argv)
+
+  cols = columns(args.leads)
+  batch = LeadBatch.from_columns(cols)
+  dicts, to_dicts_s = timed(lambda: batch.rows())
+
+  def per_lead():
+    return [lead for lead in dicts if SURVEY(lead)], [lead for lead in dicts if FORMB(lead)]
+
+  def columnar():
+    fresh = LeadBatch.from_columns(cols)
+    return fresh.select(SURVEY), fresh.select(FORMB)
+
+  def columnar_from_dicts():
+    fresh = LeadBatch.from_dicts(dicts)
+    return fresh.select(SURVEY), fresh.select(FORMB)
+
+  def masks_only():
+    fresh = LeadBatch.from_columns(cols)
+    return fresh.mask(SURVEY), fresh.mask(FORMB)
+
+  (a, b), per_lead_s = timed(per_lead)
+  _, masks_s = timed(masks_only)
+  (c, d), columnar_s = timed(columnar)
+  (e, f), from_dicts_s = timed(columnar_from_dicts)
+  assert [x["id"] for x in a] == [x["id"] for x in c] == [x["id"] for x in e]
+  assert len(b) == len(d) == len(f)
+  print(json.dumps({
+    "leads": args.leads,
+    "matched": {"survey_pending_alert": len(a), "formb_helper": len(b)},
+    "seconds": {
+      "per_lead_closures": per_lead_s,
+      "columnar_masks_only": masks_s,
+      "columnar_from_columns": columnar_s,
+      "columnar_from_dicts": from_dicts_s,
+      "materialize_all_dicts": to_dicts_s,
+    },
+    "speedup": round(per_lead_s / columnar_s, 1) if columnar_s else None,
+  }, indent=2))
+
+
+if __name__ == "__main__":
+  main()
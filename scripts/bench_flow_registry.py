@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Benchmark per-lead evaluation cost of YAML flows as the flow count grows."""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from runner.flows import FlowRegistry, parse_flow_text  # noqa: E402
+from runner.conditions import compile_condition  # noqa: E402
+
+STAGES = ["New", "Qualified", "Quote", "Deposit", "Survey", "Install", "Done", "Lost"]
+ACTIONS = {"slack": lambda params, lead, idem: None}
+
+
+def write_flows(root: Path, count: int) -> None:
+  for i in range(count):
+    stage = STAGES[i % len(STAGES)]
+    (root / f"flow_{i:04d}.yaml").write_text(
+      f"meta: {{flow_name: flow_{i:04d}}}\n"
+      f"trigger:\n  when: stage == \"{stage}\" and idle_days >= {i % 14} and not do_not_contact\n"
+      "guards: {not_fired_in_days: 7}\n"
+      "actions:\n  - slack: {text: \"{id} idle={idle_days}d\"}\n"
+    )
+
+
+def leads(n: int) -> list:
+  rng = random.Random(7)
+  return [{"id": f"L{i}", "stage": rng.choice(STAGES), "idle_days": rng.randint(0, 20), "do_not_contact": rng.random() < 0.1} for i in range(n)]
+
+
+def per_lead_us(fn, batch: list) -> float:
+  start = time.perf_counter()
+  for lead in batch:
+    fn(lead)
+  return round((time.perf_counter() - start) / len(batch) * 1e6, 1)
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--flows", default="10,100,500", help="Comma-separated flow counts.")
+  parser.add_argument("--leads", type=int, default=2000)
+  parser.add_argument("--reparse-leads", type=int, default=20, help="Leads for the re-read-per-lead baseline (slow).")
+  args = parser.parse_args(argv)
+
+  batch = leads(args.leads)
+  report = []
+  for count in [int(c) for c in args.flows.split(",")]:
+    with tempfile.TemporaryDirectory() as tmp:
+      root = Path(tmp)
+      write_flows(root, count)
+      files = sorted(root.iterdir())
+
+      def reparse(lead: dict) -> list:
+        # Before: read + parse + compile every flow file for every lead
+        out = []
+        for path in files:
+          _meta, doc = parse_flow_text(path.read_text())
+          if compile_condition.__wrapped__(doc["trigger"]["when"])(lead):
+            out.append(path)
+        return out
+
+      registry = FlowRegistry(ACTIONS, check_interval_s=3600)
+      start = time.perf_counter()
+      registry.load_dir(root, force=True)
+      load_ms = round((time.perf_counter() - start) * 1000, 1)
+      flows = registry.flows()
+      linear = lambda lead: [f for f in flows if f.matches(lead)]  # noqa: E731
+      assert all(len(linear(lead)) == len(registry.matching(lead)) for lead in batch[:200])
+      report.append({
+        "flows": count,
+        "load_ms": load_ms,
+        "us_per_lead": {
+          "reparse_per_lead": per_lead_us(reparse, batch[: args.reparse_leads]),
+          "registry_linear": per_lead_us(linear, batch),
+          "registry_indexed": per_lead_us(registry.matching, batch),
+          "registry_load_dir_cached": per_lead_us(lambda _lead: registry.load_dir(root), batch),
+        },
+      })
+  print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark memory and predicate throughput: plain lead dicts vs runner.lead.Lead records."""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from runner.conditions import compile_condition  # noqa: E402
+from runner.lead import Lead  # noqa: E402
+
+SURVEY = compile_condition(
+  'stage == "Deposit" and not survey_scheduled and idle_days >= 7 and not do_not_proceed and not do_not_contact'
+)
+FORMB = compile_condition("quote_sent and not formb_uploaded and hours_since_quote >= 24 and not do_not_proceed and not do_not_contact")
+STAGES = ("New", "Qualified", "Quote", "Deposit", "Survey", "Install", "Done")
+
+
+def lead_dict(i: int, rng: random.Random) -> dict:
+  return {
+    "id": f"00000000-0000-0000-0000-{i:012d}",
+    "brand": "Voltek",
+    "stage": STAGES[rng.randrange(len(STAGES))],
+    "name": "Ali",
+    "wa_number": "60123456789",
+    "survey_scheduled": rng.random() < 0.3,
+    "idle_days": float(rng.randrange(30)),
+    "do_not_proceed": rng.random() < 0.02,
+    "do_not_contact": rng.random() < 0.02,
+    "quote_sent": rng.random() < 0.5,
+    "hours_since_quote": float(rng.randrange(96)),
+    "formb_uploaded": rng.random() < 0.4,
+  }
+
+
+def measure(build):
+  gc.collect()
+  tracemalloc.start()
+  start = time.perf_counter()
+  out = build()
+  seconds = time.perf_counter() - start
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return out, size, round(seconds, 3)
+
+
+def timed(fn, repeat: int):
+  best = float("inf")
+  for _ in range(repeat):
+    start = time.perf_counter()
+    out = fn()
+    best = min(best, time.perf_counter() - start)
+  return out, best
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--leads", type=int, default=200_000)
+  parser.add_argument("--repeat", type=int, default=3)
+  args = parser.parse_args(argv)
+
+  dicts, dict_bytes, dict_build_s = measure(lambda: [lead_dict(i, random.Random(i)) for i in range(args.leads)])
+  records, record_bytes, record_build_s = measure(lambda: [Lead(**lead_dict(i, random.Random(i))) for i in range(args.leads)])
+  _, convert_s = timed(lambda: [Lead.from_dict(d) for d in dicts], 1)
+
+  results = {}
+  for label, leads in (("dict", dicts), ("lead", records)):
+    (survey, formb), pred_s = timed(lambda: (SURVEY.filter(leads), FORMB.filter(leads)), args.repeat)
+    _, get_s = timed(lambda: [lead.get("stage") for lead in leads], args.repeat)
+    results[label] = {
+      "matched": [len(survey), len(formb)],
+      "predicates_per_s": round(2 * len(leads) / pred_s),
+      "get_per_s": round(len(leads) / get_s),
+    }
+  assert results["dict"]["matched"] == results["lead"]["matched"]
+  assert all(Lead.from_dict(d).to_dict() == d for d in dicts[:1000])
+
+  print(json.dumps({
+    "leads": args.leads,
+    "bytes_per_lead": {"dict": round(dict_bytes / args.leads), "lead": round(record_bytes / args.leads)},
+    "memory_ratio": round(dict_bytes / record_bytes, 2),
+    "build_s": {"dict": dict_build_s, "lead": record_build_s, "dict_to_lead": round(convert_s, 3)},
+    "throughput": results,
+    "predicate_speedup": round(results["lead"]["predicates_per_s"] / results["dict"]["predicates_per_s"], 2),
+  }, indent=2))
+
+
+if __name__ == "__main__":
+  main()
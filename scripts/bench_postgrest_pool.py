@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Benchmark agent_runner flows/sec with and without the pooled PostgREST client."""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from postgrest_standin import serve  # noqa: E402
+
+
+def _lead(i: int) -> dict:
+  return {"id": f"bench-{i:08d}", "stage": "Deposit"}
+
+
+def run_flows(runner, flows: int, threads: int) -> float:
+  guards = {"not_fired_in_days": 7, "max_sends_total": 3}
+
+  def one(i: int) -> None:
+    lead = _lead(i)
+    runner.run_flow("bench_flow", lead, guards, lambda _lead, _idem: None)
+
+  start = time.perf_counter()
+  with contextlib.redirect_stdout(io.StringIO()):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+      list(pool.map(one, range(flows)))
+  return flows / (time.perf_counter() - start)
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--flows", type=int, default=500)
+  parser.add_argument("--threads", type=int, default=4)
+  parser.add_argument("--pool-size", type=int, default=10)
+  parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial stand-in latency per request.")
+  args = parser.parse_args(argv)
+
+  with serve(latency_ms=args.latency_ms) as (url, store):
+    os.environ.update({"SUPABASE_URL": url, "SUPABASE_SERVICE_KEY": "bench", "DRY_RUN": "1"})
+    with contextlib.redirect_stdout(io.StringIO()):
+      import agent_runner as runner
+    runner.SUPABASE_URL = url
+    runner.IDEM_WARM_LOAD = False
+    results, http_calls = {}, {}
+    modes = (("before", 0, False), ("after", args.pool_size, False), ("after_write_behind", args.pool_size, True))
+    for label, pool_size, write_behind in modes:
+      store.tables.clear()
+      store.requests = 0
+      runner._IDEM_INDEX = None
+      runner._TRIGGER_BUFFER = None
+      runner.TRIGGER_LOG_BUFFER = write_behind
+      runner._SB_CLIENT = runner.PostgrestClient(url, headers=runner._sb_headers(), pool_size=pool_size)
+      results[label] = round(run_flows(runner, args.flows, args.threads), 1)
+      if runner._TRIGGER_BUFFER is not None:
+        runner._TRIGGER_BUFFER.close()
+      http_calls[label] = store.requests
+      runner._SB_CLIENT.close()
+
+  results["speedup"] = round(results["after"] / results["before"], 2) if results["before"] else None
+  print(json.dumps({"flows": args.flows, "threads": args.threads, "flows_per_sec": results, "http_calls": http_calls}, indent=2))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Profile CLI startup: `python -X importtime` per target, summarised (total, slowest modules, heavy deps loaded)."""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+TARGETS = ("agent_runner", "runner.templates", "agent_logger", "agent_summary")
+# Modules that should only load on first use (network calls, YAML parsing, columnar batches)
+HEAVY = ("requests", "yaml", "numpy", "supabase")
+
+
+def importtime(target: str) -> list:
+  """[(module, self_us, cumulative_us, depth)] for one cold interpreter importing `target`."""
+  env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+  proc = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+    cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+  )
+  rows = []
+  for line in proc.stderr.splitlines():
+    if not line.startswith("import time:") or "self [us]" in line:
+      continue
+    self_us, cumulative_us, name = line[len("import time:"):].split("|")
+    rows.append((name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2))
+  return rows
+
+
+def wall_ms(code: str, repeat: int) -> float:
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, check=True)
+    samples.append((time.perf_counter() - start) * 1000)
+  return round(statistics.median(samples), 1)
+
+
+def profile(target: str, repeat: int, top: int) -> dict:
+  runs = [importtime(target) for _ in range(repeat)]
+  totals = [next(cum for name, _s, cum, depth in rows if name == target and depth == 0) for rows in runs]
+  rows = runs[totals.index(sorted(totals)[len(totals) // 2])]  # the median run
+  loaded = {name for name, *_ in rows}
+  # Direct imports of the target: printed just before it, after the previous top-level entry (site etc.)
+  end = max(i for i, (name, _s, _c, depth) in enumerate(rows) if name == target and depth == 0)
+  start = max([i + 1 for i, row in enumerate(rows[:end]) if row[3] == 0], default=0)
+  roots = [(name, cum) for name, _s, cum, depth in rows[start:end] if depth == 1]
+  return {
+    "import_ms": round(statistics.median(totals) / 1000, 1),
+    "self_ms": round(rows[end][1] / 1000, 1),
+    "modules": len(rows),
+    "heavy_loaded": [name for name in HEAVY if name in loaded],
+    "slowest": [{"module": name, "ms": round(cum / 1000, 1)} for name, cum in sorted(roots, key=lambda r: -r[1])[:top]],
+  }
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("targets", nargs="*", default=list(TARGETS), help="Modules to import (default: runner entry points).")
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--top", type=int, default=8, help="Slowest direct imports to list per target.")
+  parser.add_argument("--budget-ms", type=float, default=0, help="Exit 1 if any target imports slower than this.")
+  parser.add_argument("--forbid-heavy", action="store_true", help="Exit 1 if a target eagerly imports requests/yaml/numpy/supabase.")
+  args = parser.parse_args(argv)
+
+  report = {"python": sys.version.split()[0], "interpreter_ms": wall_ms("pass", args.repeat), "targets": {}}
+  for target in args.targets:
+    result = profile(target, args.repeat, args.top)
+    result["wall_ms"] = wall_ms(f"import {target}", args.repeat)
+    report["targets"][target] = result
+  print(json.dumps(report, indent=2))
+
+  failed = [
+    t for t, r in report["targets"].items()
+    if (args.budget_ms and r["import_ms"] > args.budget_ms) or (args.forbid_heavy and r["heavy_loaded"])
+  ]
+  if failed:
+    print(f"startup budget exceeded: {', '.join(failed)}", file=sys.stderr)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Minimal in-memory PostgREST stand-in for local benchmarks of agent_runner."""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+
+def _match(row: Dict[str, Any], column: str, expr: str) -> bool:
+  op, _, value = expr.partition(".")
+  current = row.get(column)
+  if op == "eq":
+    return str(current) == value
+  if op == "gte":
+    return current is not None and str(current) >= value
+  if op == "gt":
+    return current is not None and str(current) > value
+  if op == "in":
+    return str(current) in value.strip("()").split(",")
+  if op == "like":
+    return current is not None and _like(str(current), value)
+  return True
+
+
+def _like(text: str, pattern: str) -> bool:
+  parts = pattern.split("*")
+  if not text.startswith(parts[0]) or not text.endswith(parts[-1]):
+    return False
+  pos = len(parts[0])
+  for part in parts[1:-1]:
+    found = text.find(part, pos)
+    if found < 0:
+      return False
+    pos = found + len(part)
+  return True
+
+
+class Store:
+  def __init__(self) -> None:
+    self.tables: Dict[str, List[Dict[str, Any]]] = {}
+    self.lock = threading.Lock()
+    self.requests = 0
+
+  def rows(self, table: str) -> List[Dict[str, Any]]:
+    return self.tables.setdefault(table, [])
+
+
+class Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  disable_nagle_algorithm = True
+  store: Store
+  latency_s: float = 0.0
+
+  def log_message(self, fmt, *args):  # noqa: D401 - keep benchmark output clean
+    return
+
+  def _split(self) -> Tuple[str, List[Tuple[str, str]]]:
+    parts = urlsplit(self.path)
+    table = parts.path.rsplit("/", 1)[-1]
+    return table, parse_qsl(parts.query, keep_blank_values=True)
+
+  def _body(self) -> Any:
+    length = int(self.headers.get("Content-Length") or 0)
+    return json.loads(self.rfile.read(length) or b"null") if length else None
+
+  def _reply(self, status: int, payload: Any = None, headers: Dict[str, str] | None = None) -> None:
+    data = b"" if payload is None else json.dumps(payload).encode()
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(data)))
+    for key, value in (headers or {}).items():
+      self.send_header(key, value)
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _filtered(self, table: str, query: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    reserved = {"select", "order", "limit", "offset", "on_conflict"}
+    filters = [(k, v) for k, v in query if k not in reserved]
+    return [r for r in self.store.rows(table) if all(_match(r, k, v) for k, v in filters)]
+
+  def _pre(self) -> None:
+    with self.store.lock:
+      self.store.requests += 1
+    if self.latency_s:
+      time.sleep(self.latency_s)
+
+  def do_GET(self) -> None:
+    self._pre()
+    table, query = self._split()
+    with self.store.lock:
+      rows = self._filtered(table, query)
+    params = dict(query)
+    if "order" in params:
+      column = params["order"].split(".")[0]
+      rows.sort(key=lambda r: str(r.get(column)))
+    if "limit" in params:
+      rows = rows[: int(params["limit"])]
+    total = len(rows)
+    rng = self.headers.get("Range")
+    if rng:
+      start, _, end = rng.partition("-")
+      rows = rows[int(start): int(end) + 1]
+    self._reply(200, rows, {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{total}"})
+
+  def do_PATCH(self) -> None:
+    self._pre()
+    table, query = self._split()
+    body = self._body() or {}
+    with self.store.lock:
+      for row in self._filtered(table, query):
+        row.update(body)
+    self._reply(204)
+
+  def _rpc_trigger_guard_stats(self, args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    log = self.store.rows("yaml_trigger_log")
+    keys = {r.get("idempotency_key") for r in log}
+    out = []
+    for item in args.get("p_items") or []:
+      history = [r for r in log if r.get("lead_id") == item["lead_id"] and r.get("flow_name") == item["flow_name"]]
+      since = item.get("since")
+      out.append({
+        **{k: item[k] for k in ("lead_id", "flow_name", "idempotency_key")},
+        "key_exists": item["idempotency_key"] in keys,
+        "window_count": sum(1 for r in history if since and str(r.get("trigger_time")) >= since),
+        "total_count": len(history),
+      })
+    return out
+
+  def do_POST(self) -> None:
+    self._pre()
+    table, query = self._split()
+    body = self._body()
+    if "/rpc/" in self.path:
+      handler = getattr(self, f"_rpc_{table}", None)
+      if handler is None:
+        self._reply(404, {"message": f"function {table} not found"})
+        return
+      with self.store.lock:
+        result = handler(body or {})
+      self._reply(200, result)
+      return
+    rows = body if isinstance(body, list) else [body]
+    conflict = dict(query).get("on_conflict")
+    with self.store.lock:
+      existing = self.store.rows(table)
+      for row in rows:
+        hit = None
+        if conflict:
+          hit = next((r for r in existing if r.get(conflict) == row.get(conflict)), None)
+        if hit is not None:
+          hit.update(row)
+        else:
+          existing.append(dict(row))
+    self._reply(201, rows)
+
+
+@contextmanager
+def serve(port: int = 0, latency_ms: float = 0.0) -> Iterator[Tuple[str, Store]]:
+  """Run the stand-in on a background thread; yields (base_url, store)."""
+  store = Store()
+  handler = type("BoundHandler", (Handler,), {"store": store, "latency_s": latency_ms / 1000.0})
+  server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+  server.daemon_threads = True
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  try:
+    yield f"http://127.0.0.1:{server.server_address[1]}", store
+  finally:
+    server.shutdown()
+    server.server_close()
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Serve an in-memory PostgREST stand-in.")
+  parser.add_argument("--port", type=int, default=54321)
+  parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial per-request latency.")
+  args = parser.parse_args(argv)
+  with serve(args.port, args.latency_ms) as (url, _):
+    print(f"PostgREST stand-in listening on {url}/rest/v1 (Ctrl+C to stop)")
+    try:
+      threading.Event().wait()
+    except KeyboardInterrupt:
+      pass
+
+
+if __name__ == "__main__":
+  main()
@@ -4,9 +4,14 @@ import json
 import os
 import sys
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-import requests
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from runner.lazy import LazyModule  # noqa: E402
+from runner.ratelimit import RateLimiter, load_rate_limits  # noqa: E402
+
+requests = LazyModule("requests")  # --dry-run never imports it
 
 
 WHATCHIMP_ENDPOINT = "https://app.whatchimp.com/api/v1/whatsapp/send/template"
@@ -26,10 +31,13 @@ def ensure_env(var: str) -> str:
   return value
 
 
-def send_whatsapp_template(payload: Dict[str, Any], dry_run: bool = False) -> Dict[str, Any]:
+def send_whatsapp_template(payload: Dict[str, Any], dry_run: bool = False, limiter: Optional[RateLimiter] = None) -> Dict[str, Any]:
   if dry_run:
     return {"status": "DRY_RUN", "code": 200, "response": "dry-run"}
 
+  if limiter is not None:
+    # Same whatsapp bucket as agent_runner.send_whatsapp (config/notify.yaml rate_limits)
+    limiter.acquire("whatsapp", timeout=float(os.getenv("RATE_LIMIT_MAX_WAIT_S", "60")))
   response = requests.post(WHATCHIMP_ENDPOINT, data=payload, timeout=15)
   return {
     "status": "SENT" if response.status_code == 200 else "FAILED",
@@ -61,6 +69,12 @@ def main(argv=None) -> None:
     help="Corrective action proof to scan.",
   )
   parser.add_argument("--dry-run", action="store_true", help="Skip actual API call.")
+  parser.add_argument("--notify-config", default=os.getenv("NOTIFY_CONFIG", "config/notify.yaml"), help="rate_limits source.")
+  parser.add_argument(
+    "--rate-limit-db",
+    default=os.getenv("RATE_LIMIT_DB", "var/ratelimit.sqlite3"),
+    help="Token buckets shared with agent_runner processes on this host.",
+  )
   args = parser.parse_args(argv)
 
   proof = load_proof(args.scan)
@@ -82,7 +96,8 @@ def main(argv=None) -> None:
     "templateVariable-system-delivery-date-5": proof.get("generated_at", "unknown"),
   }
 
-  result = send_whatsapp_template(template_payload, dry_run=args.dry_run)
+  limiter = None if args.dry_run else RateLimiter(args.rate_limit_db, load_rate_limits(args.notify_config))
+  result = send_whatsapp_template(template_payload, dry_run=args.dry_run, limiter=limiter)
   event_entry = {
     "generated_at": proof.get("generated_at"),
     "channel": "whatsapp",
@@ -0,0 +1,27 @@
+import pytest
+
+import agent_runner
+from runner.idem_cache import IdempotencyIndex
+
+
+@pytest.fixture
+def stub_supabase(monkeypatch):
+    """Offline Supabase: no trigger history, empty RPC answers, a fresh idempotency index. Returns the upserted payloads."""
+    upserts = []
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())
+    monkeypatch.setattr(agent_runner, "_sb_select_rows", lambda *a, **k: [])
+    monkeypatch.setattr(agent_runner, "_sb_rpc", lambda *a, **k: [])
+    monkeypatch.setattr(agent_runner, "_sb_upsert_on_conflict", lambda table, payload, conflict_col, timeout=None: upserts.append(payload))
+    return upserts
+
+
+@pytest.fixture
+def survey_alert_sends(monkeypatch):
+    """survey_pending_alert with its executor replaced by a recorder. Returns the ids of the leads it sent to."""
+    sent = []
+    monkeypatch.setitem(
+        agent_runner.TRIGGERS,
+        "survey_pending_alert",
+        (agent_runner.WHEN_SURVEY_PENDING_ALERT, agent_runner.guards_survey_pending_alert, lambda lead, idem: sent.append(lead["id"])),
+    )
+    return sent
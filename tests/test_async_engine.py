@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import agent_runner
+from runner.engine import AsyncFlowEngine, call, drive_sync
+from runner.idem_cache import IdempotencyIndex
+
+
+def _flow(x):
+    y = yield call(lambda v: v * 2, x)
+    try:
+        yield call(int, "not-a-number")
+    except ValueError:
+        return y + 1
+
+
+def test_drive_sync_and_async_share_one_flow_body():
+    assert drive_sync(_flow(20)) == 41
+    engine = AsyncFlowEngine(max_in_flight=2)
+    assert asyncio.run(engine.drive(_flow(20))) == 41
+    engine.close()
+
+
+def test_fire_many_runs_leads_concurrently_with_cap(monkeypatch):
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())
+    monkeypatch.setattr(agent_runner, "log_trigger", lambda *a, **k: None)
+
+    lock, calls, active = threading.Lock(), [], [0, 0]  # active: now, peak
+
+    def slow_guards(lead_id, flow_name, key, n_days=0, max_total=0, check_key=True):
+        with lock:
+            calls.append(lead_id)
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return agent_runner._empty_guard_stats()
+
+    monkeypatch.setattr(agent_runner, "guard_stats", slow_guards)
+    sent = []
+
+    async def exec_async(lead, idem):
+        sent.append(lead["id"])
+
+    monkeypatch.setitem(
+        agent_runner.TRIGGERS,
+        "formb_helper",
+        (agent_runner.when_formb_helper, agent_runner.guards_formb_helper, exec_async),
+    )
+    leads = [{"id": f"L{i}", "stage": "Quote", "quote_sent": True, "hours_since_quote": 30} for i in range(20)]
+    leads.append({"id": "cold", "stage": "Quote"})
+
+    started = time.perf_counter()
+    results = agent_runner.fire_many(leads, ["formb_helper"], max_in_flight=10)
+    elapsed = time.perf_counter() - started
+
+    assert sorted(calls) == sorted(f"L{i}" for i in range(20))  # the stub really ran, once per lead
+    assert 1 < active[1] <= 10
+    assert elapsed < 0.5  # 20 × 50ms guard waits overlap instead of adding up to 1s
+    assert [r[0] for r in results] == [lead["id"] for lead in leads]
+    assert results[0][2] == ("sent", None)
+    assert results[-1][2] == ("skipped", "when_not_matched")
+    assert sorted(sent) == sorted(f"L{i}" for i in range(20))
+
+
+def test_cached_engine_survives_successive_event_loops(monkeypatch):
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())
+    monkeypatch.setattr(agent_runner, "log_trigger", lambda *a, **k: None)
+    monkeypatch.setattr(agent_runner, "guard_stats", lambda *a, **k: time.sleep(0.01) or agent_runner._empty_guard_stats())
+    monkeypatch.setitem(
+        agent_runner.TRIGGERS,
+        "formb_helper",
+        (agent_runner.when_formb_helper, agent_runner.guards_formb_helper, lambda lead, idem: None),
+    )
+    monkeypatch.setattr(agent_runner, "_ASYNC_ENGINE", AsyncFlowEngine(max_in_flight=2))  # fewer slots than leads
+    for run in range(2):  # each fire_many is a fresh asyncio.run loop
+        leads = [{"id": f"R{run}L{i}", "stage": "Quote", "quote_sent": True, "hours_since_quote": 30} for i in range(8)]
+        results = agent_runner.fire_many(leads, ["formb_helper"])
+        assert [r[2] for r in results] == [("sent", None)] * 8
+    agent_runner._ASYNC_ENGINE.close()
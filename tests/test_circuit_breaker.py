@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+import agent_runner
+from runner.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from runner.dlq import DeadLetterStore
+from runner.outbox import Outbox
+from runner.postgrest import PostgrestClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HTTPError(OSError):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status, "headers": {}})()
+
+
+def _fail(exc):
+    def fn():
+        raise exc
+    return fn
+
+
+def test_opens_on_failure_rate_and_recovers_through_half_open():
+    clock, transitions = Clock(), []
+    breaker = CircuitBreaker("whatsapp", window=10, min_calls=4, failure_rate=0.5, open_s=30, half_open_calls=2,
+                             clock=clock, on_transition=lambda name, old, new, stats: transitions.append((old, new)))
+    breaker.call(lambda: "ok")
+    breaker.call(lambda: "ok")
+    for _ in range(2):
+        with pytest.raises(HTTPError):
+            breaker.call(_fail(HTTPError(503)))
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen) as err:
+        breaker.call(lambda: "never runs")
+    assert err.value.retry_in_s == 30
+
+    clock.now = 31
+    assert breaker.call(lambda: "trial") == "trial" and breaker.state == HALF_OPEN
+    breaker.call(lambda: "trial")
+    assert breaker.state == CLOSED
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+
+
+def test_half_open_failure_reopens_and_client_errors_do_not_count():
+    clock = Clock()
+    breaker = CircuitBreaker("slack", min_calls=2, open_s=5, clock=clock)
+    for _ in range(5):
+        with pytest.raises(HTTPError):
+            breaker.call(_fail(HTTPError(400)))
+    assert breaker.state == CLOSED
+
+    for _ in range(5):  # 5 of 10 calls failed → 50%
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail(ConnectionError("reset")))
+    assert breaker.state == OPEN
+    clock.now = 6
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail(ConnectionError("still down")))
+    assert breaker.state == OPEN and breaker.stats()["opened"] == 2
+
+
+def test_slow_calls_trip_the_breaker():
+    breaker = CircuitBreaker("supabase", min_calls=3, slow_call_s=0.5, slow_rate=0.6)
+    for _ in range(3):
+        breaker.after_call(12.0)  # successful but at the timeout edge
+    assert breaker.state == OPEN
+
+
+def test_open_supabase_circuit_fails_without_network():
+    breaker = CircuitBreaker("supabase", min_calls=1)
+    breaker.after_call(0.0, ConnectionError("down"))
+    client = PostgrestClient("http://127.0.0.1:9", pool_size=0, breaker=breaker)
+    with pytest.raises(CircuitOpen):
+        client.select("lead_log", {"select": "id"})
+
+
+def test_open_whatsapp_circuit_dead_letters_and_logs_transition(monkeypatch, tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    store = DeadLetterStore(str(tmp_path / "dlq.sqlite3"))
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_API_URL", "https://wa.test")
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_KEY", "k")
+    monkeypatch.setattr(agent_runner, "_QUIET_HOURS", None)
+    monkeypatch.setattr(agent_runner, "_DLQ", store)
+    monkeypatch.setattr(agent_runner, "_OUTBOX", outbox)
+    monkeypatch.setattr(agent_runner, "_RETRY_POLICY", agent_runner.RetryPolicy(max_attempts=1))
+    monkeypatch.setattr(agent_runner, "_RATE_LIMITER", agent_runner.RateLimiter(":memory:", {}))
+    monkeypatch.setattr(agent_runner, "BREAKERS", agent_runner.BreakerRegistry(
+        on_transition=agent_runner._log_breaker_transition, min_calls=2, open_s=60))
+    posts = []
+
+    def timeout(*args, **kwargs):
+        posts.append(1)
+        raise TimeoutError("read timed out")
+
+    monkeypatch.setattr(agent_runner.requests, "post", timeout)
+    for _ in range(5):
+        with pytest.raises(agent_runner.DeadLettered):
+            agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali", "choice_cta": "x"})
+    assert len(posts) == 2  # the rest failed fast
+    assert agent_runner.breaker_metrics()["whatsapp"]["rejected"] == 3
+    [row] = outbox.pending_payloads("ops_logs")
+    assert (row["flow"], row["node"], row["status"]) == ("circuit_breaker", "whatsapp", "open")
+
+
+def test_slack_error_status_counts_as_a_breaker_failure(monkeypatch, tmp_path):
+    class Response:
+        status_code = 503
+
+        def raise_for_status(self):
+            raise OSError("503 Server Error")
+
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "SLACK_WEBHOOK", "https://hooks.test")
+    monkeypatch.setattr(agent_runner, "_QUIET_HOURS", None)
+    monkeypatch.setattr(agent_runner, "_DLQ", DeadLetterStore(str(tmp_path / "dlq.sqlite3")))
+    monkeypatch.setattr(agent_runner, "_RETRY_POLICY", agent_runner.RetryPolicy(max_attempts=1))
+    monkeypatch.setattr(agent_runner, "_RATE_LIMITER", agent_runner.RateLimiter(":memory:", {}))
+    monkeypatch.setattr(agent_runner, "BREAKERS", agent_runner.BreakerRegistry(min_calls=2, open_s=60))
+    monkeypatch.setattr(agent_runner.requests, "post", lambda *a, **k: Response())
+
+    for _ in range(2):
+        with pytest.raises(agent_runner.DeadLettered):
+            agent_runner._send_slack_now("#ops-leads", "lead 1")
+    stats = agent_runner.breaker_metrics()["slack"]
+    assert (stats["state"], stats["failures"]) == ("open", 2)
+
+
+def test_supabase_transitions_are_held_until_the_circuit_closes(monkeypatch):
+    clock, written = Clock(), []
+    monkeypatch.setattr(agent_runner, "RUNNER_OUTBOX", "")
+    monkeypatch.setattr(agent_runner, "_OUTBOX", None)
+    monkeypatch.setattr(agent_runner, "_BREAKER_LOG", agent_runner.deque(maxlen=200))
+    monkeypatch.setattr(agent_runner, "_sb_upsert_rows", lambda table, rows, conflict_col, timeout=None: written.append((table, rows)))
+    monkeypatch.setattr(agent_runner, "BREAKERS", agent_runner.BreakerRegistry(
+        on_transition=agent_runner._log_breaker_transition, min_calls=2, open_s=30, half_open_calls=2, clock=clock))
+    supabase = agent_runner.BREAKERS.get("supabase")
+    supabase.after_call(0.0, ConnectionError("down"))
+    supabase.after_call(0.0, ConnectionError("down"))
+    clock.now = 31
+    supabase.before_call()  # → half-open: the held rows must not take the second trial slot
+    assert supabase.state == HALF_OPEN and supabase._trials == 1 and written == []
+    supabase.after_call(0.0)
+    supabase.before_call()
+    supabase.after_call(0.0)
+    assert supabase.state == CLOSED
+    for _ in range(100):
+        if written:
+            break
+        time.sleep(0.01)
+    [(table, rows)] = written
+    assert table == "ops_logs" and [r["status"] for r in rows] == [OPEN, HALF_OPEN, CLOSED]
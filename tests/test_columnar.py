@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import agent_runner
+from runner.columnar import LeadBatch
+from runner.conditions import compile_condition
+
+VALUES = [None, True, False, 0, 1, "", "Deposit", "Quote", "8", "x", 7.0, 8, 3.5]
+SOURCES = [
+    'stage == "Deposit" and not survey_scheduled and idle_days >= 7',
+    "stage in ('Deposit', 'Quote') || survey_scheduled",
+    "stage not in ['Quote'] and 7 < idle_days",
+    "survey_scheduled == true or stage == null",
+    "idle_days == survey_scheduled",  # field vs field → per-row fallback
+    "stage > 'A'",
+]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_vector_mask_matches_scalar_condition(source):
+    rng = random.Random(source)
+    leads = [{k: rng.choice(VALUES) for k in ("stage", "survey_scheduled", "idle_days")} for _ in range(500)]
+    condition = compile_condition(source)
+    assert LeadBatch.from_dicts(leads).mask(condition).tolist() == condition.mask(leads)
+
+
+def test_column_batch_selects_only_matching_rows():
+    batch = LeadBatch.from_columns({
+        "id": np.array(["L1", "L2", "L3", "L4"]),
+        "stage": np.array(["Deposit", "Quote", "Deposit", "Deposit"]),
+        "idle_days": np.array([9.0, 12.0, 3.0, 7.0]),
+        "survey_scheduled": np.array([False, False, False, True]),
+    })
+    rows = batch.select(agent_runner.WHEN_SURVEY_PENDING_ALERT)
+    assert rows == [{"id": "L1", "stage": "Deposit", "idle_days": 9.0, "survey_scheduled": False}]
+    assert [len(c) for c in batch.chunks(3)] == [3, 1]
+
+
+def test_fire_batch_accepts_lead_batch(stub_supabase, survey_alert_sends):
+    sent = survey_alert_sends
+    batch = LeadBatch.from_columns({
+        "id": np.array([f"L{i}" for i in range(10)]),
+        "stage": np.array(["Deposit", "Quote"] * 5),
+        "idle_days": np.arange(10, dtype=float),
+    })
+    summary = agent_runner.fire_batch(batch, ["survey_pending_alert"], chunk_size=4)
+    assert sent == ["L8"]
+    assert summary["by_reason"]["survey_pending_alert"] == {"sent:sent": 1, "skipped:when_not_matched": 9}
@@ -0,0 +1,39 @@
+import pytest
+
+from runner.conditions import ConditionError, compile_condition
+
+
+LEAD = {"stage": "Deposit", "survey_scheduled": False, "idle_days": "8.5", "meta": {"score": 70}}
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("survey_scheduled==false", True),
+        ("formb_uploaded == false", True),  # missing bool field reads as false
+        ('stage == "Deposit" and not survey_scheduled and idle_days >= 7', True),
+        ("idle_days > 9 || stage != 'Deposit'", False),
+        ("!(idle_days < 7) && stage in ('Deposit', 'Quote')", True),
+        ("stage not in ['Deposit']", False),
+        ("meta.score >= 70", True),
+        ("missing_number < 1", True),  # missing number reads as 0
+        ("", True),
+    ],
+)
+def test_condition_semantics(source, expected):
+    assert compile_condition(source)(LEAD) is expected
+
+
+def test_compiled_once_and_filters_batches():
+    cond = compile_condition("idle_days >= 7 and not do_not_contact")
+    assert compile_condition("idle_days >= 7 and not do_not_contact") is cond
+    assert cond.fields == ["idle_days", "do_not_contact"]
+    leads = [{"idle_days": 8}, {"idle_days": 3}, {"idle_days": 9, "do_not_contact": True}]
+    assert cond.mask(leads) == [True, False, False]
+    assert cond.filter(leads) == [leads[0]]
+
+
+@pytest.mark.parametrize("source", ["stage ==", "(a == 1", "a == 1 b", "__import__('os')", "a in b"])
+def test_invalid_conditions_raise(source):
+    with pytest.raises(ConditionError):
+        compile_condition(source)
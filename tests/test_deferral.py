@@ -0,0 +1,135 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import agent_runner
+from runner.breaker import CircuitOpen
+from runner.deferral import DeferralQueue, DeferralReleaser, QuietHours, load_quiet_hours
+from runner.dlq import DeadLetterStore, payload_checksum
+from runner.ratelimit import RateLimiter
+
+
+def _epoch(hour, minute=0, day=5):
+    return datetime(2026, 1, day, hour, minute, tzinfo=timezone.utc).timestamp()
+
+
+def test_overnight_window_releases_at_next_end():
+    quiet = QuietHours("22:00", "07:00", timezone.utc)
+    assert quiet.release_at(_epoch(21, 59)) is None
+    assert quiet.release_at(_epoch(22, 0)) == _epoch(7, day=6)
+    assert quiet.release_at(_epoch(3, 30)) == _epoch(7)
+    assert quiet.release_at(_epoch(7, 0)) is None
+    same_day = QuietHours("12:00", "13:00", timezone.utc)
+    assert same_day.release_at(_epoch(12, 30)) == _epoch(13) and same_day.release_at(_epoch(14)) is None
+    config = load_quiet_hours("config/notify.yaml", timezone.utc)
+    assert (config.start, config.end) == (22 * 60, 7 * 60)
+
+
+def test_release_is_paced_by_rate_limit(tmp_path):
+    sent = []
+    queue = DeferralQueue(str(tmp_path / "deferred.sqlite3"))
+    for i in range(5):
+        queue.defer("whatsapp", {"to": f"60{i}"}, release_at=_epoch(7))
+    queue.defer("whatsapp", {"to": "later"}, release_at=_epoch(7, day=6))
+    limiter = RateLimiter(str(tmp_path / "rl.sqlite3"), {"whatsapp": (0.0001, 2)})
+    releaser = DeferralReleaser(queue, lambda channel, payload: sent.append(payload["to"]), limiter)
+
+    assert releaser.release_once(now=_epoch(6, 59))["released"] == 0
+    result = releaser.release_once(now=_epoch(7, 1))
+    assert (result["released"], result["paced"]) == (2, 1)
+    assert sent == ["600", "601"]
+    metrics = releaser.metrics()
+    assert metrics["queue"]["whatsapp"]["depth"] == 4
+    assert metrics["released"]["whatsapp"]["released"] == 2
+
+
+def test_failed_release_is_requeued(tmp_path):
+    queue = DeferralQueue(str(tmp_path / "deferred.sqlite3"))
+    queue.defer("slack", {"text": "x"}, release_at=0)
+
+    def boom(channel, payload):
+        raise RuntimeError("webhook down")
+
+    releaser = DeferralReleaser(queue, boom, retry_s=30)
+    assert releaser.release_once()["failed"] == 1
+    assert queue.due("slack", 10) == []
+    assert queue.depth()["slack"]["depth"] == 1
+
+
+class HTTPError(OSError):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status, "headers": {}})()
+
+
+def test_release_gives_up_to_dead_letters_after_max_attempts_or_a_permanent_error(tmp_path):
+    queue = DeferralQueue(str(tmp_path / "deferred.sqlite3"))
+    queue.defer("whatsapp", {"to": "flaky"}, release_at=0)
+    queue.defer("whatsapp", {"to": "bad"}, release_at=0)
+    queue.defer("whatsapp", {"to": "down"}, release_at=0)
+    errors = {"flaky": HTTPError(503), "bad": HTTPError(400), "down": CircuitOpen("whatsapp", 5.0)}
+    dead = []
+
+    def send(channel, payload):
+        raise errors[payload["to"]]
+
+    releaser = DeferralReleaser(queue, send, retry_s=0, max_attempts=2, dead_letter_fn=lambda *args: dead.append(args[1:3]))
+    assert releaser.release_once(now=time.time() + 1) == {"released": 0, "failed": 2, "dead_lettered": 1, "paced": 0}
+    assert dead == [({"to": "bad"}, 1)]
+    assert releaser.release_once(now=time.time() + 1)["dead_lettered"] == 1
+    assert dead[-1] == ({"to": "flaky"}, 2)
+    attempts = queue._conn.execute("SELECT payload, attempts FROM deferred_sends").fetchall()
+    assert [tuple(r) for r in attempts] == [('{"to": "down"}', 0)]  # an open circuit spends no attempts
+
+
+def test_dead_lettered_release_marks_the_flow_row_error(monkeypatch, tmp_path):
+    logged = []
+    monkeypatch.setattr(agent_runner, "_DLQ", DeadLetterStore(str(tmp_path / "dlq.sqlite3")))
+    monkeypatch.setattr(agent_runner, "log_trigger", lambda lead_id, flow, status, key, **kw: logged.append((status, key, kw["error"])))
+    payload = {"to": "6012", "_trigger_log": {"lead_id": "L1", "flow_name": "formb_helper", "idempotency_key": "K1"}}
+
+    agent_runner._dead_letter_deferred("whatsapp", payload, 1, HTTPError(400))
+    [entry] = agent_runner._DLQ.entries()
+    assert entry["payload_checksum"] == payload_checksum({"to": "6012"})  # replayable as-is
+    assert logged == [("error", "K1", f"dead-lettered as {entry['dlq_id']}: HTTP 400")]
+
+
+def test_live_send_in_quiet_hours_is_deferred(monkeypatch, tmp_path):
+    posts = []
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_API_URL", "https://wa.test")
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_KEY", "k")
+    now = datetime.now(timezone.utc)
+    window = [(now + timedelta(hours=h)).strftime("%H:%M") for h in (-1, 1)]
+    monkeypatch.setattr(agent_runner, "_QUIET_HOURS", QuietHours(*window, timezone.utc))
+    releaser = DeferralReleaser(DeferralQueue(str(tmp_path / "deferred.sqlite3")), agent_runner._deliver)
+    monkeypatch.setattr(agent_runner, "_DEFERRAL_RELEASER", releaser)
+    monkeypatch.setattr(agent_runner.requests, "post", lambda *a, **k: posts.append(k["json"]))
+
+    agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali", "choice_cta": "x"})
+    assert posts == []
+    assert agent_runner.notify_metrics()["deferred"]["queue"]["whatsapp"]["depth"] == 1
+
+
+def test_deferred_flow_send_is_logged_deferred_until_released(monkeypatch, tmp_path):
+    posts, logged = [], []
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_API_URL", "https://wa.test")
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_KEY", "k")
+    now = datetime.now(timezone.utc)
+    window = [(now + timedelta(hours=h)).strftime("%H:%M") for h in (-1, 1)]
+    monkeypatch.setattr(agent_runner, "_QUIET_HOURS", QuietHours(*window, timezone.utc))
+    queue = DeferralQueue(str(tmp_path / "deferred.sqlite3"))
+    monkeypatch.setattr(agent_runner, "_DEFERRAL_RELEASER", DeferralReleaser(queue, agent_runner._release_deferred))
+    monkeypatch.setattr(agent_runner, "BREAKERS", agent_runner.BreakerRegistry())
+    monkeypatch.setattr(agent_runner, "should_fire", lambda lead, flow, guards: (True, "", "K1"))
+    monkeypatch.setattr(agent_runner, "log_trigger", lambda lead_id, flow, status, key, **kw: logged.append((flow, status, key)))
+    monkeypatch.setattr(agent_runner, "create_secure_link", lambda lead_id, ttl_hours: "https://l.test")
+    monkeypatch.setattr(agent_runner.requests, "post", lambda *a, **k: posts.append(k["json"]) or type("R", (), {"raise_for_status": lambda self: None})())
+
+    lead = {"id": "L1", "wa_number": "6012", "first_name": "Ali"}
+    assert agent_runner.run_flow("docs_microcommit_day2", lead, {}, agent_runner.exec_docs_microcommit) == ("deferred", None)
+    assert logged[-1] == ("docs_microcommit_day2", "deferred", "K1") and posts == []
+
+    assert DeferralReleaser(queue, agent_runner._release_deferred).release_once(now=time.time() + 7200)["released"] == 1
+    assert logged[-1] == ("docs_microcommit_day2", "sent", "K1")
+    assert posts and "_trigger_log" not in posts[0]
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import agent_runner
+
+
+def _lead(lead_id, **extra):
+    lead = {"id": lead_id, "stage": "Deposit", "idle_days": 9, "survey_scheduled": False}
+    lead.update(extra)
+    return lead
+
+
+def test_fire_batch_prefetches_once_and_writes_one_upsert(monkeypatch, stub_supabase, survey_alert_sends):
+    recent = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    history = [
+        {"lead_id": "L2", "flow_name": "survey_pending_alert", "idempotency_key": "old-key", "trigger_time": recent},
+    ]
+    selects, upserts, sent = [], stub_supabase, survey_alert_sends
+
+    def fake_rows(path, params, page_size=1000, timeout=None):
+        selects.append(params)
+        return history
+
+    monkeypatch.setattr(agent_runner, "_sb_select_rows", fake_rows)
+
+    leads = iter([_lead("L1"), _lead("L2"), _lead("L3", stage="Quote"), _lead("L1")])
+    summary = agent_runner.fire_batch(leads, ["survey_pending_alert"])
+
+    assert len(selects) == 1 and selects[0]["lead_id"] == "in.(L1,L2)"
+    assert sum(len(rows) for rows in upserts) == 2  # one upsert per column set (sent vs skipped+reason)
+    assert all(len({tuple(sorted(row)) for row in rows}) == 1 for rows in upserts)
+    assert len(sent) == 1
+    assert summary["leads"] == 4
+    assert (summary["sent"], summary["skipped"], summary["error"]) == (1, 3, 0)
+    assert summary["by_reason"]["survey_pending_alert"] == {
+        "sent:sent": 1,
+        "skipped:fired_in_window": 1,
+        "skipped:idempotent_key_exists": 1,
+        "skipped:when_not_matched": 1,
+    }
+
+
+def test_fire_batch_sends_through_worker_pool(monkeypatch, stub_supabase):
+    from runner.pool import FlowWorkerPool
+
+    def exec_fn(lead, idem):
+        if lead["id"] == "L3":
+            raise RuntimeError("whatchimp 500")
+
+    monkeypatch.setitem(
+        agent_runner.TRIGGERS,
+        "survey_pending_alert",
+        (agent_runner.when_survey_pending_alert, agent_runner.guards_survey_pending_alert, exec_fn),
+    )
+    pool = FlowWorkerPool(max_workers=4)
+    leads = [_lead(f"L{i}", brand="Voltek" if i % 2 else "Perodua") for i in range(6)]
+    summary = agent_runner.fire_batch(leads, ["survey_pending_alert"], pool=pool)
+    assert (summary["sent"], summary["error"]) == (5, 1)
+    assert summary["by_reason"]["survey_pending_alert"]["error:RuntimeError"] == 1
+    assert set(pool.metrics()["tenants"]) == {"Voltek", "Perodua"}
+    pool.shutdown()
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import agent_runner
+from runner.pool import FlowWorkerPool, parse_tenant_limits
+
+
+def test_tenant_caps_hold_while_small_tenant_is_not_starved():
+    pool = FlowWorkerPool(max_workers=4, tenant_limits={"Voltek": 2})
+    lock = threading.Lock()
+    running = {"Voltek": 0, "Perodua": 0}
+    peak = {"Voltek": 0, "Perodua": 0}
+    finished = []
+
+    def job(tenant, i):
+        with lock:
+            running[tenant] += 1
+            peak[tenant] = max(peak[tenant], running[tenant])
+        time.sleep(0.01)
+        with lock:
+            running[tenant] -= 1
+            finished.append(tenant)
+        return i
+
+    futures = [pool.submit("Voltek", job, "Voltek", i) for i in range(20)]
+    futures.append(pool.submit("Perodua", job, "Perodua", 99))
+    assert pool.drain(timeout=5)
+
+    assert peak["Voltek"] == 2
+    assert futures[-1].result() == 99
+    assert finished.index("Perodua") < 5  # dispatched alongside Voltek, not after its backlog
+    m = pool.metrics()
+    assert m["tenants"]["Voltek"]["done"] == 20 and m["tenants"]["Voltek"]["max_queue_depth"] >= 17
+    assert (m["in_flight"], m["queued"]) == (0, 0)
+    pool.shutdown()
+
+
+def test_submit_lead_routes_by_brand(monkeypatch):
+    pool = FlowWorkerPool(max_workers=2)
+    monkeypatch.setattr(agent_runner, "run_flow", lambda name, lead, guards, fn: ("sent", None))
+    lead = {"id": "L1", "brand": "Perodua", "stage": "Deposit", "idle_days": 9}
+    future = agent_runner.submit_lead(lead, ["survey_pending_alert", "formb_helper"], pool=pool)
+    assert future.result(timeout=5) == {
+        "survey_pending_alert": ("sent", None),
+        "formb_helper": ("skipped", "when_not_matched"),
+    }
+    assert list(pool.metrics()["tenants"]) == ["Perodua"]
+    assert parse_tenant_limits("Voltek=8, Perodua=4,") == {"Voltek": 8, "Perodua": 4}
+    pool.shutdown()
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import agent_runner
+from runner.flows import FlowError, FlowRegistry, compile_template
+
+
+LEADS = [
+    {"id": "L1", "stage": "Deposit", "survey_scheduled": False, "idle_days": 8.0, "quote_sent": True, "hours_since_quote": 30},
+    {"id": "L2", "stage": "Deposit", "survey_scheduled": True, "idle_days": 9, "quote_sent": True, "formb_uploaded": True},
+    {"id": "L3", "stage": "Quote", "idle_days": 12, "quote_sent": True, "hours_since_quote": 10},
+    {"id": "L4", "stage": "Deposit", "idle_days": "7", "do_not_contact": True},
+    {"id": "L5"},
+]
+
+
+def test_yaml_flows_match_builtin_triggers():
+    flows = {f.name: f for f in agent_runner.yaml_flows()}
+    for name, (when, _guards, _exec) in agent_runner.TRIGGERS.items():
+        assert [flows[name].matches(lead) for lead in LEADS] == [when(lead) for lead in LEADS], name
+    assert flows["survey_pending_alert"].guard_config == {"not_fired_in_days": 7, "max_sends_total": 3}
+
+
+def test_registry_reparses_only_on_mtime_change(tmp_path):
+    path = tmp_path / "nudge.yaml"
+    path.write_text('meta: {flow_name: nudge}\ntrigger: {when: stage == "Quote"}\nactions: [{slack: {text: "hi {id}"}}]\n')
+    registry = FlowRegistry({"slack": lambda params, lead, idem: None})
+    first = registry.get(path)
+    assert registry.get(path) is first and registry.loads == 1
+
+    path.write_text('meta: {flow_name: nudge}\ntrigger: {when: stage == "Deposit"}\nactions: [{slack: {text: "hi"}}]\n')
+    os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+    second = registry.get(path)
+    assert second is not first and registry.loads == 2
+    assert registry.matching({"stage": "Deposit"}) == [second]
+    assert registry.matching({"stage": "Quote"}) == []
+
+
+def test_execute_renders_actions_in_order(tmp_path):
+    calls = []
+    path = tmp_path / "flow.json"
+    path.write_text(
+        '{"meta": {"flow_name": "j"}, "trigger": {"when": "idle_days > 1"},'
+        ' "actions": [{"slack": {"text": "{name} RM{bill|-} {link}"}}, {"whatsapp": {"template_id": "t", "variables": {"n": "{name}"}}}]}'
+    )
+    registry = FlowRegistry(
+        {"slack": lambda p, lead, idem: calls.append(("slack", p)), "whatsapp": lambda p, lead, idem: calls.append(("wa", p))},
+        {"link": lambda lead: "https://x/" + lead["id"]},
+    )
+    flow = registry.get(path)
+    flow.execute({"id": "L1", "name": "Ali", "idle_days": 2}, "idem")
+    assert calls == [("slack", {"text": "Ali RM- https://x/L1"}), ("wa", {"template_id": "t", "variables": {"n": "Ali"}})]
+
+
+def test_unknown_action_rejected_and_meta_only_files_load(tmp_path):
+    bad = tmp_path / "bad.yaml"
+    bad.write_text("trigger: {when: a == 1}\nactions: [{email: {to: x}}]\n")
+    registry = FlowRegistry({})
+    with pytest.raises(FlowError):
+        registry.get(bad)
+    meta_only = tmp_path / "preview.yaml"
+    meta_only.write_text("meta:\n  flow_name: preview\n  owner: ops\n")
+    flow = registry.get(meta_only)
+    assert not flow.executable and flow.meta == {"flow_name": "preview", "owner": "ops"}
+
+
+def test_bad_condition_is_a_flow_error_and_preview_still_reads_meta(tmp_path, monkeypatch, capsys):
+    bad = tmp_path / "broken.yaml"
+    bad.write_text("meta: {flow_name: broken, owner: ops}\ntrigger: {when: stage ==}\nactions: [{slack: {text: hi}}]\n")
+    with pytest.raises(FlowError, match="invalid trigger.when"):
+        FlowRegistry({"slack": lambda params, lead, idem: None}).get(bad)
+    monkeypatch.setattr(agent_runner, "_FLOW_REGISTRY", None)
+    agent_runner.run_flow_demo(str(bad), "Voltek", True, None)
+    out = capsys.readouterr().out
+    assert "Flow: broken" in out and "Owner: ops" in out and "Not executable by the runner" in out
+
+
+def test_template_without_placeholders_is_constant():
+    assert compile_template("plain")({}, {}) == "plain"
+
+
+def test_matching_is_scoped_to_a_directory_and_tolerates_unhashable_fields(tmp_path):
+    registry = FlowRegistry({"slack": lambda params, lead, idem: None})
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}.yaml").write_text(
+            f'meta: {{flow_name: {name}}}\ntrigger: {{when: stage == "Quote"}}\nactions: [{{slack: {{text: "hi"}}}}]\n'
+        )
+        registry.load_dir(tmp_path / name)
+    lead = {"id": "L1", "stage": "Quote"}
+    assert sorted(f.name for f in registry.matching(lead)) == ["a", "b"]
+    assert [f.name for f in registry.matching(lead, tmp_path / "a")] == ["a"]
+    assert registry.matching({"id": "L2", "stage": ["Quote", "Deposit"]}) == []
+    assert registry.matching({"id": "L3", "stage": {"name": "Quote"}}) == []
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+import agent_runner
+from runner.idem_cache import IdempotencyIndex
+from runner.latency import Histogram, LatencyRecorder
+
+
+def test_histogram_percentiles_within_bucket_precision():
+    rng = random.Random(7)
+    values = sorted(rng.randint(50, 2_000_000) for _ in range(20000))
+    hist = Histogram()
+    for v in values:
+        hist.record_us(v)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(hist.percentile_us(q) - exact) / exact < 0.02
+    assert hist.count == len(values) and hist.max_us == values[-1]
+    assert len(hist.counts) < 1200  # sparse log-linear buckets, not one per value
+
+
+def test_small_values_are_exact():
+    hist = Histogram()
+    for v in (3, 3, 3, 90):
+        hist.record_us(v)
+    assert hist.percentile_us(0.5) == 3 and hist.percentile_us(0.99) == 90
+
+
+def test_prometheus_text_and_context_labels():
+    rec = LatencyRecorder()
+
+    def inner():
+        rec.record("sb.select:lead_log", 0.002)  # inherits flow/brand from the timed step
+
+    rec.timed("guard", inner, "survey_pending_alert", "Voltek")()
+    text = rec.prometheus()
+    assert "# TYPE agent_runner_stage_latency_seconds summary" in text
+    labels = 'stage="sb.select:lead_log",flow="survey_pending_alert",brand="Voltek"'
+    assert f'agent_runner_stage_latency_seconds{{{labels},quantile="0.95"}}' in text
+    assert f"agent_runner_stage_latency_seconds_count{{{labels}}} 1" in text
+    assert {row["stage"] for row in rec.snapshot()} == {"guard", "sb.select:lead_log"}
+
+
+def test_flush_writes_ops_logs_rows_and_keeps_window_on_failure():
+    rec = LatencyRecorder()
+    for ms in (10, 20, 30, 400):
+        rec.record("exec", ms / 1000, "formb_helper", "Perodua")
+
+    def failing(rows):
+        raise RuntimeError("supabase down")
+
+    with pytest.raises(RuntimeError):
+        rec.flush(failing)
+    written = []
+    assert rec.flush(written.extend, default_brand="Voltek") == 1
+    row = written[0]
+    assert (row["brand"], row["flow"], row["node"], row["status"]) == ("Perodua", "formb_helper", "exec", "latency")
+    assert abs(row["latency_ms"] - 400) <= 4 and row["metadata"]["count"] == 4  # bucket precision
+    assert rec.snapshot() == []
+
+
+def test_run_flow_records_guard_log_exec_stages(monkeypatch):
+    rec = LatencyRecorder()
+    monkeypatch.setattr(agent_runner, "LATENCY", rec)
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())
+    monkeypatch.setattr(agent_runner, "_sb_rpc", lambda *a, **k: [])
+    monkeypatch.setattr(agent_runner, "log_trigger", lambda *a, **k: None)
+    lead = {"id": "L1", "stage": "Deposit", "brand": "Voltek"}
+    assert agent_runner.run_flow("f1", lead, {}, lambda lead, idem: None) == ("sent", None)
+    stages = {(r["stage"], r["flow"], r["brand"]): r["count"] for r in rec.snapshot()}
+    assert stages[("guard", "f1", "Voltek")] == 1
+    assert stages[("log", "f1", "Voltek")] == 2
+    assert stages[("exec", "f1", "Voltek")] == 1
+    assert stages[("flow", "f1", "Voltek")] == 1
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import agent_runner
+from runner.lazy import LazyModule, module_available
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_lazy_module_imports_on_first_attribute_and_forwards_writes(monkeypatch):
+    lazy = LazyModule("colorsys")
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    assert not lazy.loaded and lazy.available and "colorsys" not in sys.modules
+    assert lazy.rgb_to_hsv(1, 0, 0) == (0.0, 1.0, 1)
+    assert lazy.loaded and lazy.load() is sys.modules["colorsys"]
+    monkeypatch.setattr(lazy, "ONE_THIRD", 0.5)
+    assert sys.modules["colorsys"].ONE_THIRD == 0.5
+
+
+def test_missing_module_uses_stand_in_or_raises():
+    stub = LazyModule("no_such_module_xyz", missing=lambda: type("Stub", (), {"post": None})())
+    assert not stub.available and not module_available("no_such_module_xyz")
+    assert stub.post is None and not stub.available
+    with pytest.raises(ModuleNotFoundError):
+        LazyModule("no_such_module_xyz").post
+
+
+def test_import_agent_runner_is_quiet_and_defers_heavy_modules():
+    code = (
+        "import json, sys, agent_runner; "
+        "print(json.dumps([m for m in ('requests', 'yaml', 'numpy', 'supabase') if m in sys.modules]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert out.splitlines() == ["[]"]  # no env warnings at import, nothing heavy loaded
+
+
+def test_env_notices_print_once_on_first_use(monkeypatch, capsys):
+    monkeypatch.setattr(agent_runner, "_NOTICES", set())
+    monkeypatch.setattr(agent_runner, "DRY_RUN", True)
+    agent_runner.send_whatsapp("6012", "unregistered_template")
+    agent_runner.send_whatsapp("6012", "unregistered_template")
+    assert capsys.readouterr().out.count("[INFO] DRY_RUN=1") == 1
@@ -0,0 +1,44 @@
+import io
+import json
+
+import agent_runner
+from runner.ingest import IngestStats, normalize_lead, stream_leads
+from runner.pool import FlowWorkerPool
+
+
+def _line(lead_id, **fields):
+    lead = {"id": lead_id, "stage": "Deposit", "idle_days": "9", "survey_scheduled": "false"}
+    lead.update(fields)
+    return json.dumps(lead) + "\n"
+
+
+def test_normalize_coerces_export_values():
+    lead = normalize_lead({"lead_id": 7, "stage": " Deposit ", "idle_days": "8", "survey_scheduled": "FALSE", "do_not_contact": "1"})
+    assert lead == {"lead_id": 7, "id": "7", "stage": "Deposit", "idle_days": 8.0, "survey_scheduled": False, "do_not_contact": True}
+    assert normalize_lead({"stage": "Deposit"}) is None
+
+
+def test_stream_counts_bad_lines_and_unwraps_envelopes(tmp_path):
+    path = tmp_path / "leads.jsonl"
+    path.write_text(_line("L1") + "\n" + "{oops\n" + json.dumps({"lead": {"id": "L2"}}) + "\n" + "[1, 2]\n" + "{}\n")
+    stats = IngestStats()
+    leads = stream_leads([str(path)], stats)
+    assert next(leads)["id"] == "L1"  # lazy: nothing past the first lead has been read yet
+    assert stats.lines == 1
+    assert [lead["id"] for lead in leads] == ["L2"]
+    assert (stats.lines, stats.leads, stats.bad) == (6, 2, 3)
+
+
+def test_run_leads_streams_stdin_through_guards_and_pool(monkeypatch, stub_supabase, survey_alert_sends):
+    upserts, sent = stub_supabase, survey_alert_sends
+    lines = [_line(f"L{i}", stage="Deposit" if i % 2 else "Quote") for i in range(10)] + ["not json\n"]
+    monkeypatch.setattr("sys.stdin", io.StringIO("".join(lines)))
+    pool = FlowWorkerPool(max_workers=2, max_queued=1)
+
+    summary = agent_runner.run_leads(["-"], ["survey_pending_alert"], chunk_size=4, pool=pool, progress_s=0)
+    pool.shutdown()
+
+    assert sorted(sent) == ["L1", "L3", "L5", "L7", "L9"]
+    assert (summary["leads"], summary["sent"], summary["skipped"]) == (10, 5, 5)
+    assert summary["ingest"]["bad"] == 1 and summary["ingest"]["lines"] == 11
+    assert len(upserts) == 3  # one trigger-log upsert per chunk with candidates
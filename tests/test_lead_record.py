@@ -0,0 +1,45 @@
+import pytest
+
+import agent_runner
+from runner.conditions import compile_condition
+from runner.lead import Lead, as_dict
+
+
+def _dict(**extra):
+    lead = {"id": "L1", "stage": "Deposit", "idle_days": 9.0, "survey_scheduled": False, "wa_number": "6012", "name": "Ali"}
+    lead.update(extra)
+    return lead
+
+
+def test_round_trip_and_mapping_behaviour():
+    data = _dict(meta={"src": "csv"}, score=None)
+    lead = Lead.from_dict(data)
+    assert lead.to_dict() == data and lead == data and as_dict(lead) == data
+    assert Lead.from_dict(lead) is lead
+    assert lead["id"] == "L1" and lead.get("meta") == {"src": "csv"} and lead.get("score", 1) is None
+    assert lead.get("first_name", "-") == "-" and "first_name" not in lead and "stage" in lead
+    with pytest.raises(KeyError):
+        lead["first_name"]
+    lead["first_name"] = "Ali"
+    lead["new_col"] = 1
+    assert dict(lead)["first_name"] == "Ali" and set(lead.keys()) >= {"first_name", "new_col"}
+    assert not hasattr(lead, "__dict__")
+
+
+def test_conditions_agree_on_dicts_and_records():
+    cond = compile_condition('stage == "Deposit" and not survey_scheduled and idle_days >= 7 and meta.src == "csv"')
+    leads = [_dict(meta={"src": "csv"}), _dict(idle_days=1.0, meta={"src": "csv"}), _dict()]
+    records = [Lead.from_dict(d) for d in leads]
+    assert cond.mask(leads) == cond.mask(records) == [True, False, False]
+    assert [as_dict(r) for r in cond.filter(records)] == cond.filter(leads)
+    assert cond.mask([leads[0], records[1], records[0]]) == [True, False, True]  # mixed input
+
+
+def test_flow_functions_accept_records(monkeypatch, stub_supabase, survey_alert_sends):
+    sent = survey_alert_sends
+    monkeypatch.setattr(agent_runner, "schedule_flow", lambda *a, **k: None)
+    lead = Lead.from_dict(_dict())
+    assert agent_runner.maybe_fire_survey_pending_alert(lead)[0] == "sent"  # real executor, record input
+    records = [Lead.from_dict(_dict(id=f"B{i}")) for i in range(100)]  # ≥ VECTOR_MIN_ROWS → columnar path
+    summary = agent_runner.fire_batch(records, ["survey_pending_alert"])
+    assert summary["sent"] == 100 and len(sent) == 100
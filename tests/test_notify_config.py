@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+
+from runner import notify_config
+from runner.notify_config import load_notify_config, notify_section, parse_notify_config
+
+
+def test_line_reader_matches_yaml_on_notify_yaml():
+    yaml = pytest.importorskip("yaml")
+    text = Path("config/notify.yaml").read_text()
+    assert parse_notify_config(text) == yaml.safe_load(text)
+
+
+def test_line_reader_handles_comments_quotes_and_scalars():
+    config = parse_notify_config(
+        "# notify\n"
+        "coalesce_window_min: 2.5  # minutes\n"
+        "quiet_hours:\n"
+        '  start_local: "22:00"\n'
+        "  end_local: '07:00'  # next day\n"
+        "retry_policy:\n"
+        "\n"
+        "  max_attempts: 4\n"
+        "  enabled: true\n"
+    )
+    assert config == {
+        "coalesce_window_min": 2.5,
+        "quiet_hours": {"start_local": "22:00", "end_local": "07:00"},
+        "retry_policy": {"max_attempts": 4, "enabled": True},
+    }
+
+
+def test_sections_fall_back_without_yaml(monkeypatch, tmp_path):
+    monkeypatch.setattr(type(notify_config.yaml), "available", property(lambda self: False))
+    assert notify_section("config/notify.yaml", "rate_limits")["whatsapp_per_min"] == 20
+    assert notify_section("config/notify.yaml", "coalesce_window_min") == {}
+    assert load_notify_config(str(tmp_path / "missing.yaml")) == {}
@@ -0,0 +1,101 @@
+import json
+import random
+
+import pytest
+
+import agent_runner
+from runner.dlq import DeadLetterStore, payload_checksum
+from runner.retry import RetryExhausted, RetryPolicy, load_retry_policy, retry_after_s
+
+
+class HTTPError(OSError):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status, "headers": headers or {}})()
+
+
+def test_policy_from_notify_yaml():
+    policy = load_retry_policy("config/notify.yaml")
+    assert policy.max_attempts == 3 and policy.jitter
+
+
+def test_decorrelated_jitter_and_retry_after():
+    sleeps = []
+    errors = iter([HTTPError(503), HTTPError(429, {"Retry-After": "7"}), None])
+
+    def flaky():
+        error = next(errors)
+        if error:
+            raise error
+        return "ok"
+
+    policy = RetryPolicy(max_attempts=3, base_s=1, cap_s=20, rng=random.Random(1))
+    assert policy.call(flaky, sleep=sleeps.append) == "ok"
+    assert 1 <= sleeps[0] <= 3 and sleeps[1] == 7
+    assert retry_after_s(HTTPError(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), now=0) > 0
+
+
+def test_non_retryable_and_long_retry_after_stop_early():
+    policy = RetryPolicy(max_attempts=5, cap_s=10)
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise HTTPError(400)
+
+    with pytest.raises(HTTPError):
+        policy.call(bad_request, sleep=lambda s: None)
+    assert len(calls) == 1
+
+    def throttled():
+        raise HTTPError(429, {"Retry-After": "3600"})
+
+    with pytest.raises(RetryExhausted) as err:
+        policy.call(throttled, sleep=lambda s: None)
+    assert err.value.attempts == 1 and err.value.retry_after_s == 3600
+
+
+def test_exhausted_send_is_dead_lettered_then_replayed(monkeypatch, tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dlq.sqlite3"))
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_API_URL", "https://wa.test")
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_KEY", "k")
+    monkeypatch.setattr(agent_runner, "_QUIET_HOURS", None)
+    monkeypatch.setattr(agent_runner, "_DLQ", store)
+    monkeypatch.setattr(agent_runner, "_RETRY_POLICY", RetryPolicy(max_attempts=3, base_s=0, cap_s=0))
+    monkeypatch.setattr(agent_runner, "_RATE_LIMITER", agent_runner.RateLimiter(":memory:", {}))
+    attempts = []
+
+    def down(*args, **kwargs):
+        attempts.append(kwargs["json"])
+        raise HTTPError(502)
+
+    monkeypatch.setattr(agent_runner.requests, "post", down)
+    with pytest.raises(agent_runner.DeadLettered):
+        agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali", "choice_cta": "x"})
+    assert len(attempts) == 3
+
+    [entry] = store.snapshot()["entries"]
+    assert set(entry) == {"dlq_id", "channel", "retry_count", "last_error", "next_attempt_at", "payload_checksum"}
+    assert (entry["channel"], entry["retry_count"], entry["last_error"]) == ("whatsapp", 3, "HTTP 502")
+    assert entry["payload_checksum"] == payload_checksum(attempts[0])
+
+    replayed = []
+    report = store.replay(lambda channel, payload: replayed.append(payload), force=True)
+    assert replayed == [attempts[0]]
+    assert (report["dlq_replayed"], report["replay_success_rate"], report["remaining"]) == (1, 1.0, 0)
+
+
+def test_replay_failure_keeps_entry(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dlq.sqlite3"))
+    store.put("slack", {"text": "x"}, 3, "HTTP 500", next_attempt_at=0)
+    store.put("slack", {"text": "x"}, 3, "HTTP 503", next_attempt_at=0)  # same payload → one entry
+
+    def still_down(channel, payload):
+        raise RuntimeError("HTTP 500")
+
+    report = store.replay(still_down)
+    assert (report["dlq_failed"], report["remaining"]) == (1, 1)
+    [entry] = store.entries()
+    assert entry["retry_count"] == 7
+    assert json.dumps(store.snapshot())  # serializable proof document
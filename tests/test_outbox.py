@@ -0,0 +1,152 @@
+import json
+import sqlite3
+
+import agent_runner
+from runner.idem_cache import IdempotencyIndex
+from runner.outbox import Outbox, OutboxDrainer, main
+
+
+def test_outbox_merges_per_key_and_drains_in_batches(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.put_upsert("yaml_trigger_log", {"idempotency_key": "k1", "status": "queued"}, "idempotency_key")
+    outbox.put_upsert("yaml_trigger_log", {"idempotency_key": "k1", "status": "sent"}, "idempotency_key")
+    outbox.put_upsert("yaml_trigger_log", {"idempotency_key": "k2", "status": "queued"}, "idempotency_key")
+    outbox.put_update("lead_log", {"id": "eq.L1"}, {"stage": "Survey"})
+    assert outbox.stats()["depth"] == 3
+
+    upserts, updates = [], []
+    drainer = OutboxDrainer(outbox, lambda t, rows, c: upserts.append((t, rows, c)), lambda t, m, p: updates.append((t, m, p)))
+    assert drainer.drain_all() == {"sent": 3, "failed": 0, "parked": 0}
+    assert upserts == [("yaml_trigger_log", [{"idempotency_key": "k1", "status": "sent"}, {"idempotency_key": "k2", "status": "queued"}], "idempotency_key")]
+    assert updates == [("lead_log", {"id": "eq.L1"}, {"stage": "Survey"})]
+    assert outbox.stats()["depth"] == 0
+
+
+def test_failed_rows_back_off_and_cli_reports_them(tmp_path, capsys):
+    db = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(db)
+    outbox.put_upsert("yaml_trigger_log", {"idempotency_key": "k1", "status": "sent"}, "idempotency_key")
+
+    def down(*args):
+        raise ConnectionError("503")
+
+    drainer = OutboxDrainer(outbox, down, down)
+    assert drainer.drain_once() == {"sent": 0, "failed": 1, "parked": 0}
+    assert outbox.due() == []  # waiting for backoff
+
+    assert main(["--db", db, "stats"]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["depth"] == 1 and stats["retrying"] == 1 and stats["max_attempts"] == 1
+    assert outbox.list()[0]["last_error"] == "503"
+
+
+def test_run_flow_writes_to_outbox_without_touching_supabase(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent_runner, "RUNNER_OUTBOX", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(agent_runner, "OUTBOX_INTERVAL_MS", 60_000)
+    monkeypatch.setattr(agent_runner, "_OUTBOX", None)
+    monkeypatch.setattr(agent_runner.atexit, "register", lambda fn: fn)
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())
+    monkeypatch.setattr(agent_runner, "guard_stats", lambda *a, **k: agent_runner._empty_guard_stats())
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("network write on the flow path")
+
+    monkeypatch.setattr(agent_runner, "_sb_upsert_on_conflict", no_network)
+    monkeypatch.setattr(agent_runner, "_sb_update", no_network)
+    lead = {"id": "L1", "stage": "Deposit"}
+    assert agent_runner.run_flow("formb_helper", lead, agent_runner.guards_formb_helper(lead), lambda l, k: agent_runner.update_lead("L1", nudged=True)) == ("sent", None)
+    assert agent_runner._outbox().stats()["by_target"] == {"yaml_trigger_log:upsert": 1, "lead_log:update": 1}
+    agent_runner._OUTBOX_DRAINER.stop(final_drain=False)
+
+
+def test_fire_batch_guards_against_rows_still_in_outbox(tmp_path, monkeypatch, stub_supabase, survey_alert_sends):
+    sent = survey_alert_sends
+    monkeypatch.setattr(agent_runner, "RUNNER_OUTBOX", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(agent_runner, "OUTBOX_INTERVAL_MS", 60_000)
+    monkeypatch.setattr(agent_runner, "_OUTBOX", None)
+    monkeypatch.setattr(agent_runner.atexit, "register", lambda fn: fn)
+    # stub_supabase: the outbox is not drained yet, so Supabase has no history
+    leads = [{"id": f"L{i}", "stage": "Deposit", "idle_days": 9, "survey_scheduled": False} for i in range(3)]
+    assert agent_runner.fire_batch(leads, ["survey_pending_alert"])["sent"] == 3
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())  # e.g. a rerun / --serve re-delivery
+    assert agent_runner.fire_batch(leads, ["survey_pending_alert"])["sent"] == 0
+    assert len(sent) == 3
+    agent_runner._OUTBOX_DRAINER.stop(final_drain=False)
+
+
+def test_pending_payloads_filters_on_value_lists(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    for key, lead_id in (("k1", "L1"), ("k2", "L2"), ("k3", "L3")):
+        outbox.put_upsert("yaml_trigger_log", {"idempotency_key": key, "lead_id": lead_id}, "idempotency_key")
+    assert [r["idempotency_key"] for r in outbox.pending_payloads("yaml_trigger_log", lead_id=["L1", "L3"])] == ["k1", "k3"]
+    assert outbox.pending_payloads("yaml_trigger_log", lead_id=[]) == []
+
+
+class HTTPError(OSError):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status, "headers": {}})()
+
+
+def test_rejected_row_is_parked_and_the_rest_of_its_batch_drains(tmp_path, capsys):
+    db = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(db)
+    for key in ("k1", "k2", "bad", "k4", "k5"):
+        outbox.put_upsert("yaml_trigger_log", {"idempotency_key": key, "status": "sent"}, "idempotency_key")
+    shipped = []
+
+    def upsert(table, rows, conflict_col):
+        if any(r["idempotency_key"] == "bad" for r in rows):
+            raise HTTPError(400)  # e.g. a column the table does not have
+        shipped.extend(r["idempotency_key"] for r in rows)
+
+    drainer = OutboxDrainer(outbox, upsert, lambda *a: None)
+    assert drainer.drain_all() == {"sent": 4, "failed": 0, "parked": 1}
+    assert sorted(shipped) == ["k1", "k2", "k4", "k5"]
+    assert outbox.due() == [] and outbox.stats()["parked"] == 1
+    assert [r["idempotency_key"] for r in outbox.pending_payloads("yaml_trigger_log")] == ["bad"]  # guards still see it
+
+    assert "outbox parked 1 yaml_trigger_log row(s): HTTP 400" in capsys.readouterr().out
+    assert main(["--db", db, "unpark"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"unparked": 1}
+    assert [r["dedupe_key"] for r in outbox.due()] == ["bad"]
+
+
+def test_transient_failures_back_off_the_batch_and_park_after_max_attempts(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.put_upsert("yaml_trigger_log", {"idempotency_key": "k1"}, "idempotency_key")
+    outbox.put_upsert("yaml_trigger_log", {"idempotency_key": "k2"}, "idempotency_key")
+    calls = []
+
+    def down(table, rows, conflict_col):
+        calls.append(len(rows))
+        raise HTTPError(503)
+
+    drainer = OutboxDrainer(outbox, down, lambda *a: None, backoff_s=lambda attempts: 0, max_attempts=2)
+    assert drainer.drain_once() == {"sent": 0, "failed": 2, "parked": 0}
+    assert drainer.drain_once() == {"sent": 0, "failed": 0, "parked": 2}
+    assert calls == [2, 2]  # an outage is not bisected
+    assert outbox.due() == []
+
+
+def test_outbox_from_before_parking_is_migrated(tmp_path):
+    db = str(tmp_path / "outbox.sqlite3")
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT NOT NULL, op TEXT NOT NULL,"
+        " dedupe_key TEXT NOT NULL, conflict_col TEXT, match_params TEXT, payload TEXT NOT NULL,"
+        " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL DEFAULT 0, last_error TEXT,"
+        " created_at REAL NOT NULL, UNIQUE (target, op, dedupe_key))"
+    )
+    conn.execute("INSERT INTO outbox (target, op, dedupe_key, payload, created_at) VALUES ('t', 'upsert', 'k', '{}', 0)")
+    conn.commit()
+    conn.close()
+    assert [r["dedupe_key"] for r in Outbox(db).due()] == ["k"]
+
+
+def test_pending_lookups_by_lead_use_the_index(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    for equals in ({"lead_id": "L1", "flow_name": "formb_helper"}, {"lead_id": ["L1", "L2"], "flow_name": ["formb_helper"]}):
+        sql, args = outbox._pending_query("yaml_trigger_log", equals)
+        plan = " ".join(row[3] for row in outbox._conn.execute("EXPLAIN QUERY PLAN " + sql, args))
+        assert "USING INDEX outbox_lead_idx" in plan
@@ -0,0 +1,53 @@
+import agent_runner
+from runner.postgrest import PostgrestClient
+
+
+class FakeResponse:
+    headers = {"Content-Range": "0-0/2"}
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return [{"ok": True}]
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return FakeResponse()
+
+
+def test_sb_helpers_share_one_pooled_session(monkeypatch):
+    client = PostgrestClient("http://sb.local", headers={"apikey": "k"}, pool_size=4, timeout=3)
+    session = FakeSession()
+    client._session = session
+    monkeypatch.setattr(agent_runner, "_SB_CLIENT", client)
+
+    r = agent_runner._sb_select("yaml_trigger_log", {"select": "id"})
+    assert agent_runner._count_from_content_range(r) == 2
+    assert agent_runner._sb_update("lead_log", {"id": "eq.1"}, {"stage": "Survey"}) is True
+    assert agent_runner._sb_upsert_on_conflict("yaml_trigger_log", {"idempotency_key": "k"}, "idempotency_key", timeout=1.5)
+
+    methods = [c[0] for c in session.calls]
+    assert methods == ["GET", "PATCH", "POST"]
+    assert session.calls[0][1] == "http://sb.local/rest/v1/yaml_trigger_log"
+    assert session.calls[0][2]["headers"] == {"Range": "0-0"}
+    assert session.calls[0][2]["timeout"] == 3
+    assert session.calls[2][2]["timeout"] == 1.5
+    assert session.calls[2][2]["params"] == {"on_conflict": "idempotency_key"}
+
+
+def test_upsert_rows_groups_by_column_set_instead_of_null_padding(monkeypatch):
+    calls = []
+    monkeypatch.setattr(agent_runner, "_sb_upsert_on_conflict", lambda table, rows, col, timeout=None: calls.append(rows) or rows)
+    rows = [
+        {"idempotency_key": "k1", "status": "sent"},
+        {"idempotency_key": "k2", "status": "error", "error": "503"},
+        {"idempotency_key": "k3", "status": "sent"},
+    ]
+    assert len(agent_runner._sb_upsert_rows("yaml_trigger_log", rows, "idempotency_key")) == 3
+    assert calls == [[rows[0], rows[2]], [rows[1]]]  # no "error": None on the sent rows
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+import agent_runner
+from runner.ratelimit import RateLimited, RateLimiter, load_rate_limits
+
+
+def test_limits_loaded_from_notify_yaml():
+    limits = load_rate_limits("config/notify.yaml")
+    assert limits["whatsapp"] == pytest.approx((20 / 60, 4))
+    assert limits["slack"] == pytest.approx((30 / 60, 5))
+    assert load_rate_limits("missing.yaml") == {}
+
+
+def test_processes_share_one_bucket(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    first = RateLimiter(path, {"whatsapp": (1.0, 3)})
+    second = RateLimiter(path, {"whatsapp": (1.0, 3)})  # separate connection, as another process would have
+    assert [first.try_acquire("whatsapp"), second.try_acquire("whatsapp"), first.try_acquire("whatsapp")] == [True] * 3
+    assert not second.try_acquire("whatsapp")
+    assert second.metrics()["whatsapp"]["rejected"] == 1
+    assert first.try_acquire("email")  # no limit configured
+
+
+def test_blocking_acquire_waits_and_times_out(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rl.sqlite3"), {"slack": (20.0, 1)})
+    assert limiter.acquire("slack") == 0.0
+    assert 0.02 < limiter.acquire("slack") < 0.5
+    with pytest.raises(RateLimited):
+        limiter.acquire("slack", timeout=0.001)
+    stats = limiter.metrics()["slack"]
+    assert (stats["acquired"], stats["throttled"], stats["rejected"]) == (2, 1, 1)
+    assert stats["wait_s"] > 0
+
+
+def test_live_whatsapp_send_draws_from_bucket(monkeypatch, tmp_path):
+    calls = []
+
+    class Response:
+        def raise_for_status(self):
+            return None
+
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_API_URL", "https://wa.test")
+    monkeypatch.setattr(agent_runner, "WHATCHIMP_KEY", "k")
+    monkeypatch.setattr(agent_runner, "_RATE_LIMITER", RateLimiter(str(tmp_path / "rl.sqlite3"), {"whatsapp": (0.001, 1)}))
+    monkeypatch.setattr(agent_runner, "RATE_LIMIT_MAX_WAIT_S", 0.01)
+    monkeypatch.setattr(agent_runner, "_QUIET_HOURS", None)
+    monkeypatch.setattr(agent_runner, "_DLQ", agent_runner.DeadLetterStore(str(tmp_path / "dlq.sqlite3")))
+    monkeypatch.setattr(agent_runner.requests, "post", lambda *a, **k: calls.append(time.time()) or Response())
+
+    agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali", "choice_cta": "x"})
+    with pytest.raises(agent_runner.DeadLettered) as err:
+        agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali", "choice_cta": "x"})
+    assert isinstance(err.value.__cause__, RateLimited)
+    assert len(calls) == 1
+    assert agent_runner.notify_metrics()["rate_limits"]["whatsapp"]["rejected"] == 1
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import agent_runner
+from runner.scheduler import JobStore, Scheduler
+
+
+def test_heap_window_fires_in_order_and_refills(tmp_path):
+    fired = []
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    scheduler = Scheduler(store, lambda jobs: fired.extend(j["lead_id"] for j in jobs) or {}, window=3, batch=2)
+    now = time.time()
+    for i in range(7):
+        store.add("docs_microcommit_day2", f"L{i}", now - 100 + i)
+    store.add("docs_microcommit_day2", "future", now + 3600)
+
+    assert scheduler.run_pending(now) == 7
+    assert fired == [f"L{i}" for i in range(7)]
+    assert store.counts() == {"done": 7, "pending": 1}
+    assert scheduler.next_due() == now + 3600
+
+
+def test_dispatcher_wakes_for_newly_scheduled_earlier_job(tmp_path):
+    done = threading.Event()
+    scheduler = Scheduler(JobStore(str(tmp_path / "jobs.sqlite3")), lambda jobs: done.set() or {})
+    scheduler.schedule("survey_pending_alert_followup", "far", time.time() + 3600)
+    scheduler.start()
+    scheduler.schedule("survey_pending_alert_followup", "soon", time.time() + 0.05)
+    assert done.wait(2)
+    scheduler.stop()
+    assert scheduler.store.counts() == {"done": 1, "pending": 1}
+
+
+def test_scheduled_followup_rechecks_only_if_at_fire_time(tmp_path, monkeypatch):
+    leads = {
+        "L1": {"id": "L1", "stage": "Quote", "formb_uploaded": False},
+        "L2": {"id": "L2", "stage": "Quote", "formb_uploaded": True},
+    }
+    monkeypatch.setattr(agent_runner, "_load_leads", lambda ids: {i: leads[i] for i in ids if i in leads})
+    monkeypatch.setattr(agent_runner, "run_flow", lambda name, lead, guards, fn: ("sent", None))
+    monkeypatch.setattr(agent_runner, "_SCHEDULER", Scheduler(JobStore(str(tmp_path / "j.sqlite3")), agent_runner.fire_scheduled_jobs))
+
+    past = "2020-01-01T00:00:00"
+    for lead_id in ("L1", "L2", "gone"):
+        agent_runner.schedule_flow("docs_microcommit_day2", lead_id, past, only_if="formb_uploaded==false")
+    assert agent_runner._scheduler().run_pending() == 3
+    rows = agent_runner._scheduler().store._conn.execute("SELECT lead_id, status, last_error FROM scheduled_jobs ORDER BY id").fetchall()
+    assert [tuple(r) for r in rows] == [("L1", "done", None), ("L2", "skipped", "only_if_false"), ("gone", "skipped", "lead_missing")]
+
+
+
+def test_invalid_only_if_marks_job_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent_runner, "_load_leads", lambda ids: {"L1": {"id": "L1"}})
+    jobs = [{"id": 1, "lead_id": "L1", "flow_name": "docs_microcommit_day2", "only_if": "formb_uploaded =="}]
+    status, error = agent_runner.fire_scheduled_jobs(jobs)[1]
+    assert status == "error" and error.startswith("invalid only_if")
+
+
+def test_dispatcher_fires_jobs_scheduled_by_another_process(tmp_path):
+    done = threading.Event()
+    db = str(tmp_path / "jobs.sqlite3")
+    dispatcher = Scheduler(JobStore(db), lambda jobs: done.set() or {}, poll_s=0.05).start()
+    try:
+        Scheduler(JobStore(db), lambda jobs: {}).schedule("docs_microcommit_day2", "L1", time.time())  # e.g. a cron run
+        assert done.wait(2)
+    finally:
+        dispatcher.stop()
+    assert dispatcher.store.counts() == {"done": 1}
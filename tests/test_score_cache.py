@@ -0,0 +1,81 @@
+import threading
+import time
+
+import agent_runner
+from runner.score_cache import ScoreService, TTLCache, content_key
+
+
+def test_content_key_ignores_key_order():
+    assert content_key({"a": 1, "b": [1, 2]}) == content_key({"b": [1, 2], "a": 1})
+    assert content_key({"a": 1}) != content_key({"a": 2})
+
+
+def test_ttl_expiry_and_disk_tier(tmp_path):
+    path = str(tmp_path / "scores.sqlite3")
+    cache = TTLCache(ttl_s=60, path=path)
+    cache.set("k", 87)
+    assert cache.get("k") == (True, 87)
+
+    restarted = TTLCache(ttl_s=60, path=path)
+    assert restarted.get("k") == (True, 87)
+    assert restarted.counts["disk_hits"] == 1
+
+    short = TTLCache(ttl_s=0.01, max_entries=1)
+    short.set("a", 1)
+    short.set("b", 2)
+    assert short.get("a") == (False, None) and short.counts["evictions"] == 1
+    time.sleep(0.02)
+    assert short.get("b") == (False, None)
+
+
+def test_score_many_dedupes_and_caps_concurrency():
+    active, peak, calls = [0], [0], []
+    lock = threading.Lock()
+
+    def slow_score(lead):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            calls.append(lead["text"])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        if lead["text"] == "bad":
+            raise RuntimeError("model timeout")
+        return len(lead["text"])
+
+    service = ScoreService(slow_score, TTLCache(ttl_s=60), max_concurrency=3)
+    leads = [{"text": "x" * (i % 8)} for i in range(40)] + [{"text": "bad"}]
+    assert service.score_many(leads) == [i % 8 for i in range(40)] + [0]
+    assert sorted(calls) == sorted({"x" * i for i in range(8)} | {"bad"})
+    assert peak[0] <= 3
+
+    assert service.score_many(leads[:8]) == list(range(8))  # all cached now
+    stats = service.stats()
+    assert stats["errors"] == 1 and stats["latency_ms"]["n"] == 8
+    assert stats["hit_rate"] > 0
+
+
+def test_single_lead_api_caches_successes_only(monkeypatch):
+    calls = []
+
+    class Response:
+        def __init__(self, ok):
+            self.ok = ok
+
+        def raise_for_status(self):
+            if not self.ok:
+                raise RuntimeError("HTTP 500")
+
+        def json(self):
+            return {"intent_score": 64}
+
+    outcomes = iter([False, True])
+    monkeypatch.setattr(agent_runner, "_SCORE_SERVICE", None)
+    monkeypatch.setattr(agent_runner.requests, "post", lambda url, json, timeout=None: calls.append(json) or Response(next(outcomes)))
+    lead = {"lead_id": "L9", "text": "quote please"}
+    assert agent_runner.gpt_qualifier_score(lead) == 0
+    assert agent_runner.gpt_qualifier_score(lead) == 64
+    assert agent_runner.gpt_qualifier_score(dict(lead)) == 64
+    assert len(calls) == 2
+    assert agent_runner.gpt_score_metrics()["memory_hits"] == 1
@@ -0,0 +1,201 @@
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+import pytest
+
+import agent_runner
+from runner.daemon import Daemon, FileWatcher, LeadSocketServer, SpoolDir
+from runner.scheduler import JobStore, Scheduler
+
+
+def _write(path, text):
+    path.write_text(text)
+    # mtime granularity differs across filesystems; make every write visible to the watcher
+    stamp = time.time() + len(text) % 7 + 1
+    os.utime(path, (stamp, stamp))
+
+
+def test_file_watcher_reports_added_modified_removed(tmp_path):
+    flows = tmp_path / "flows"
+    flows.mkdir()
+    config = tmp_path / "notify.yaml"
+    _write(config, "a: 1\n")
+    watcher = FileWatcher([str(config), str(flows)])
+    assert watcher.changed() == []
+    _write(flows / "new.yaml", "x: 1\n")
+    _write(config, "a: 22\n")
+    assert watcher.changed() == sorted([str(config), str(flows / "new.yaml")])
+    (flows / "new.yaml").unlink()
+    assert watcher.changed() == [str(flows / "new.yaml")]
+
+
+def test_spool_claims_oldest_and_recovers_after_crash(tmp_path):
+    spool = SpoolDir(str(tmp_path))
+    _write(tmp_path / "b.jsonl", "{}\n")
+    _write(tmp_path / "a.jsonl", "{}\n\n")
+    first = spool.claim()
+    assert first.parent == spool.processing and spool.depth() == 1
+    assert spool.recover() == 1 and spool.depth() == 2  # crash: processing/ goes back to the queue
+    claimed = spool.claim()
+    spool.finish(claimed, {"leads": 1}, ok=True)
+    assert json.loads((spool.done / (claimed.stem + ".result.json")).read_text()) == {"leads": 1}
+
+
+def test_daemon_processes_spool_socket_and_reloads(tmp_path):
+    seen, reloads = [], []
+
+    def handle(lines, source):
+        items = [json.loads(line) for _, _, line in lines]
+        if any(item.get("boom") for item in items):
+            raise ValueError("bad batch")
+        seen.append((source, len(items)))
+        return {"leads": len(items)}
+
+    watched = tmp_path / "notify.yaml"
+    _write(watched, "a: 1\n")
+    spool = SpoolDir(str(tmp_path / "spool"))
+    sock = str(tmp_path / "run.sock")
+    daemon = Daemon(handle, spool=spool, socket_path=sock, watch=[str(watched)], on_reload=reloads.append, poll_s=0.05)
+    _write(spool.root / "ok.jsonl", '{"id": 1}\n{"id": 2}\n')
+    _write(spool.root / "bad.jsonl", '{"boom": true}\n')
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    try:
+        deadline = time.time() + 5
+        while (spool.depth() or not os.path.exists(sock)) and time.time() < deadline:
+            time.sleep(0.02)
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(sock)
+        client.sendall(b'{"id": 3}\n\n{"id": 4}\n{"id": 5}\n')
+        client.shutdown(socket.SHUT_WR)
+        assert json.loads(client.makefile().readline()) == {"leads": 3}
+        client.close()
+        _write(watched, "a: 2\n")
+        daemon.request_reload()
+        while not reloads and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        daemon.stop()
+        thread.join(5)
+    assert (spool.done / "ok.jsonl").exists() and (spool.failed / "bad.jsonl").exists()
+    assert "bad batch" in (spool.failed / "bad.result.json").read_text()
+    assert [n for _, n in seen] == [2, 3] and reloads == [[str(watched)]]
+    assert daemon.stats["files"] == 1 and daemon.stats["failed_files"] == 1
+    assert not os.path.exists(sock)
+
+
+def test_socket_is_owner_only_and_never_replaces_other_files(tmp_path):
+    path = str(tmp_path / "run.sock")
+    server = LeadSocketServer(path, lambda lines, source: {})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    server.server_close()
+    LeadSocketServer(path, lambda lines, source: {}).server_close()  # stale socket is replaced
+    important = tmp_path / "notes.txt"
+    important.write_text("keep me")
+    with pytest.raises(OSError):
+        LeadSocketServer(str(important), lambda lines, source: {})
+    assert important.read_text() == "keep me"
+
+
+@pytest.mark.skipif(agent_runner.parse_flow_text("a: 1")[1] != {"a": 1}, reason="flow files need PyYAML")
+def test_serve_runs_spool_files_and_hot_loads_new_flows(tmp_path, monkeypatch, stub_supabase):
+    flows = tmp_path / "flows"
+    flows.mkdir()
+    sent = []
+    monkeypatch.setattr(agent_runner, "RUNNER_FLOWS_DIR", str(flows))
+    monkeypatch.setattr(agent_runner, "_FLOW_REGISTRY", None)
+    monkeypatch.setattr(agent_runner, "_SERVED_YAML_FLOWS", [])
+    monkeypatch.setattr(agent_runner, "SERVE_POLL_S", 0.05)
+    monkeypatch.setattr(agent_runner, "_SCHEDULER", Scheduler(JobStore(str(tmp_path / "jobs.sqlite3")), lambda jobs: {}))
+    monkeypatch.setattr(agent_runner, "TRIGGERS", {})
+    monkeypatch.setitem(agent_runner.FLOW_ACTIONS, "slack", lambda params, lead, idem: sent.append(lead["id"]))
+    stop = threading.Event()
+    thread = threading.Thread(target=agent_runner.serve, kwargs={"spool_dir": str(tmp_path / "spool"), "socket_path": "", "stop": stop})
+    thread.start()
+    try:
+        deadline = time.time() + 5
+        _write(flows / "vip_ping.yaml", 'meta: {flow_name: vip_ping}\ntrigger: {when: stage == "VIP"}\nactions:\n  - slack: {channel: "#vip", text: "hi"}\n')
+        while "vip_ping" not in agent_runner.TRIGGERS and time.time() < deadline:
+            time.sleep(0.02)
+        _write(tmp_path / "spool" / "leads.jsonl", '{"id": "V1", "stage": "VIP"}\n{"id": "V2", "stage": "New"}\n')
+        while not (tmp_path / "spool" / "done" / "leads.result.json").exists() and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        stop.set()
+        thread.join(5)
+    result = json.loads((tmp_path / "spool" / "done" / "leads.result.json").read_text())
+    assert sent == ["V1"] and (result["leads"], result["sent"], result["skipped"]) == (2, 1, 1)
+
+
+def test_serve_dispatches_followups_scheduled_elsewhere(tmp_path, monkeypatch):
+    fired = threading.Event()
+    db = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(agent_runner, "_SCHEDULER", Scheduler(JobStore(db), lambda jobs: fired.set() or {}, poll_s=0.05))
+    monkeypatch.setattr(agent_runner, "SERVE_POLL_S", 0.05)
+    monkeypatch.setattr(agent_runner, "_SERVED_YAML_FLOWS", [])
+    monkeypatch.setattr(agent_runner, "TRIGGERS", dict(agent_runner.TRIGGERS))
+    stop = threading.Event()
+    thread = threading.Thread(target=agent_runner.serve, kwargs={"spool_dir": str(tmp_path / "spool"), "socket_path": "", "stop": stop})
+    thread.start()
+    try:
+        Scheduler(JobStore(db), lambda jobs: {}).schedule("docs_microcommit_day2", "L1", time.time())  # e.g. a cron run
+        assert fired.wait(3)
+    finally:
+        stop.set()
+        thread.join(5)
+
+
+@pytest.mark.skipif(agent_runner.parse_flow_text("a: 1")[1] != {"a": 1}, reason="flow files need PyYAML")
+def test_reload_mid_stream_keeps_the_streams_trigger_snapshot(tmp_path, monkeypatch, stub_supabase):
+    from runner.ingest import IngestStats
+    from runner.pool import FlowWorkerPool
+
+    flows = tmp_path / "flows"
+    flows.mkdir()
+    sent = []
+    monkeypatch.setattr(agent_runner, "RUNNER_FLOWS_DIR", str(flows))
+    monkeypatch.setattr(agent_runner, "_FLOW_REGISTRY", None)
+    monkeypatch.setattr(agent_runner, "_SERVED_YAML_FLOWS", [])
+    monkeypatch.setattr(agent_runner, "TRIGGERS", {})
+    monkeypatch.setitem(agent_runner.FLOW_ACTIONS, "slack", lambda params, lead, idem: sent.append(lead["id"]))
+    _write(flows / "vip_ping.yaml", 'meta: {flow_name: vip_ping}\ntrigger: {when: stage == "VIP"}\nactions:\n  - slack: {channel: "#vip", text: "hi"}\n')
+    agent_runner.reload_config()
+
+    def leads():
+        yield {"id": "V1", "stage": "VIP"}
+        (flows / "vip_ping.yaml").unlink()
+        agent_runner.reload_config(["vip_ping.yaml"])  # what the daemon thread does between socket chunks
+        yield {"id": "V2", "stage": "VIP"}
+
+    pool = FlowWorkerPool(2)
+    try:
+        result = agent_runner._fire_lead_stream(leads(), IngestStats(), None, 1, pool, progress_s=0)
+    finally:
+        pool.shutdown()
+    assert sent == ["V1", "V2"] and result["error"] == 0
+    assert "vip_ping" not in agent_runner.TRIGGERS
+
+
+@pytest.mark.skipif(agent_runner.parse_flow_text("a: 1")[1] != {"a": 1}, reason="flow files need PyYAML")
+def test_yaml_flows_replace_builtins_and_removal_restores_them(tmp_path, monkeypatch, capsys):
+    flows = tmp_path / "flows"
+    flows.mkdir()
+    monkeypatch.setattr(agent_runner, "RUNNER_FLOWS_DIR", str(flows))
+    monkeypatch.setattr(agent_runner, "_FLOW_REGISTRY", None)
+    monkeypatch.setattr(agent_runner, "_SERVED_YAML_FLOWS", [])
+    monkeypatch.setattr(agent_runner, "TRIGGERS", dict(agent_runner.BUILTIN_TRIGGERS))
+    _write(flows / "survey_pending_alert.yaml", 'meta: {flow_name: survey_pending_alert}\ntrigger: {when: stage == "VIP"}\nactions:\n  - slack: {text: "hi"}\n')
+    agent_runner.reload_config()
+    assert agent_runner.TRIGGERS["survey_pending_alert"][0]({"stage": "VIP"})  # the edited YAML is live
+    assert "replaces the existing survey_pending_alert trigger" in capsys.readouterr().out
+
+    assert agent_runner.register_yaml_flows(str(flows), table=dict(agent_runner.BUILTIN_TRIGGERS), override=False) == []
+    assert "shadowed by the existing survey_pending_alert trigger" in capsys.readouterr().out
+
+    (flows / "survey_pending_alert.yaml").unlink()
+    agent_runner.reload_config(["survey_pending_alert.yaml"])
+    assert agent_runner.TRIGGERS["survey_pending_alert"] is agent_runner.BUILTIN_TRIGGERS["survey_pending_alert"]
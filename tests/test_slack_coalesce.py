@@ -0,0 +1,53 @@
+import time
+
+import agent_runner
+from runner.coalesce import SlackCoalescer, load_coalesce_window_s
+
+
+def test_window_loaded_from_notify_yaml():
+    assert load_coalesce_window_s("config/notify.yaml") == 15 * 60
+    assert load_coalesce_window_s("missing.yaml") == 0.0
+
+
+def test_sweep_becomes_one_digest_per_channel():
+    posts = []
+    coalescer = SlackCoalescer(lambda channel, text: posts.append((channel, text)), window_s=900, top_n=2)
+    for i in range(300):
+        coalescer.add("#ops-leads", f"lead L{i % 3}")
+    coalescer.add("#ops-finance", "only one")
+
+    assert coalescer.flush_due() == 0  # window still open
+    assert coalescer.flush() == 2
+    digest = dict(posts)
+    assert digest["#ops-finance"] == "only one"
+    lines = digest["#ops-leads"].splitlines()
+    assert lines[0].startswith("🧾 300 notifications for #ops-leads")
+    assert lines[1:] == ["• lead L0  ×100", "• lead L1  ×100", "…and 100 more"]
+    assert coalescer.metrics()["messages_per_post"] == 150.5
+
+
+def test_background_flush_after_window_and_on_close():
+    posts = []
+    coalescer = SlackCoalescer(lambda channel, text: posts.append(text), window_s=0.05).start()
+    coalescer.add("#ops-leads", "a")
+    coalescer.add("#ops-leads", "b")
+    deadline = time.time() + 2
+    while not posts and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(posts) == 1 and "2 notifications" in posts[0]
+    coalescer.add("#ops-leads", "c")
+    coalescer.close()
+    assert posts[-1] == "c"
+
+
+def test_notify_slack_coalesces_live_posts(monkeypatch):
+    sent = []
+    coalescer = SlackCoalescer(lambda channel, text: sent.append(text), window_s=900)
+    monkeypatch.setattr(agent_runner, "DRY_RUN", False)
+    monkeypatch.setattr(agent_runner, "SLACK_WEBHOOK", "https://hooks.test")
+    monkeypatch.setattr(agent_runner, "_SLACK_COALESCER", coalescer)
+    for i in range(50):
+        agent_runner.notify_slack("#ops-leads", f"lead {i}")
+    assert sent == []
+    assert agent_runner.flush_slack() == 1
+    assert sent[0].startswith("🧾 50 notifications")
@@ -0,0 +1,79 @@
+import agent_runner
+from runner.conditions import compile_condition
+from runner.pushdown import filter_params, keyset_pages, quote, terms
+
+
+def _terms(src, bools=()):
+    return terms(compile_condition(src).ast, bools)
+
+
+def test_builtin_trigger_pushes_down_to_postgrest_filters():
+    params = filter_params([agent_runner.WHEN_SURVEY_PENDING_ALERT.ast], agent_runner.SWEEP_BOOL_COLUMNS)
+    assert params == {
+        "and": "(stage.eq.Deposit,survey_scheduled.not.is.true,idle_days.gte.7,"
+        "do_not_proceed.not.is.true,do_not_contact.not.is.true)"
+    }
+
+
+def test_null_handling_matches_runtime_coercion():
+    assert _terms("survey_scheduled == false") == ["survey_scheduled.not.is.true"]
+    assert _terms("idle_days >= 7") == ["idle_days.gte.7"]  # missing → 0 → never matches
+    assert _terms("idle_days < 3") == ["or(idle_days.lt.3,idle_days.is.null)"]
+    assert _terms("3 > idle_days") == ["or(idle_days.lt.3,idle_days.is.null)"]
+    assert _terms('stage != "Lost"') == ["or(stage.neq.Lost,stage.is.null)"]
+    assert _terms('stage not in ("Lost", "Won")') == ["or(stage.not.in.(Lost,Won),stage.is.null)"]
+
+
+def test_unpushable_parts_are_dropped_not_guessed():
+    assert _terms("quote_sent") == []  # unknown column type: truthiness stays in Python
+    assert _terms("quote_sent", {"quote_sent"}) == ["quote_sent.is.true"]
+    assert _terms('stage == "Deposit" and (idle_days > 3 or meta.x == 1)') == ["stage.eq.Deposit"]
+    assert _terms("idle_days > hours_since_quote") == []
+    assert filter_params([compile_condition('stage == "A"').ast, compile_condition("x.y == 1").ast]) == {}
+    two = filter_params([compile_condition('stage == "A" and idle_days > 1').ast, compile_condition('stage == "B"').ast])
+    assert two == {"or": "(and(stage.eq.A,idle_days.gt.1),stage.eq.B)"}
+
+
+def test_quote_reserved_characters():
+    assert quote(7.0) == "7" and quote("Deposit") == "Deposit"
+    assert quote("a,b") == '"a,b"' and quote('x"y') == '"x\\"y"' and quote("null") == '"null"'
+    assert quote("10:30") == '"10:30"' and quote("2024-05-01T10:30:00") == '"2024-05-01T10:30:00"'
+
+
+def test_keyset_pages_use_last_id_not_offsets():
+    ids = [f"L{i:03d}" for i in range(7)]
+    calls = []
+
+    def fetch(params):
+        calls.append(params)
+        after = params.get("id", "gt.")[3:]
+        return [{"id": i} for i in ids if i > after][: int(params["limit"])]
+
+    pages = list(keyset_pages(fetch, {"and": "(stage.eq.A)"}, page_size=3))
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert [c.get("id") for c in calls] == [None, "gt.L002", "gt.L005"]
+    assert all(c["order"] == "id.asc" and c["and"] == "(stage.eq.A)" for c in calls)
+
+
+def test_sweep_streams_pages_into_fire_batch_and_reports_resume_point(monkeypatch, stub_supabase, survey_alert_sends):
+    leads = [{"id": f"L{i:03d}", "stage": "Deposit", "idle_days": 9.0, "survey_scheduled": False} for i in range(5)]
+    seen, sent = [], survey_alert_sends
+
+    def fetch(params):
+        seen.append(params)
+        if params.get("id") == "gt.L003":
+            raise RuntimeError("timeout")
+        after = params.get("id", "gt.")[3:]
+        return [lead for lead in leads if lead["id"] > after][: int(params["limit"])]
+
+    monkeypatch.setattr(agent_runner, "_fetch_lead_page", fetch)
+    from runner.pool import FlowWorkerPool
+
+    pool = FlowWorkerPool(max_workers=2)
+    summary = agent_runner.sweep_leads(["survey_pending_alert"], page_size=2, chunk_size=3, pool=pool)
+    pool.shutdown()
+
+    assert seen[0]["and"].startswith("(stage.eq.Deposit,")
+    assert sorted(sent) == ["L000", "L001", "L002", "L003"]
+    assert summary["sweep"]["pages"] == 2 and summary["sweep"]["last_id"] == "L003"
+    assert summary["sweep"]["error"] == "timeout"
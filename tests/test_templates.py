@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import agent_runner
+from runner.templates import TemplateError, TemplateRegistry, main
+
+
+def _row(name, body, **extra):
+    return dict({"template_name": name, "header_type": "text", "body": body}, **extra)
+
+
+def test_load_rejects_invalid_rows_and_keeps_valid_ones():
+    registry = TemplateRegistry()
+    report = registry.load(
+        [
+            _row("ok_v1", "Hi {{name}}, tap {{ cta }}."),
+            _row("long_v1", "x" * 1025),
+            _row("img_v1", "Hi", header_type="image"),
+            _row("decl_v1", "Hi {{name}}", variables=["name", "link"]),
+        ]
+    )
+    assert report["loaded"] == 1
+    assert [bad["template"] for bad in report["invalid"]] == ["long_v1", "img_v1", "decl_v1"]
+    assert "too long" in report["invalid"][0]["error"]
+    assert "ok_v1" in registry and "long_v1" not in registry
+
+
+def test_render_params_and_missing():
+    registry = TemplateRegistry()
+    registry.load([_row("t", "Hi {{name}}, {{cta}} — {{name}}!")])
+    tpl = registry.get("t")
+    assert tpl.variables == ("name", "cta")
+    assert tpl.missing({"name": "Ali"}) == ["cta"]
+    assert registry.render("t", {"name": "Ali", "cta": "Pilih slot"}) == "Hi Ali, Pilih slot — Ali!"
+    assert tpl.params({"name": "Ali", "cta": "x"}) == ["Ali", "x"]
+    with pytest.raises(TemplateError):
+        tpl.render({"name": "Ali"})
+    with pytest.raises(TemplateError):
+        registry.render("nope", {})
+
+
+def test_brand_scoped_lookup_falls_back_to_name():
+    registry = TemplateRegistry()
+    registry.load([_row("t", "Voltek {{name}}", brand="Voltek", locale="ms"), _row("t", "Perodua {{name}}", brand="Perodua", locale="ms")])
+    assert registry.render("t", {"name": "A"}, brand="Perodua", locale="ms") == "Perodua A"
+    assert registry.render("t", {"name": "A"}, brand="Other") == "Voltek A"
+    assert len(registry) == 2
+
+
+def test_cli_validate_exit_code(tmp_path, capsys):
+    good = tmp_path / "good.jsonl"
+    good.write_text(json.dumps(_row("a", "Hi {{name}}")) + "\n")
+    bad = tmp_path / "bad.json"
+    bad.write_text(json.dumps({"templates": [_row("b", "Hi", header_type="image")]}))
+    assert main(["validate", str(good)]) == 0
+    assert main(["validate", str(good), str(bad)]) == 1
+    assert "b: Missing image_url" in capsys.readouterr().out
+
+
+def test_send_whatsapp_requires_registered_variables(monkeypatch, capsys):
+    registry = TemplateRegistry()
+    registry.load([_row("survey_nudge_v1", "Salam {{name}}, {{choice_cta}}")])
+    monkeypatch.setattr(agent_runner, "_TEMPLATES", registry)
+    monkeypatch.setattr(agent_runner, "DRY_RUN", True)
+    with pytest.raises(TemplateError, match="choice_cta"):
+        agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali"})
+    agent_runner.send_whatsapp("6012", "survey_nudge_v1", {"name": "Ali", "choice_cta": "Pilih slot"})
+    assert "Salam Ali, Pilih slot" in capsys.readouterr().out
+    agent_runner.send_whatsapp("6012", "unregistered_v1")  # unknown templates pass through unchanged
@@ -0,0 +1,113 @@
+import agent_runner
+from runner.idem_cache import IdempotencyIndex
+
+
+class NotFound(Exception):
+    class response:
+        status_code = 404
+
+
+def test_should_fire_uses_single_guard_rpc(monkeypatch, stub_supabase):
+    calls = []
+
+    def fake_rpc(fn, args, timeout=None):
+        calls.append((fn, args))
+        item = args["p_items"][0]
+        return [{**item, "key_exists": False, "window_count": 0, "total_count": 3}]
+
+    monkeypatch.setattr(agent_runner, "_sb_rpc", fake_rpc)
+    monkeypatch.setattr(agent_runner, "_GUARD_RPC_AVAILABLE", True)
+    lead = {"id": "L1", "stage": "Deposit"}
+    allowed, reason, key = agent_runner.should_fire(lead, "survey_pending_alert", agent_runner.guards_survey_pending_alert(lead))
+
+    assert (allowed, reason) == (False, "max_total_reached")
+    assert len(calls) == 1 and calls[0][0] == "trigger_guard_stats"
+    assert calls[0][1]["p_items"][0]["idempotency_key"] == key
+    assert calls[0][1]["p_items"][0]["since"] is not None
+
+
+def test_guard_stats_bulk_falls_back_when_rpc_missing(monkeypatch):
+    def missing_rpc(fn, args, timeout=None):
+        raise NotFound()
+
+    seen = []
+
+    def fake_select(path, params, timeout=None):
+        seen.append(params)
+
+        class R:
+            headers = {"Content-Range": "0-0/1" if "lead_id" in params else "*/0"}
+
+        return R()
+
+    monkeypatch.setattr(agent_runner, "_sb_rpc", missing_rpc)
+    monkeypatch.setattr(agent_runner, "_sb_select", fake_select)
+    monkeypatch.setattr(agent_runner, "_GUARD_RPC_AVAILABLE", True)
+    stats = agent_runner.guard_stats_bulk([("L1", "formb_helper", "k1"), ("L2", "formb_helper", "k2")], 3, 2)
+
+    assert stats["k1"] == {"key_exists": False, "window_count": 1, "total_count": 1}
+    assert agent_runner._GUARD_RPC_AVAILABLE is False
+    assert len(seen) == 6
+
+
+def test_evaluate_guards_order():
+    guards = {"not_fired_in_days": 7, "max_sends_total": 3}
+    assert agent_runner.evaluate_guards({"key_exists": True, "window_count": 1}, guards)[1] == "idempotent_key_exists"
+    assert agent_runner.evaluate_guards({"window_count": 1, "total_count": 5}, guards)[1] == "fired_in_window"
+    assert agent_runner.evaluate_guards({"total_count": 3}, guards)[1] == "max_total_reached"
+    assert agent_runner.evaluate_guards({}, guards | {"stop_if_true": True})[1] == "stop_if"
+    assert agent_runner.evaluate_guards({}, guards) == (True, "ok")
+
+
+def test_fire_again_is_answered_by_local_idempotency_index(monkeypatch, stub_supabase):
+    rpc_calls, upserts = [], stub_supabase
+
+    def fake_rpc(fn, args, timeout=None):
+        rpc_calls.append(args)
+        return [{**args["p_items"][0], "key_exists": False, "window_count": 0, "total_count": 0}]
+
+    monkeypatch.setattr(agent_runner, "_sb_rpc", fake_rpc)
+    monkeypatch.setattr(agent_runner, "_GUARD_RPC_AVAILABLE", True)
+    lead = {"id": "L9", "stage": "Deposit"}
+    guards = agent_runner.guards_survey_pending_alert(lead)
+
+    assert agent_runner.run_flow("survey_pending_alert", lead, guards, lambda l, k: None) == ("sent", None)
+    assert agent_runner.run_flow("survey_pending_alert", lead, guards, lambda l, k: None) == ("skipped", "idempotent_key_exists")
+    assert len(rpc_calls) == 1
+    assert len(upserts) == 2  # queued + sent; the repeat writes nothing
+
+
+def test_idempotency_index_bloom_negatives_and_week_scope():
+    index = IdempotencyIndex(lru_size=2, bloom_capacity=100)
+    week = index.week
+    keys = [f"L{i}:Deposit:{week}:flow" for i in range(3)]
+    assert not index.definitely_absent(keys[0])  # cold index answers "maybe"
+    index.warm_load(keys)
+    assert index.definitely_absent(f"L99:Deposit:{week}:flow")
+    assert not index.confirmed(keys[0])  # evicted from LRU, still a bloom positive
+    assert not index.definitely_absent(keys[0])
+    assert index.confirmed(keys[2])
+    index.add("L1:Deposit:190001:flow")
+    assert not index.confirmed("L1:Deposit:190001:flow")
+
+
+def test_bloom_negative_skips_only_the_key_query_for_guarded_flows(monkeypatch):
+    seen = []
+
+    def fake_select(path, params, timeout=None):
+        seen.append(params)
+
+        class R:
+            headers = {"Content-Range": "*/0"}
+
+        return R()
+
+    index = IdempotencyIndex()
+    index.warm_load([])
+    monkeypatch.setattr(agent_runner, "_sb_select", fake_select)
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", index)
+    monkeypatch.setattr(agent_runner, "_GUARD_RPC_AVAILABLE", False)
+    lead = {"id": "L1", "stage": "Deposit"}
+
+    assert agent_runner.should_fire(lead, "survey_pending_alert", agent_runner.guards_survey_pending_alert(lead))[:2] == (True, "ok")
+    assert [sorted(p) for p in seen] == [["flow_name", "lead_id", "select", "trigger_time"], ["flow_name", "lead_id", "select"]]
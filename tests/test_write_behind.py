@@ -0,0 +1,65 @@
+import agent_runner
+from runner.idem_cache import IdempotencyIndex
+from runner.write_behind import WriteBehindBuffer
+
+
+def test_buffer_merges_transitions_and_flushes_on_close():
+    flushed = []
+    buf = WriteBehindBuffer(flushed.append, max_rows=100, max_delay_s=60)
+    buf.put({"idempotency_key": "k1", "status": "queued"})
+    buf.put({"idempotency_key": "k2", "status": "queued"})
+    buf.put({"idempotency_key": "k1", "status": "sent"})
+    assert buf.metrics()["depth"] == 2
+
+    buf.close()
+    assert flushed == [[{"idempotency_key": "k1", "status": "sent"}, {"idempotency_key": "k2", "status": "queued"}]]
+    m = buf.metrics()
+    assert (m["rows_in"], m["rows_merged"], m["flushes"], m["depth"]) == (3, 1, 1, 0)
+
+
+def test_failed_flush_requeues_under_newer_state():
+    attempts = []
+
+    def flaky(rows):
+        attempts.append(rows)
+        if len(attempts) == 1:
+            raise ConnectionError("supabase down")
+
+    buf = WriteBehindBuffer(flaky, max_rows=100, max_delay_s=60)
+    buf.put({"idempotency_key": "k1", "status": "queued", "error": None})
+    assert buf.flush() == 0
+    buf.put({"idempotency_key": "k1", "status": "sent"})
+    assert buf.flush() == 1
+    assert attempts[-1] == [{"idempotency_key": "k1", "status": "sent", "error": None}]
+    assert buf.metrics()["flush_errors"] == 1
+    buf.close()
+
+
+def test_run_flow_with_write_behind_sends_one_row_per_key(monkeypatch, stub_supabase):
+    upserts = stub_supabase
+    monkeypatch.setattr(agent_runner, "TRIGGER_LOG_BUFFER", True)
+    monkeypatch.setattr(agent_runner, "_TRIGGER_BUFFER", None)
+    monkeypatch.setattr(agent_runner, "guard_stats", lambda *a, **k: agent_runner._empty_guard_stats())
+
+    for i in range(3):
+        lead = {"id": f"L{i}", "stage": "Deposit"}
+        agent_runner.run_flow("formb_helper", lead, agent_runner.guards_formb_helper(lead), lambda l, k: None)
+    assert upserts == []
+    assert agent_runner.flush_trigger_log() == 3
+    assert len(upserts) == 1 and {r["status"] for r in upserts[0]} == {"sent"}
+    agent_runner._TRIGGER_BUFFER.close()
+
+
+def test_fire_batch_guards_against_unflushed_rows(monkeypatch, stub_supabase, survey_alert_sends):
+    sent = survey_alert_sends  # stub_supabase: nothing flushed yet
+    monkeypatch.setattr(agent_runner, "TRIGGER_LOG_BUFFER", True)
+    monkeypatch.setattr(agent_runner, "TRIGGER_LOG_FLUSH_MS", 60_000)
+    monkeypatch.setattr(agent_runner, "_TRIGGER_BUFFER", None)
+    lead = {"id": "L1", "stage": "Deposit", "idle_days": 9, "survey_scheduled": False}
+
+    agent_runner.fire_batch([lead], ["survey_pending_alert"], chunk_size=1)
+    again = agent_runner.fire_batch([lead], ["survey_pending_alert"], chunk_size=1)  # idem index confirms the key
+    monkeypatch.setattr(agent_runner, "_IDEM_INDEX", IdempotencyIndex())
+    rerun = agent_runner.fire_batch([lead], ["survey_pending_alert"], chunk_size=1)  # only the buffer knows
+    assert len(sent) == 1 and again["sent"] == rerun["sent"] == 0
+    agent_runner._TRIGGER_BUFFER.close()